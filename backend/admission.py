@@ -0,0 +1,241 @@
+"""
+Omezení rychlosti a řízení přístupu (admission control)
+
+Nárazová vlna zápisů nesmí vyčerpat spojení do databáze na free plánu ani
+rozbít latenci čtení. ASGI middleware AdmissionMiddleware proto každý
+požadavek zařadí do jednoho ze dvou pruhů (lane):
+
+- read - GET a HEAD a POST endpointy, které jen čtou (READ_ONLY_POST_PATHS:
+  /api/query, /api/memories/batch, /georef - tělo POST nese jen filtr),
+- write - ostatní požadavky (zápisy, /api/analyze, /api/jobs ...).
+
+V každém pruhu platí:
+
+1. token bucket pro klienta (IP adresa, za proxy poslední položka
+   X-Forwarded-For, kterou přidala proxy Renderu) - při vyčerpání 429,
+2. limit souběžně zpracovávaných požadavků odvozený z velikosti poolu
+   (db.pool_size) - zápisy mohou obsadit nejvýše polovinu spojení, takže
+   čtení nečekají za dávkou zápisů,
+3. omezená fronta čekajících - když je plná nebo požadavek čeká déle než
+   ADMISSION_QUEUE_TIMEOUT, vrátí se hned 503 s hlavičkou Retry-After.
+
+Odmítnout požadavek hned je levnější než jej nechat čekat na spojení
+z poolu (DB_POOL_TIMEOUT) - p99 latence přijatých požadavků pak při
+přetížení neroste s délkou fronty.
+
+Nastavení (proměnné prostředí):
+
+- RATE_LIMIT_READ_RPS / RATE_LIMIT_READ_BURST - čtení na klienta (výchozí 50 / 100)
+- RATE_LIMIT_WRITE_RPS / RATE_LIMIT_WRITE_BURST - zápisy na klienta (výchozí 5 / 20)
+- ADMISSION_READ_CONCURRENCY - souběžná čtení (výchozí 2 × pool_size)
+- ADMISSION_WRITE_CONCURRENCY - souběžné zápisy (výchozí pool_size / 2, alespoň 1)
+- ADMISSION_QUEUE_DEPTH - nejvýše čekajících požadavků v pruhu (výchozí 32)
+- ADMISSION_QUEUE_TIMEOUT - nejdelší čekání ve frontě v sekundách (výchozí 2)
+
+Streamlit frontend volá API ze svého serveru, všechny jeho session tedy sdílí
+jednu IP adresu - limity na klienta jsou proto záměrně velkorysé.
+"""
+
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from db import pool_size
+from metrics import REGISTRY, Counter, Gauge
+
+# Cesty, které se neomezují (kontrola běhu, metriky, dokumentace)
+EXEMPT_PATHS = {"/", "/healthz", "/readyz", "/metrics", "/docs", "/redoc", "/openapi.json"}
+
+# POST endpointy, které do databáze nezapisují - patří do pruhu čtení
+READ_ONLY_POST_PATHS = {"/api/query", "/api/memories/batch", "/georef"}
+
+# Nejvyšší počet sledovaných klientů, poté se zahodí nečinné buckety
+MAX_TRACKED_CLIENTS = 10000
+
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "memorymap_admission_rejected_total", "Požadavky odmítnuté řízením přístupu",
+    ("lane", "reason")))
+ADMISSION_QUEUED = REGISTRY.register(Gauge(
+    "memorymap_admission_queue_depth", "Počet požadavků čekajících na zpracování",
+    ("lane",)))
+ADMISSION_ACTIVE = REGISTRY.register(Gauge(
+    "memorymap_admission_active", "Počet právě zpracovávaných požadavků v pruhu",
+    ("lane",)))
+
+
+class Rejected(Exception):
+    """Požadavek nebyl přijat - status 429 nebo 503 a doporučené Retry-After"""
+
+    def __init__(self, status: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    """Token bucket pro každého klienta (rate tokenů za sekundu, nejvýše burst)"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, client: str) -> float:
+        """Odebere token; vrátí 0, nebo počet sekund, za který bude token k dispozici"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[client] = (tokens - 1, now)
+                return 0.0
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._evict(now)
+            return (1 - tokens) / self.rate
+
+    def _evict(self, now: float) -> None:
+        # Bucket, který by se mezitím zcela doplnil, je stejný jako nový
+        refill = self.burst / self.rate
+        for client, (_, updated) in list(self._buckets.items()):
+            if now - updated >= refill:
+                del self._buckets[client]
+
+
+class Lane:
+    """Limit souběžných požadavků s omezenou frontou čekajících (FIFO)"""
+
+    def __init__(self, name: str, limit: int, queue_depth: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_depth = queue_depth
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+        self._active_gauge = ADMISSION_ACTIVE.labels(name)
+        self._queue_gauge = ADMISSION_QUEUED.labels(name)
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._active_gauge.set(self.active)
+            return
+        if len(self._waiters) >= self.queue_depth:
+            raise Rejected(503, "queue_full", math.ceil(self.queue_timeout))
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._queue_gauge.set(len(self._waiters))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Místo bylo předáno těsně před vypršením nebo odpojením klienta - vrátíme jej dalšímu
+                self.release()
+            else:
+                waiter.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                raise Rejected(503, "queue_timeout", math.ceil(self.queue_timeout))
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self._queue_gauge.set(len(self._waiters))
+
+    def release(self) -> None:
+        # Místo se předá přímo prvnímu čekajícímu, počet aktivních se nemění
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._queue_gauge.set(len(self._waiters))
+                return
+        self.active -= 1
+        self._active_gauge.set(self.active)
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def client_address(scope) -> str:
+    """IP klienta - za proxy poslední adresa v X-Forwarded-For (tu přidala proxy)"""
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            return value.decode("latin-1").rsplit(",", 1)[-1].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def lane_for(method: str, path: str) -> str:
+    """Pruh požadavku - podle cesty, ne jen metody (čtecí POST nesmí čerpat limity zápisů)"""
+    if method in ("GET", "HEAD") or (method == "POST" and path in READ_ONLY_POST_PATHS):
+        return "read"
+    return "write"
+
+
+class AdmissionMiddleware:
+    """
+    Čisté ASGI middleware - rate limit na klienta a limit souběžnosti
+    s frontou pro pruhy read a write (viz docstring modulu)
+    """
+
+    def __init__(self, app):
+        self.app = app
+        connections = pool_size()
+        queue_depth = int(os.getenv('ADMISSION_QUEUE_DEPTH', '32'))
+        queue_timeout = _env_float('ADMISSION_QUEUE_TIMEOUT', 2.0)
+        self.lanes = {
+            "read": Lane("read", int(os.getenv('ADMISSION_READ_CONCURRENCY', str(2 * connections))),
+                         queue_depth, queue_timeout),
+            "write": Lane("write", int(os.getenv('ADMISSION_WRITE_CONCURRENCY', str(max(1, connections // 2)))),
+                          queue_depth, queue_timeout),
+        }
+        self.buckets = {
+            "read": TokenBuckets(_env_float('RATE_LIMIT_READ_RPS', 50), _env_float('RATE_LIMIT_READ_BURST', 100)),
+            "write": TokenBuckets(_env_float('RATE_LIMIT_WRITE_RPS', 5), _env_float('RATE_LIMIT_WRITE_BURST', 20)),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        lane_name = lane_for(scope["method"], scope["path"])
+        lane = self.lanes[lane_name]
+        try:
+            wait = self.buckets[lane_name].take(client_address(scope))
+            if wait:
+                raise Rejected(429, "rate_limited", math.ceil(wait))
+            await lane.acquire()
+        except Rejected as e:
+            ADMISSION_REJECTED.labels(lane_name, e.reason).inc()
+            await self._reject(send, e)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release()
+
+    @staticmethod
+    async def _reject(send, rejected: Rejected) -> None:
+        detail = "Too many requests" if rejected.status == 429 else "Server overloaded, retry later"
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": rejected.status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(max(1, rejected.retry_after)).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
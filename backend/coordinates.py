@@ -0,0 +1,140 @@
+"""
+Jednotné uložení souřadnic vzpomínek
+
+Starší inicializační skripty vytvářely sloupec coordinates jako GEOGRAPHY,
+database/init.sql jako GEOMETRY - dotazy proto všude přetypovávaly
+coordinates::geometry a souřadnice počítaly pro každý řádek přes ST_X/ST_Y.
+
+Migrace sjednotí schéma:
+
+- coordinates je GEOMETRY(Point, 4326) (GIST index se při změně typu přestaví),
+- lat a lon jsou generované sloupce (STORED) - čtou se přímo, bez výpočtu,
+- krycí index memories_pins_idx (created_at DESC) INCLUDE (id, location, lat, lon)
+  nahrazuje memories_created_at_idx, takže výpis pinů seřazený od nejnovějších
+  je index-only scan.
+
+Migrace je idempotentní. Změna typu a přidání generovaných sloupců přepisuje
+tabulku pod exkluzivním zámkem (a ruší index memories_created_at_idx), proto
+se spouští jen explicitně jako krok nasazení, ne v obsluhujícím workeru:
+
+    python backend/coordinates.py --database-url $DATABASE_URL
+
+Zahřátí workeru a zápisová cesta (memory_service.ensure_schema) jen ověří
+stav jedním dotazem do katalogu a nedokončenou migraci zalogují.
+"""
+
+from typing import Dict, Optional
+
+from db import connection, database_url
+from logging_config import get_logger
+from metrics import timed_execute
+from startup import on_warmup
+
+logger = get_logger("coordinates")
+
+# Cílový typ sloupce coordinates (výstup format_type)
+COORDINATES_TYPE = "geometry(Point,4326)"
+
+STATE_SQL = """
+    SELECT
+        (SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+         WHERE attrelid = 'memories'::regclass AND attname = 'coordinates' AND NOT attisdropped) AS coordinates_type,
+        EXISTS (SELECT 1 FROM pg_attribute
+                WHERE attrelid = 'memories'::regclass AND attname = 'lat' AND NOT attisdropped) AS has_lat,
+        EXISTS (SELECT 1 FROM pg_attribute
+                WHERE attrelid = 'memories'::regclass AND attname = 'lon' AND NOT attisdropped) AS has_lon,
+        to_regclass('memories_pins_idx') IS NOT NULL AS has_pins_index
+"""
+
+NORMALIZE_SQL = f"""
+    DO $$
+    BEGIN
+        IF (SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+            WHERE attrelid = 'memories'::regclass AND attname = 'coordinates') <> '{COORDINATES_TYPE}' THEN
+            ALTER TABLE memories
+                ALTER COLUMN coordinates TYPE GEOMETRY(Point, 4326)
+                USING ST_SetSRID(coordinates::geometry, 4326);
+        END IF;
+    END $$;
+    ALTER TABLE memories
+        ADD COLUMN IF NOT EXISTS lat DOUBLE PRECISION GENERATED ALWAYS AS (ST_Y(coordinates)) STORED,
+        ADD COLUMN IF NOT EXISTS lon DOUBLE PRECISION GENERATED ALWAYS AS (ST_X(coordinates)) STORED;
+    CREATE INDEX IF NOT EXISTS memories_pins_idx ON memories (created_at DESC) INCLUDE (id, location, lat, lon);
+    -- Krycí index nahrazuje původní index nad created_at
+    DROP INDEX IF EXISTS memories_created_at_idx;
+"""
+
+_schema_ready: Optional[bool] = None
+
+
+def state(cur) -> Dict[str, object]:
+    """Stav sloupců a indexu pro souřadnice"""
+    timed_execute(cur, "coordinates_state", STATE_SQL)
+    row = cur.fetchone()
+    if not isinstance(row, dict):
+        row = dict(zip(("coordinates_type", "has_lat", "has_lon", "has_pins_index"), row))
+    return dict(row)
+
+
+def is_normalized(current: Dict[str, object]) -> bool:
+    return (current["coordinates_type"] == COORDINATES_TYPE and current["has_lat"]
+            and current["has_lon"] and current["has_pins_index"])
+
+
+def ensure_schema(cur) -> bool:
+    """
+    Ověří, zda migrace proběhla (jednou za běh procesu), a pokud ne, zaloguje
+    varování. Samotnou migraci neprovádí - viz migrate().
+    """
+    global _schema_ready
+    if _schema_ready is None:
+        current = state(cur)
+        _schema_ready = is_normalized(current)
+        if not _schema_ready:
+            logger.warning("Souřadnice vzpomínek čekají na migraci (%s) - "
+                           "spusťte python backend/coordinates.py", current)
+    return _schema_ready
+
+
+def migrate(cur) -> None:
+    """Provede migraci (přepis tabulky pod exkluzivním zámkem) - jen z příkazové řádky"""
+    global _schema_ready
+    if not is_normalized(state(cur)):
+        timed_execute(cur, "coordinates_normalize", NORMALIZE_SQL)
+    _schema_ready = True
+
+
+@on_warmup
+def check_coordinates() -> None:
+    """Při zahřátí jen ověří stav migrace"""
+    if not database_url():
+        return
+    with connection() as conn:
+        with conn.cursor() as cur:
+            timed_execute(cur, "memories_table_exists", "SELECT to_regclass('memories') IS NOT NULL")
+            if cur.fetchone()[0]:
+                ensure_schema(cur)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description="Sjednocení typu souřadnic a generované sloupce lat/lon")
+    parser.add_argument("--database-url", default=database_url())
+    parser.add_argument("--check", action="store_true", help="Jen vypsat stav, nic neměnit")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Chybí --database-url nebo proměnná DATABASE_URL")
+
+    conn = psycopg2.connect(args.database_url)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        current = state(cur)
+        print(f"Stav: {current}")
+        if not args.check and not is_normalized(current):
+            migrate(cur)
+            timed_execute(cur, "coordinates_analyze", "VACUUM (ANALYZE) memories")
+            print(f"Po migraci: {state(cur)}")
+    conn.close()
@@ -0,0 +1,357 @@
+"""
+Správa databázových připojení
+
+Každý proces (worker) má vlastní connection pool, který se vytváří líně při
+prvním požadavku - nikdy ne v master procesu před forkem, takže se spojení
+mezi workery nesdílí. Velikost poolu se odvozuje z celkového rozpočtu spojení
+na databázi vyděleného počtem workerů:
+
+- DB_MAX_CONNECTIONS - celkový rozpočet spojení pro všechny workery (výchozí 8,
+  free plán na Render.com povoluje 10 současných připojení)
+- WEB_CONCURRENCY - počet workerů (nastavuje gunicorn.conf.py)
+- DB_POOL_MIN - počet spojení otevřených předem (výchozí 1)
+- DB_POOL_TIMEOUT - jak dlouho čekat na volné spojení v sekundách (výchozí 10)
+
+Čtecí repliky (volitelné):
+
+- DATABASE_REPLICA_URLS - URL replik oddělené čárkou; čtecí endpointy
+  (get_read_db) je střídají dokola, zápisy jdou vždy na primární databázi
+- DB_REPLICA_MAX_CONNECTIONS - rozpočet spojení na jednu repliku (výchozí DB_MAX_CONNECTIONS)
+- DB_REPLICA_EJECT_SECONDS - na jak dlouho se replika po chybě vyřadí (výchozí 30)
+- DB_READ_YOUR_WRITES_SECONDS - jak dlouho po zápisu platí cookie s pozicí WAL
+  (výchozí 30); čtení s cookie jde jen na repliku, která zápis už přehrála,
+  jinak na primární databázi
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import psycopg2
+from fastapi import HTTPException, Request, Response
+from psycopg2 import extensions, pool
+
+from logging_config import get_logger
+from metrics import timed_execute
+from startup import on_warmup
+
+logger = get_logger("db")
+
+# Proměnné prostředí, ve kterých hledáme URL databáze (v tomto pořadí)
+DATABASE_URL_ENV_VARS = ['DATABASE_URL', 'RENDER_DATABASE_URL', 'POSTGRES_URL', 'PG_URL']
+
+# Cookie s pozicí WAL posledního zápisu klienta (read-your-writes)
+LSN_COOKIE = "mm_write_lsn"
+
+
+def database_url() -> Optional[str]:
+    """Najde URL databáze v proměnných prostředí a převede ji pro psycopg2"""
+    for var in DATABASE_URL_ENV_VARS:
+        url = os.getenv(var)
+        if url:
+            logger.debug("Použití proměnné %s pro připojení k databázi", var)
+            return _normalize_url(url)
+    return None
+
+
+def replica_urls() -> List[str]:
+    """URL čtecích replik z DATABASE_REPLICA_URLS"""
+    return [_normalize_url(url.strip()) for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+
+
+def _normalize_url(url: str) -> str:
+    if url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+
+def pool_size(budget_env: str = 'DB_MAX_CONNECTIONS') -> int:
+    """Maximální počet spojení tohoto workeru podle celkového rozpočtu"""
+    budget = int(os.getenv(budget_env) or os.getenv('DB_MAX_CONNECTIONS', '8'))
+    workers = max(1, int(os.getenv('WEB_CONCURRENCY', '1')))
+    return max(1, budget // workers)
+
+
+def _connect_params(url: str) -> dict:
+    """
+    Parametry připojení z URL. Nejdříve zkusíme spojení bez SSL, při neúspěchu
+    použijeme SSL s ověřením certifikátu proti systémovým kořenovým CA.
+    """
+    parsed = urlparse(url)
+    params = {
+        "host": parsed.hostname,
+        "port": parsed.port or 5432,
+        "database": parsed.path[1:] if parsed.path else 'memorymap',
+        "user": parsed.username,
+        "password": parsed.password,
+        "connect_timeout": 10,
+    }
+    logger.debug("Připojuji s parametry: host=%s, port=%s, db=%s, user=%s",
+                 params["host"], params["port"], params["database"], params["user"])
+    try:
+        psycopg2.connect(**params).close()
+        logger.debug("Připojení bez SSL úspěšné")
+    except psycopg2.OperationalError as no_ssl_error:
+        logger.info("Připojení bez SSL selhalo, zkouším s SSL: %s", no_ssl_error)
+        params.update(sslmode='verify-full', sslrootcert='system')
+    return params
+
+
+class _LazyPool:
+    """Pool spojení k jedné databázi - vytváří se líně a po forku znovu"""
+
+    def __init__(self, name: str, url: Callable[[], Optional[str]], budget_env: str):
+        self.name = name
+        self._url = url
+        self._budget_env = budget_env
+        self._pool: Optional[pool.ThreadedConnectionPool] = None
+        self._pid: Optional[int] = None
+        self._slots: Optional[threading.BoundedSemaphore] = None
+        self._lock = threading.Lock()
+        # Stav pro /readyz - čte se bez otevírání spojení
+        self.maxconn = 0
+        self.in_use = 0
+        self._in_use_lock = threading.Lock()
+        self.last_ok: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+
+    def get(self) -> Tuple[pool.ThreadedConnectionPool, threading.BoundedSemaphore]:
+        """Vrátí pool aktuálního procesu a semafor volných spojení"""
+        pid = os.getpid()
+        if self._pool is not None and self._pid == pid:
+            return self._pool, self._slots
+
+        with self._lock:
+            if self._pool is not None and self._pid == pid:
+                return self._pool, self._slots
+
+            url = self._url()
+            if not url:
+                raise HTTPException(status_code=500, detail="Database configuration missing - no database URL found")
+
+            maxconn = pool_size(self._budget_env)
+            minconn = min(int(os.getenv('DB_POOL_MIN', '1')), maxconn)
+            try:
+                new_pool = pool.ThreadedConnectionPool(minconn, maxconn, **_connect_params(url))
+            except Exception as e:
+                logger.error("Chyba při vytváření connection poolu %s: %s", self.name, e)
+                self.record_error(e)
+                raise HTTPException(status_code=500, detail=f"Database connection failed: {str(e)}")
+
+            # Pool zděděný z rodičovského procesu nezavíráme - spojení patří rodiči
+            self._pool, self._pid = new_pool, pid
+            self._slots = threading.BoundedSemaphore(maxconn)
+            self.maxconn, self.in_use = maxconn, 0
+            logger.info("Connection pool %s vytvořen (pid=%s, min=%s, max=%s)", self.name, pid, minconn, maxconn)
+            return self._pool, self._slots
+
+    def track(self, delta: int) -> None:
+        with self._in_use_lock:
+            self.in_use += delta
+
+    def record_error(self, error: Exception) -> None:
+        self.last_error, self.last_error_at = str(error), time.time()
+
+    def state(self) -> dict:
+        """Stav poolu aktuálního procesu (bez vytváření poolu či spojení)"""
+        created = self._pool is not None and self._pid == os.getpid()
+        return {
+            "created": created,
+            "max_connections": self.maxconn if created else 0,
+            "in_use": self.in_use if created else 0,
+            "last_ok": self.last_ok,
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.closeall()
+            self._pool, self._pid = None, None
+
+
+class _Replica:
+    """Čtecí replika se stavem zdraví"""
+
+    def __init__(self, index: int, url: str):
+        self.name = f"replica-{index}"
+        self.pool = _LazyPool(self.name, lambda: url, 'DB_REPLICA_MAX_CONNECTIONS')
+        self.ejected_until = 0.0
+
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def eject(self, error: Exception) -> None:
+        """Vyřadí repliku na DB_REPLICA_EJECT_SECONDS"""
+        self.ejected_until = time.monotonic() + float(os.getenv('DB_REPLICA_EJECT_SECONDS', '30'))
+        logger.warning("Replika %s vyřazena: %s", self.name, error)
+
+
+_primary = _LazyPool("primary", database_url, 'DB_MAX_CONNECTIONS')
+_replicas: List[_Replica] = [_Replica(i, url) for i, url in enumerate(replica_urls())]
+_next_replica = 0
+_replica_lock = threading.Lock()
+
+
+def _get_pool() -> pool.ThreadedConnectionPool:
+    """Pool primární databáze aktuálního procesu"""
+    return _primary.get()[0]
+
+
+@contextmanager
+def _borrow(lazy_pool: _LazyPool):
+    """
+    Zapůjčí spojení z poolu a po použití jej vrátí. Pokud jsou všechna spojení
+    obsazená, čeká nejvýše DB_POOL_TIMEOUT sekund a poté vrátí 503.
+    """
+    db_pool, slots = lazy_pool.get()
+    if not slots.acquire(timeout=float(os.getenv('DB_POOL_TIMEOUT', '10'))):
+        raise HTTPException(status_code=503, detail="Database pool exhausted")
+
+    try:
+        conn = db_pool.getconn()
+        conn.autocommit = True
+    except Exception as e:
+        slots.release()
+        logger.error("Database connection error (%s): %s", lazy_pool.name, e)
+        lazy_pool.record_error(e)
+        raise HTTPException(status_code=500, detail=f"Database connection failed: {str(e)}")
+
+    lazy_pool.track(1)
+    try:
+        yield conn
+        lazy_pool.last_ok = time.time()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+        lazy_pool.record_error(e)
+        raise
+    finally:
+        lazy_pool.track(-1)
+        broken = conn.closed != 0
+        if not broken and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        db_pool.putconn(conn, close=broken)
+        slots.release()
+
+
+@contextmanager
+def connection():
+    """Spojení na primární databázi (zápisy a čtení, která musí být aktuální)"""
+    with _borrow(_primary) as conn:
+        yield conn
+
+
+def _replica_order() -> List[_Replica]:
+    """Zdravé repliky v pořadí round-robin"""
+    global _next_replica
+    with _replica_lock:
+        start = _next_replica
+        _next_replica = (_next_replica + 1) % max(1, len(_replicas))
+    ordered = _replicas[start:] + _replicas[:start]
+    return [replica for replica in ordered if replica.healthy()]
+
+
+@contextmanager
+def read_connection(min_lsn: Optional[str] = None, node: Optional[List[str]] = None):
+    """
+    Spojení pro čtení - na zdravou repliku, která už přehrála zápis min_lsn,
+    jinak na primární databázi. Do seznamu node zapíše název zvoleného uzlu.
+    """
+    for replica in _replica_order():
+        served = False
+        try:
+            with _borrow(replica.pool) as conn:
+                if min_lsn:
+                    with conn.cursor() as cur:
+                        timed_execute(cur, "replica_lsn_check",
+                                      "SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn", (min_lsn,))
+                        caught_up = cur.fetchone()[0]
+                    if not caught_up:
+                        continue
+                if node is not None:
+                    node.append(replica.name)
+                served = True
+                yield conn
+                return
+        except psycopg2.errors.QueryCanceled:
+            # Překročený statement_timeout je chyba dotazu, ne repliky - replika zůstává zdravá
+            raise
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            replica.eject(e)
+            # Chyba uprostřed čtení už nejde zopakovat na jiném uzlu
+            if served:
+                raise HTTPException(status_code=503, detail="Read replica failed")
+        except HTTPException as e:
+            if served:
+                raise
+            # Nepodařené spojení repliku vyřadí; plný pool (503) jen přeskočí na další uzel
+            if e.status_code == 500:
+                replica.eject(e)
+
+    if node is not None:
+        node.append("primary")
+    with connection() as conn:
+        yield conn
+
+
+def get_db():
+    """FastAPI závislost - spojení z poolu po dobu zpracování požadavku"""
+    with connection() as conn:
+        yield conn
+
+
+def get_read_db(request: Request, response: Response):
+    """
+    FastAPI závislost pro čtecí endpointy - spojení na repliku (pokud jsou
+    nastavené) s ohledem na cookie posledního zápisu klienta
+    """
+    node: List[str] = []
+    with read_connection(request.cookies.get(LSN_COOKIE), node) as conn:
+        response.headers["X-DB-Node"] = node[0]
+        yield conn
+
+
+def remember_write(conn, response: Response) -> None:
+    """
+    Po zápisu uloží klientovi pozici WAL primární databáze, aby jeho následná
+    čtení šla jen na repliky, které zápis už mají (jen pokud jsou repliky)
+    """
+    if not _replicas:
+        return
+    with conn.cursor() as cur:
+        timed_execute(cur, "current_wal_lsn", "SELECT pg_current_wal_lsn()::text")
+        lsn = cur.fetchone()[0]
+    response.set_cookie(LSN_COOKIE, lsn, max_age=int(os.getenv('DB_READ_YOUR_WRITES_SECONDS', '30')),
+                        httponly=True, samesite="lax")
+
+
+def pool_state() -> dict:
+    """Stav poolů primární databáze a replik pro health/readiness endpointy"""
+    return {
+        "primary": _primary.state(),
+        "replicas": {replica.name: dict(replica.pool.state(), healthy=replica.healthy()) for replica in _replicas},
+    }
+
+
+def close_pool() -> None:
+    """Uzavře pooly aktuálního procesu (při ukončení workeru)"""
+    _primary.close()
+    for replica in _replicas:
+        replica.pool.close()
+
+
+@on_warmup
+def warm_pool() -> None:
+    """Otevře pool a ověří spojení ještě před prvním požadavkem"""
+    if not database_url():
+        return
+    with connection() as conn:
+        with conn.cursor() as cur:
+            timed_execute(cur, "warmup_ping", "SELECT 1")
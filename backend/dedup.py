@@ -0,0 +1,194 @@
+"""
+Detekce téměř duplicitních vzpomínek pomocí MinHash a LSH
+
+Text vzpomínky se rozloží na znakové n-gramy (shingles), z nich se spočítá
+MinHash signatura a ta se rozdělí do pásem (bands). Každé pásmo se zahashuje
+do bucketu, který se uloží do indexované tabulky memory_lsh. Kandidáti na
+duplicitu jsou vzpomínky, které sdílí alespoň jeden bucket - hledání je tedy
+dotaz do indexu (band, bucket), ne porovnání se všemi vzpomínkami.
+
+S 16 pásmy po 4 řádcích je práh, od kterého se dvojice s vysokou
+pravděpodobností stane kandidátem, zhruba Jaccardova podobnost 0.5.
+Přesnější odhad podobnosti se pak spočítá ze shody signatur.
+"""
+
+import hashlib
+import os
+import random
+import re
+import struct
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metrics import timed_execute
+
+# Parametry MinHash / LSH
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+
+# Výchozí práh odhadnuté Jaccardovy podobnosti pro odmítnutí duplicity při vkládání
+DEDUPE_THRESHOLD = float(os.getenv('DEDUPE_THRESHOLD', '0.8'))
+
+# Mersennovo prvočíslo 2^61 - 1 pro univerzální hashování
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Koeficienty permutací jsou pevné, aby signatury zůstaly porovnatelné mezi procesy
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS memory_minhash (
+        memory_id INTEGER PRIMARY KEY,
+        signature BIGINT[] NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS memory_lsh (
+        band SMALLINT NOT NULL,
+        bucket BIGINT NOT NULL,
+        memory_id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, memory_id)
+    );
+    CREATE INDEX IF NOT EXISTS memory_lsh_memory_idx ON memory_lsh (memory_id);
+"""
+
+_schema_ready = False
+
+
+def ensure_schema(cur) -> None:
+    """Vytvoří tabulky pro LSH index (jednou za běh procesu)"""
+    global _schema_ready
+    if not _schema_ready:
+        timed_execute(cur, "dedup_schema", SCHEMA_SQL)
+        _schema_ready = True
+
+
+def _normalize(text: str) -> str:
+    """Malá písmena, bez diakritiky a interpunkce, jednoduché mezery"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", text)).strip()
+
+
+def shingles(text: str) -> set:
+    """Množina znakových n-gramů zahashovaných na 32 bitů"""
+    normalized = _normalize(text)
+    if len(normalized) <= SHINGLE_SIZE:
+        grams = {normalized}
+    else:
+        grams = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    return {struct.unpack("<I", hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest())[0] for g in grams}
+
+
+def signature(text: str) -> List[int]:
+    """MinHash signatura textu (NUM_PERM hodnot menších než 2^61)"""
+    hashed = shingles(text)
+    if not hashed:
+        return [_MAX_HASH] * NUM_PERM
+    return [min((a * h + b) % _PRIME for h in hashed) for a, b in _PERMUTATIONS]
+
+
+def band_buckets(sig: Sequence[int]) -> Tuple[List[int], List[int]]:
+    """Rozdělí signaturu do pásem a vrátí paralelní seznamy (band, bucket)"""
+    bands, buckets = [], []
+    for band in range(BANDS):
+        chunk = sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f"<{ROWS_PER_BAND}q", *chunk), digest_size=8).digest()
+        bands.append(band)
+        buckets.append(struct.unpack("<q", digest)[0])
+    return bands, buckets
+
+
+def similarity(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+    """Odhad Jaccardovy podobnosti jako podíl shodných pozic signatur"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+
+def index_memory(cur, memory_id: int, sig: Sequence[int]) -> None:
+    """Uloží signaturu a LSH buckety vzpomínky jedním dotazem"""
+    bands, buckets = band_buckets(sig)
+    timed_execute(cur, "dedup_index", """
+        WITH stored AS (
+            INSERT INTO memory_minhash (memory_id, signature) VALUES (%s, %s)
+            ON CONFLICT (memory_id) DO UPDATE SET signature = EXCLUDED.signature
+        )
+        INSERT INTO memory_lsh (band, bucket, memory_id)
+        SELECT band, bucket, %s FROM unnest(%s::smallint[], %s::bigint[]) AS t(band, bucket)
+        ON CONFLICT DO NOTHING
+    """, (memory_id, list(sig), memory_id, bands, buckets))
+
+
+def find_duplicates(cur, sig: Sequence[int], threshold: float,
+                    exclude_id: Optional[int] = None, limit: int = 20) -> List[Dict[str, object]]:
+    """
+    Najde vzpomínky, které s danou signaturou sdílí LSH bucket a jejichž
+    odhadnutá podobnost dosahuje prahu. Výsledek je seřazen od nejpodobnějších.
+
+    Signatury nemají cizí klíč na memories - smazané nebo odpojené (partitioning.py
+    detach) vzpomínky odfiltruje spojení s tabulkou memories.
+    """
+    bands, buckets = band_buckets(sig)
+    timed_execute(cur, "dedup_candidates", """
+        SELECT m.memory_id, m.signature
+        FROM memory_minhash m
+        JOIN memories m2 ON m2.id = m.memory_id
+        WHERE m.memory_id IN (
+            SELECT l.memory_id
+            FROM memory_lsh l
+            JOIN unnest(%s::smallint[], %s::bigint[]) AS q(band, bucket)
+              ON l.band = q.band AND l.bucket = q.bucket
+        )
+        AND m.memory_id IS DISTINCT FROM %s
+    """, (bands, buckets, exclude_id))
+
+    matches = []
+    for row in cur.fetchall():
+        memory_id, candidate_sig = (row["memory_id"], row["signature"]) if isinstance(row, dict) else row
+        score = similarity(sig, candidate_sig)
+        if score >= threshold:
+            matches.append({"id": memory_id, "similarity": round(score, 3)})
+    matches.sort(key=lambda m: m["similarity"], reverse=True)
+    return matches[:limit]
+
+
+def backfill(conn, batch_size: int = 1000) -> int:
+    """Dopočítá signatury vzpomínkám vloženým mimo API (hromadný import, seed)"""
+    total = 0
+    with conn.cursor() as cur:
+        ensure_schema(cur)
+        while True:
+            timed_execute(cur, "dedup_backfill_batch", """
+                SELECT m.id, m.text
+                FROM memories m
+                LEFT JOIN memory_minhash h ON h.memory_id = m.id
+                WHERE h.memory_id IS NULL
+                ORDER BY m.id
+                LIMIT %s
+            """, (batch_size,))
+            rows = cur.fetchall()
+            if not rows:
+                return total
+            for memory_id, text in rows:
+                index_memory(cur, memory_id, signature(text or ""))
+            total += len(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import psycopg2
+
+    from db import database_url
+
+    parser = argparse.ArgumentParser(description="Dopočítání MinHash signatur pro existující vzpomínky")
+    parser.add_argument("--database-url", default=database_url())
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Chybí --database-url nebo proměnná DATABASE_URL")
+
+    connection = psycopg2.connect(args.database_url)
+    connection.autocommit = True
+    print(f"Zaindexováno {backfill(connection, args.batch_size)} vzpomínek")
+    connection.close()
@@ -0,0 +1,229 @@
+"""
+Hustota vzpomínek pro přehledová měřítka mapy
+
+Čtvercová mřížka je předpočítaná jako pyramida přes úrovně přiblížení
+DENSITY_MIN_ZOOM..DENSITY_MAX_ZOOM (tabulka memory_density). Buňka na úrovni
+z má stranu 360 / 2^(z + 4) stupňů, tj. 16 buněk na šířku jedné mapové
+dlaždice. Pyramidu udržují příkazové (FOR EACH STATEMENT) triggery nad
+memories - jeden INSERT nebo COPY s tisíci řádky znamená jednu agregovanou
+aktualizaci, ne tisíce.
+
+Šestiúhelníková mřížka se počítá za běhu přes ST_HexagonGrid v metrech
+(EPSG:3857) a počty se berou přes GIST index pro každý šestiúhelník zvlášť.
+
+Odpověď má velikost úměrnou počtu buněk, ne počtu vzpomínek.
+"""
+
+import math
+import os
+from typing import Any, Dict, List, Tuple
+
+from logging_config import get_logger
+from metrics import timed_execute
+
+logger = get_logger("density")
+
+DENSITY_MIN_ZOOM = 3
+DENSITY_MAX_ZOOM = 12
+# Počet buněk na šířku jedné mapové dlaždice jako mocnina dvou (2^4 = 16)
+CELLS_PER_TILE_LOG2 = 4
+# Nejvyšší počet buněk v jedné odpovědi - při překročení se zvolí hrubší úroveň
+DENSITY_MAX_CELLS = int(os.getenv('DENSITY_MAX_CELLS', '20000'))
+
+# Délka hrany dlaždice v metrech na rovníku pro zoom 0 (Web Mercator)
+_TILE_METERS_Z0 = 40075016.686
+
+CELL_SHAPES = ("square", "hex")
+
+# Funkce přičtení zvlášť - CREATE OR REPLACE FUNCTION nebere zámek nad memories,
+# takže se při startu obnoví i v existující databázi
+APPLY_SQL = f"""
+    CREATE OR REPLACE FUNCTION memory_density_apply(lons DOUBLE PRECISION[], lats DOUBLE PRECISION[], delta INTEGER)
+    RETURNS void AS $$
+        INSERT INTO memory_density (zoom, cell_x, cell_y, count)
+        SELECT z.zoom,
+               floor(p.lon * (2 ^ (z.zoom + {CELLS_PER_TILE_LOG2})) / 360)::int,
+               floor(p.lat * (2 ^ (z.zoom + {CELLS_PER_TILE_LOG2})) / 360)::int,
+               (delta * count(*))::int
+        FROM unnest(lons, lats) AS p(lon, lat)
+        CROSS JOIN generate_series({DENSITY_MIN_ZOOM}, {DENSITY_MAX_ZOOM}) AS z(zoom)
+        GROUP BY 1, 2, 3
+        -- Pevné pořadí zamykání buněk - souběžné vkládání do stejných hrubých buněk se nezablokuje
+        ORDER BY 1, 2, 3
+        ON CONFLICT (zoom, cell_x, cell_y) DO UPDATE SET count = memory_density.count + EXCLUDED.count;
+    $$ LANGUAGE sql;
+"""
+
+SCHEMA_SQL = f"""
+    CREATE TABLE IF NOT EXISTS memory_density (
+        zoom SMALLINT NOT NULL,
+        cell_x INTEGER NOT NULL,
+        cell_y INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (zoom, cell_x, cell_y)
+    );
+
+{APPLY_SQL}
+    CREATE OR REPLACE FUNCTION memory_density_refresh() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM memory_density_apply(array_agg(ST_X(coordinates::geometry)), array_agg(ST_Y(coordinates::geometry)), 1)
+            FROM new_rows;
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM memory_density_apply(array_agg(ST_X(coordinates::geometry)), array_agg(ST_Y(coordinates::geometry)), -1)
+            FROM old_rows;
+        ELSE
+            -- Při UPDATE jen řádky, kterým se změnila poloha
+            PERFORM memory_density_apply(array_agg(ST_X(o.coordinates::geometry)), array_agg(ST_Y(o.coordinates::geometry)), -1)
+            FROM old_rows o JOIN new_rows n ON n.id = o.id
+            WHERE NOT ST_Equals(o.coordinates::geometry, n.coordinates::geometry);
+            PERFORM memory_density_apply(array_agg(ST_X(n.coordinates::geometry)), array_agg(ST_Y(n.coordinates::geometry)), 1)
+            FROM old_rows o JOIN new_rows n ON n.id = o.id
+            WHERE NOT ST_Equals(o.coordinates::geometry, n.coordinates::geometry);
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS memories_density_insert ON memories;
+    CREATE TRIGGER memories_density_insert AFTER INSERT ON memories
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION memory_density_refresh();
+    DROP TRIGGER IF EXISTS memories_density_delete ON memories;
+    CREATE TRIGGER memories_density_delete AFTER DELETE ON memories
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION memory_density_refresh();
+    DROP TRIGGER IF EXISTS memories_density_update ON memories;
+    CREATE TRIGGER memories_density_update AFTER UPDATE ON memories
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION memory_density_refresh();
+"""
+
+_schema_ready = False
+
+
+def ensure_schema(cur) -> None:
+    """
+    Při prvním použití vytvoří pyramidu a triggery a naplní ji z existujících
+    vzpomínek. Pokud tabulka už existuje (init.sql, jiný worker), DDL se
+    nespouští - nad memories by zbytečně bralo exkluzivní zámek.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    timed_execute(cur, "density_schema_check", "SELECT to_regclass('memory_density') IS NOT NULL AS present")
+    row = cur.fetchone()
+    present = row["present"] if isinstance(row, dict) else row[0]
+    if not present:
+        logger.info("Vytvářím pyramidu hustoty vzpomínek")
+        timed_execute(cur, "density_schema", SCHEMA_SQL)
+        rebuild(cur)
+    else:
+        timed_execute(cur, "density_functions", APPLY_SQL)
+        # Tabulka z init.sql nad databází, která už vzpomínky obsahovala
+        timed_execute(cur, "density_empty_check", """
+            SELECT NOT EXISTS (SELECT 1 FROM memory_density) AND EXISTS (SELECT 1 FROM memories) AS stale
+        """)
+        row = cur.fetchone()
+        if row["stale"] if isinstance(row, dict) else row[0]:
+            logger.info("Pyramida hustoty je prázdná, přepočítávám ji")
+            rebuild(cur)
+    _schema_ready = True
+
+
+def rebuild(cur) -> None:
+    """Přepočítá celou pyramidu z tabulky memories (po hromadném importu bez triggerů)"""
+    timed_execute(cur, "density_rebuild", """
+        TRUNCATE memory_density;
+        SELECT memory_density_apply(array_agg(ST_X(coordinates::geometry)), array_agg(ST_Y(coordinates::geometry)), 1)
+        FROM memories;
+    """)
+
+
+def cell_size_degrees(zoom: int) -> float:
+    """Strana čtvercové buňky ve stupních"""
+    return 360.0 / 2 ** (zoom + CELLS_PER_TILE_LOG2)
+
+
+def hex_size_meters(zoom: int) -> float:
+    """Velikost šestiúhelníku v metrech odpovídající čtvercové buňce na dané úrovni"""
+    return _TILE_METERS_Z0 / 2 ** (zoom + CELLS_PER_TILE_LOG2)
+
+
+def _cell_range(bbox: Tuple[float, float, float, float], zoom: int) -> Tuple[int, int, int, int]:
+    size = cell_size_degrees(zoom)
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return (math.floor(min_lon / size), math.floor(min_lat / size),
+            math.floor(max_lon / size), math.floor(max_lat / size))
+
+
+def effective_zoom(bbox: Tuple[float, float, float, float], zoom: int) -> int:
+    """Úroveň pyramidy - oříznutá na rozsah a případně zhrubená kvůli počtu buněk"""
+    zoom = max(DENSITY_MIN_ZOOM, min(zoom, DENSITY_MAX_ZOOM))
+    while zoom > DENSITY_MIN_ZOOM:
+        min_x, min_y, max_x, max_y = _cell_range(bbox, zoom)
+        if (max_x - min_x + 1) * (max_y - min_y + 1) <= DENSITY_MAX_CELLS:
+            break
+        zoom -= 1
+    return zoom
+
+
+def square_cells(cur, bbox: Tuple[float, float, float, float], zoom: int) -> List[List[float]]:
+    """Buňky pyramidy v bbox jako [lat, lon, počet] (střed buňky)"""
+    min_x, min_y, max_x, max_y = _cell_range(bbox, zoom)
+    timed_execute(cur, "density_square", """
+        SELECT cell_x, cell_y, count
+        FROM memory_density
+        WHERE zoom = %s AND cell_x BETWEEN %s AND %s AND cell_y BETWEEN %s AND %s AND count > 0
+    """, (zoom, min_x, max_x, min_y, max_y))
+    size = cell_size_degrees(zoom)
+    cells = []
+    for row in cur.fetchall():
+        x, y, count = (row["cell_x"], row["cell_y"], row["count"]) if isinstance(row, dict) else row
+        cells.append([round((y + 0.5) * size, 6), round((x + 0.5) * size, 6), count])
+    return cells
+
+
+def hex_cells(cur, bbox: Tuple[float, float, float, float], zoom: int) -> List[List[float]]:
+    """Šestiúhelníková mřížka počítaná za běhu jako [lat, lon, počet] (těžiště šestiúhelníku)"""
+    timed_execute(cur, "density_hex", """
+        WITH bounds AS (
+            SELECT ST_Transform(ST_MakeEnvelope(%s, %s, %s, %s, 4326), 3857) AS geom
+        ),
+        hexes AS (
+            SELECT ST_Transform(h.geom, 4326) AS geom
+            FROM bounds, ST_HexagonGrid(%s, bounds.geom) AS h
+        )
+        SELECT ST_Y(ST_Centroid(hexes.geom)) AS lat, ST_X(ST_Centroid(hexes.geom)) AS lon, c.count
+        FROM hexes
+        CROSS JOIN LATERAL (
+            SELECT count(*) AS count
+            FROM memories m
+            WHERE m.coordinates::geometry && hexes.geom
+              AND ST_Intersects(m.coordinates::geometry, hexes.geom)
+        ) c
+        WHERE c.count > 0
+    """, (*bbox, hex_size_meters(zoom)))
+    cells = []
+    for row in cur.fetchall():
+        lat, lon, count = (row["lat"], row["lon"], row["count"]) if isinstance(row, dict) else row
+        cells.append([round(lat, 6), round(lon, 6), count])
+    return cells
+
+
+def density(cur, bbox: Tuple[float, float, float, float], zoom: int, cell: str = "square") -> Dict[str, Any]:
+    """Mřížka počtů vzpomínek pro bbox a úroveň přiblížení"""
+    zoom = effective_zoom(bbox, zoom)
+    if cell == "hex":
+        cells = hex_cells(cur, bbox, zoom)
+        size = hex_size_meters(zoom)
+    else:
+        ensure_schema(cur)
+        cells = square_cells(cur, bbox, zoom)
+        size = cell_size_degrees(zoom)
+    return {
+        "zoom": zoom,
+        "cell": cell,
+        "cell_size": size,
+        "max_count": max((c[2] for c in cells), default=0),
+        "cells": cells,
+    }
@@ -0,0 +1,92 @@
+"""
+Levné health/readiness kontroly a cachované diagnostické snímky
+
+/healthz a /readyz neotevírají žádné spojení - odpovídají ze stavu zahřátí
+(startup.warmup_state) a ze stavu connection poolů, který si db.py průběžně
+zaznamenává při půjčování spojení.
+
+/api/debug a /api/diagnostic vrací snímek, který se přepočítá nejvýše jednou
+za DIAGNOSTIC_CACHE_SECONDS (výchozí 30) v každém workeru; souběžné požadavky
+na prošlý snímek sdílí jeden výpočet (singleflight). Počty řádků se berou
+z odhadu pg_class.reltuples místo COUNT(*), který by procházel celou tabulku.
+"""
+
+import os
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import singleflight
+from db import database_url, pool_state
+from metrics import timed_execute
+from startup import warmup_state
+
+DIAGNOSTIC_CACHE_SECONDS = float(os.getenv('DIAGNOSTIC_CACHE_SECONDS', '30'))
+
+# Jak dlouho po chybě spojení (bez následného úspěchu) hlásí /readyz nepřipravenost
+READY_ERROR_WINDOW_SECONDS = float(os.getenv('READY_ERROR_WINDOW_SECONDS', '30'))
+
+
+class CachedSnapshot:
+    """Výsledek blokující funkce platný ttl sekund (přepočet ve vlákně)"""
+
+    def __init__(self, name: str, func: Callable[[], Dict[str, Any]], ttl: float = DIAGNOSTIC_CACHE_SECONDS):
+        self.name = name
+        self.func = func
+        self.ttl = ttl
+        self._value: Optional[Dict[str, Any]] = None
+        self._taken_at = 0.0
+
+    async def get(self) -> Tuple[Dict[str, Any], float]:
+        """Vrátí snímek a jeho stáří v sekundách"""
+        if self._value is None or time.monotonic() - self._taken_at >= self.ttl:
+            self._value = await singleflight.do(self.name, (), self.func)
+            self._taken_at = time.monotonic()
+        return self._value, round(time.monotonic() - self._taken_at, 3)
+
+
+def estimated_counts(cur, tables) -> Dict[str, Optional[int]]:
+    """
+    Odhad počtu řádků z pg_class.reltuples (aktualizuje ANALYZE/autovacuum).
+    Tabulka, která ještě nebyla analyzována, má odhad None.
+    """
+    timed_execute(cur, "estimated_counts", """
+        SELECT c.relname, c.reltuples::bigint AS estimate
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = ANY(%s)
+    """, (list(tables),))
+    counts: Dict[str, Optional[int]] = {}
+    for row in cur.fetchall():
+        name, estimate = (row["relname"], row["estimate"]) if isinstance(row, dict) else row
+        counts[name] = estimate if estimate >= 0 else None
+    return counts
+
+
+def health() -> Dict[str, Any]:
+    """Liveness - proces běží a obsluhuje požadavky"""
+    return {"status": "ok", "pid": os.getpid()}
+
+
+def readiness() -> Tuple[bool, Dict[str, Any]]:
+    """
+    Readiness - zahřátí doběhlo a poslední pokus o spojení s primární databází
+    neskončil chybou (v posledních READY_ERROR_WINDOW_SECONDS)
+    """
+    pools = pool_state()
+    primary = pools["primary"]
+    checks = {"database_configured": database_url() is not None}
+    # Bez zahřátí (WARMUP_ENABLED=0) se pool vytvoří až při prvním požadavku
+    if os.getenv("WARMUP_ENABLED", "1") != "0":
+        checks.update(
+            warmup_finished=warmup_state["finished"] is not None,
+            warmup_ok=not warmup_state["errors"],
+            pool_created=primary["created"],
+        )
+    error_at = primary["last_error_at"]
+    checks["database_reachable"] = not (
+        error_at is not None
+        and time.time() - error_at < READY_ERROR_WINDOW_SECONDS
+        and (primary["last_ok"] is None or primary["last_ok"] < error_at)
+    )
+    ready = all(checks.values())
+    return ready, {"status": "ready" if ready else "not_ready", "checks": checks, "pools": pools}
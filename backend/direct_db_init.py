@@ -48,17 +48,28 @@ def init_db_direct():
                     id SERIAL PRIMARY KEY,
                     text TEXT NOT NULL,
                     location VARCHAR(255) NOT NULL,
-                    coordinates GEOGRAPHY(POINT, 4326) NOT NULL,
+                    coordinates GEOMETRY(Point, 4326) NOT NULL,
                     keywords TEXT[],
                     source TEXT,
                     date TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    -- Souřadnice jako generované sloupce (backend/coordinates.py)
+                    lat DOUBLE PRECISION GENERATED ALWAYS AS (ST_Y(coordinates)) STORED,
+                    lon DOUBLE PRECISION GENERATED ALWAYS AS (ST_X(coordinates)) STORED
                 );
             ''')
             print("Tabulka memories vytvořena")
         except Exception as e:
             print(f"Chyba při vytváření tabulky: {str(e)}")
         
+        # Krycí index pro výpis pinů od nejnovějších (index-only scan)
+        print("Vytvářím indexy...")
+        try:
+            cur.execute('CREATE INDEX IF NOT EXISTS memories_pins_idx ON memories (created_at DESC) INCLUDE (id, location, lat, lon);')
+            print("Indexy vytvořeny")
+        except Exception as e:
+            print(f"Chyba při vytváření indexů: {str(e)}")
+        
         # Přidání testovacích dat
         print("Přidávám testovací data...")
         try:
@@ -0,0 +1,290 @@
+"""
+Sémantická podobnost vzpomínek pomocí vektorových reprezentací (embeddingů)
+
+Vektory se počítají na CPU:
+
+- pokud je nainstalován balíček sentence-transformers a je nastaven
+  EMBEDDING_MODEL (např. sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2),
+  použije se lokální model,
+- jinak se použije hashovací vektorizér (slova + znakové trigramy bez diakritiky),
+  který nepotřebuje žádný model ani další závislosti.
+
+Vektory se ukládají do tabulky memory_embeddings jako pgvector halfvec
+(float16, polovina místa oproti float32) a vyhledávají přes HNSW index
+s kosinovou vzdáleností. Nové vzpomínky se neembeddují v požadavku, ale
+zařadí se do fronty, kterou vlákno na pozadí zpracovává po dávkách.
+
+Proměnné prostředí:
+- EMBEDDING_MODEL - název modelu sentence-transformers (výchozí žádný = hashovací vektorizér)
+- EMBEDDING_DIM - dimenze vektorů (výchozí 384, musí odpovídat modelu)
+- EMBEDDING_BATCH_SIZE - velikost dávky při výpočtu (výchozí 64)
+- EMBEDDING_FLUSH_SECONDS - jak dlouho čekat na naplnění dávky (výchozí 2)
+"""
+
+import hashlib
+import math
+import os
+import queue
+import re
+import struct
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from logging_config import get_logger
+from metrics import timed_execute
+from startup import optional_lazy_import
+
+logger = get_logger("embeddings")
+
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', '')
+EMBEDDING_DIM = int(os.getenv('EMBEDDING_DIM', '384'))
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+EMBEDDING_FLUSH_SECONDS = float(os.getenv('EMBEDDING_FLUSH_SECONDS', '2'))
+
+HASHING_MODEL_NAME = f"hashing-{EMBEDDING_DIM}"
+
+SCHEMA_SQL = f"""
+    CREATE EXTENSION IF NOT EXISTS vector;
+    CREATE TABLE IF NOT EXISTS memory_embeddings (
+        memory_id INTEGER PRIMARY KEY,
+        model VARCHAR(255) NOT NULL,
+        embedding halfvec({EMBEDDING_DIM}) NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS memory_embeddings_hnsw_idx
+        ON memory_embeddings USING hnsw (embedding halfvec_cosine_ops);
+"""
+
+# None = zatím neověřeno, False = pgvector v databázi chybí
+_schema_ready: Optional[bool] = None
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+class EmbeddingsUnavailable(RuntimeError):
+    """Databáze nemá rozšíření pgvector"""
+
+
+def ensure_schema(cur) -> bool:
+    """
+    Vytvoří tabulku a HNSW index (jednou za běh procesu), vrátí dostupnost pgvector.
+    Trvale se zapamatuje jen chybějící rozšíření - po jiné chybě (výpadek spojení,
+    timeout zámku při startu) se schéma zkusí vytvořit při dalším volání znovu.
+    """
+    global _schema_ready
+    if _schema_ready is None:
+        try:
+            timed_execute(cur, "embeddings_extension", """
+                SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'vector') AS available
+            """)
+            row = cur.fetchone()
+            if not (row["available"] if isinstance(row, dict) else row[0]):
+                logger.warning("Sémantické vyhledávání není dostupné: databáze nemá rozšíření pgvector")
+                _schema_ready = False
+                return False
+            timed_execute(cur, "embeddings_schema", SCHEMA_SQL)
+            _schema_ready = True
+        except Exception as e:
+            logger.warning("Schéma embeddingů se nepodařilo vytvořit, zkusí se znovu: %s", e)
+            return False
+    return _schema_ready
+
+
+def _normalize(text: str) -> str:
+    """Malá písmena bez diakritiky"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _hash_feature(feature: str) -> Tuple[int, float]:
+    """Index dimenze a znaménko příznaku (hashing trick)"""
+    value = struct.unpack("<Q", hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest())[0]
+    return value % EMBEDDING_DIM, 1.0 if value >> 63 else -1.0
+
+
+def hashing_vector(text: str) -> List[float]:
+    """
+    Vektor z hashovaných příznaků - celá slova a znakové trigramy slov, takže
+    různé tvary téhož slova (vesnice/vesnici) sdílí většinu příznaků
+    """
+    vector = [0.0] * EMBEDDING_DIM
+    for word in re.findall(r"\w+", _normalize(text)):
+        if len(word) < 3:
+            continue
+        index, sign = _hash_feature("w:" + word)
+        vector[index] += sign
+        padded = f"<{word}>"
+        for i in range(len(padded) - 2):
+            index, sign = _hash_feature("g:" + padded[i:i + 3])
+            vector[index] += 0.5 * sign
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else vector
+
+
+def _get_encoder():
+    """Lokální model sentence-transformers, nebo None pro hashovací vektorizér"""
+    global _encoder
+    if not EMBEDDING_MODEL:
+        return None
+    with _encoder_lock:
+        if _encoder is None:
+            sentence_transformers = optional_lazy_import("sentence_transformers")
+            if sentence_transformers is None:
+                logger.warning("sentence-transformers není nainstalován, použije se hashovací vektorizér")
+                _encoder = False
+            else:
+                _encoder = sentence_transformers.SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+        return _encoder or None
+
+
+def model_name() -> str:
+    """Název modelu, kterým se vektory počítají (ukládá se k vektoru)"""
+    return EMBEDDING_MODEL if _get_encoder() is not None else HASHING_MODEL_NAME
+
+
+def embed_batch(texts: Sequence[str]) -> List[List[float]]:
+    """Normalizované vektory pro dávku textů"""
+    encoder = _get_encoder()
+    if encoder is None:
+        return [hashing_vector(text) for text in texts]
+    vectors = encoder.encode(list(texts), batch_size=EMBEDDING_BATCH_SIZE, normalize_embeddings=True)
+    return [vector.tolist() for vector in vectors]
+
+
+def to_literal(vector: Sequence[float]) -> str:
+    """Textový zápis vektoru pro pgvector ('[0.1,0.2,...]')"""
+    return "[" + ",".join(f"{v:.5g}" for v in vector) + "]"
+
+
+def store_embeddings(cur, items: Sequence[Tuple[int, str]]) -> List[str]:
+    """Spočítá a uloží vektory pro dvojice (memory_id, text) jedním dotazem, vrátí jejich zápis"""
+    if not items:
+        return []
+    ids = [memory_id for memory_id, _ in items]
+    literals = [to_literal(v) for v in embed_batch([text or "" for _, text in items])]
+    timed_execute(cur, "embeddings_store", """
+        INSERT INTO memory_embeddings (memory_id, model, embedding)
+        SELECT memory_id, %s, embedding::halfvec
+        FROM unnest(%s::int[], %s::text[]) AS t(memory_id, embedding)
+        ON CONFLICT (memory_id) DO UPDATE
+        SET model = EXCLUDED.model, embedding = EXCLUDED.embedding
+    """, (model_name(), ids, literals))
+    return literals
+
+
+def search(cur, vector_literal: str, limit: int = 10,
+           exclude_id: Optional[int] = None) -> List[Dict[str, object]]:
+    """Nejbližší vzpomínky podle kosinové vzdálenosti (HNSW index)"""
+    timed_execute(cur, "embeddings_search", """
+        SELECT m.id, m.text, m.location, m.keywords, m.source, m.date,
+               m.lon as longitude,
+               m.lat as latitude,
+               1 - (e.embedding <=> %s::halfvec) AS similarity
+        FROM memory_embeddings e
+        JOIN memories m ON m.id = e.memory_id
+        WHERE e.memory_id IS DISTINCT FROM %s
+        ORDER BY e.embedding <=> %s::halfvec
+        LIMIT %s
+    """, (vector_literal, exclude_id, vector_literal, limit))
+    return [dict(row) for row in cur.fetchall()]
+
+
+class EmbeddingQueue:
+    """
+    Fronta nových vzpomínek - vlákno na pozadí sbírá položky do dávky
+    (nejvýše EMBEDDING_BATCH_SIZE nebo po EMBEDDING_FLUSH_SECONDS) a uloží je
+    jedním dotazem přes vlastní spojení z poolu.
+    """
+
+    def __init__(self, batch_size: int = EMBEDDING_BATCH_SIZE, flush_seconds: float = EMBEDDING_FLUSH_SECONDS):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue: "queue.Queue[Tuple[int, str]]" = queue.Queue(maxsize=10_000)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, memory_id: int, text: str) -> None:
+        """Zařadí vzpomínku k výpočtu vektoru, při přeplnění ji jen zaloguje (dopočítá backfill)"""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((memory_id, text))
+        except queue.Full:
+            logger.warning("Fronta embeddingů je plná, vzpomínka %s se zpracuje až backfillem", memory_id)
+
+    def _ensure_worker(self) -> None:
+        # Vlákno se startuje až v procesu workeru, ne v master procesu před forkem
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embeddings", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self) -> List[Tuple[int, str]]:
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=self.flush_seconds))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        from db import connection
+
+        while True:
+            batch = self._next_batch()
+            try:
+                with connection() as conn:
+                    with conn.cursor() as cur:
+                        if ensure_schema(cur):
+                            store_embeddings(cur, batch)
+            except Exception as e:
+                logger.warning("Uložení %s embeddingů selhalo: %s", len(batch), e)
+
+
+EMBEDDING_QUEUE = EmbeddingQueue()
+
+
+def backfill(conn, batch_size: int = EMBEDDING_BATCH_SIZE, reembed: bool = False) -> int:
+    """Dopočítá vektory vzpomínkám bez embeddingu (nebo všem při reembed=True)"""
+    total = 0
+    last_id = 0
+    with conn.cursor() as cur:
+        if not ensure_schema(cur):
+            raise EmbeddingsUnavailable("Databáze nemá rozšíření pgvector")
+        while True:
+            timed_execute(cur, "embeddings_backfill_batch", """
+                SELECT m.id, m.text
+                FROM memories m
+                LEFT JOIN memory_embeddings e ON e.memory_id = m.id
+                WHERE m.id > %s AND (%s OR e.memory_id IS NULL)
+                ORDER BY m.id
+                LIMIT %s
+            """, (last_id, reembed, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                return total
+            total += len(store_embeddings(cur, rows))
+            last_id = rows[-1][0]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import psycopg2
+
+    from db import database_url
+
+    parser = argparse.ArgumentParser(description="Dopočítání vektorů pro existující vzpomínky")
+    parser.add_argument("--database-url", default=database_url())
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--reembed", action="store_true", help="Přepočítat i existující vektory (po změně modelu)")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Chybí --database-url nebo proměnná DATABASE_URL")
+
+    connection = psycopg2.connect(args.database_url)
+    connection.autocommit = True
+    print(f"Zaindexováno {backfill(connection, args.batch_size, args.reembed)} vzpomínek ({model_name()})")
+    connection.close()
@@ -0,0 +1,224 @@
+"""
+Export vzpomínek ve formátech GeoJSON, GeoParquet a CSV
+
+Export se streamuje ze server-side (pojmenovaného) kurzoru po dávkách, takže
+paměť ani doba do prvního bajtu nezávisí na počtu exportovaných vzpomínek.
+
+Navázání přerušeného stahování: řádky jdou vzestupně podle id a odpověď nese
+hlavičku X-Export-Max-Id (nejvyšší id v okamžiku zahájení exportu). Klient při
+opakování pošle after_id = poslední přijaté id a max_id z první odpovědi,
+čímž dostane přesně zbývající řádky. U GeoParquet je každé navázání
+samostatný soubor (soubory lze spojit, např. pyarrow.dataset).
+"""
+
+import csv
+import io
+import json
+import os
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from db import connection, read_connection
+from logging_config import get_logger
+from metrics import timed_execute
+from query_planner import YEAR_EXPRESSION, region_condition
+from startup import optional_lazy_import
+
+logger = get_logger("export")
+
+# Počet řádků načtených z kurzoru najednou (a velikost row group v GeoParquet)
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '5000'))
+
+FORMATS = {
+    "geojson": ("application/geo+json", "geojson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "geoparquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+CSV_COLUMNS = ["id", "text", "location", "keywords", "source", "date", "longitude", "latitude", "created_at"]
+
+
+def build_where(bbox: Optional[Tuple[float, float, float, float]], year_from: Optional[int],
+                year_to: Optional[int], region_precision: Optional[int] = None) -> Tuple[str, List[Any]]:
+    """
+    Podmínky exportu - stejné výrazy jako v query_planner, aby se použily tytéž
+    indexy (a u tabulky rozdělené na partitions i jejich prořezání)
+    """
+    conditions, params = [], []
+    if bbox:
+        conditions.append("coordinates::geometry && ST_MakeEnvelope(%s, %s, %s, %s, 4326)")
+        params.extend(bbox)
+        region = region_condition(bbox, region_precision)
+        if region:
+            conditions.append(region[0])
+            params.append(region[1])
+    if year_from is not None:
+        conditions.append(f"{YEAR_EXPRESSION} >= %s")
+        params.append(year_from)
+    if year_to is not None:
+        conditions.append(f"{YEAR_EXPRESSION} <= %s")
+        params.append(year_to)
+    return " AND ".join(conditions) if conditions else "TRUE", params
+
+
+def snapshot_max_id(where: str, params: List[Any]) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Nejvyšší id odpovídající filtru (horní mez exportu pro navazování) a pozice
+    WAL primární databáze, kterou musí mít přehranou replika čtoucí export
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            timed_execute(cur, "export_max_id", f"""
+                SELECT max(id), CASE WHEN pg_is_in_recovery() THEN NULL ELSE pg_current_wal_lsn()::text END
+                FROM memories WHERE {where}
+            """, params)
+            max_id, lsn = cur.fetchone()
+            return max_id, lsn
+
+
+def iter_batches(where: str, params: List[Any], after_id: int, max_id: int,
+                 min_lsn: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Dávky řádků z pojmenovaného kurzoru (z repliky, pokud je nastavená). Spojení
+    se drží jen po dobu exportu a vrací se do poolu i při přerušení stahování
+    (GeneratorExit).
+    """
+    with read_connection(min_lsn) as conn:
+        # Pojmenovaný kurzor vyžaduje transakci - autocommit obnoví pool při dalším zapůjčení
+        # (otevřenou transakci po exportu uzavře rollbackem vrácení do poolu)
+        conn.autocommit = False
+        with conn.cursor(name="memories_export") as cur:
+            cur.itersize = EXPORT_BATCH_SIZE
+            timed_execute(cur, "export_memories", f"""
+                SELECT id, text, location, keywords, source, date,
+                       lon as longitude,
+                       lat as latitude,
+                       created_at
+                FROM memories
+                WHERE {where} AND id > %s AND id <= %s
+                ORDER BY id
+            """, params + [after_id, max_id])
+            columns = None
+            while True:
+                rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                if columns is None:
+                    columns = [d[0] for d in cur.description]
+                yield [dict(zip(columns, row)) for row in rows]
+
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def geojson_stream(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    """FeatureCollection zapisovaná po jednotlivých featurách"""
+    yield b'{"type":"FeatureCollection","features":['
+    first = True
+    for batch in batches:
+        parts = []
+        for row in batch:
+            lon, lat = row.pop("longitude"), row.pop("latitude")
+            feature = {
+                "type": "Feature",
+                "id": row["id"],
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": row,
+            }
+            parts.append(("" if first else ",") + json.dumps(feature, ensure_ascii=False, default=_json_default))
+            first = False
+        yield "".join(parts).encode("utf-8")
+    yield b"]}"
+
+
+def csv_stream(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    """CSV s hlavičkou, klíčová slova oddělená středníkem"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for batch in batches:
+        for row in batch:
+            row["keywords"] = ";".join(row["keywords"] or [])
+            writer.writerow(row)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Výstup pro ParquetWriter, který zapsané bajty předává dál po kusech"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def pyarrow_available() -> bool:
+    return optional_lazy_import("pyarrow") is not None
+
+
+def geoparquet_stream(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    """
+    GeoParquet 1.0 - geometrie jako WKB bod, každá dávka je jedna row group,
+    takže v paměti je vždy jen jedna dávka
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int32()),
+        ("text", pa.string()),
+        ("location", pa.string()),
+        ("keywords", pa.list_(pa.string())),
+        ("source", pa.string()),
+        ("date", pa.string()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("geometry", pa.binary()),
+    ])
+    geo_metadata = {
+        "version": "1.0.0",
+        "primary_column": "geometry",
+        # Bez "crs" platí výchozí OGC:CRS84, tj. WGS 84 v pořadí lon/lat (SRID 4326)
+        "columns": {"geometry": {"encoding": "WKB", "geometry_types": ["Point"]}},
+    }
+    schema = schema.with_metadata({"geo": json.dumps(geo_metadata)})
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for batch in batches:
+            columns = {name: [row.get(name) for row in batch] for name in schema.names if name != "geometry"}
+            columns["geometry"] = [_point_wkb(row["longitude"], row["latitude"]) for row in batch]
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema), row_group_size=len(batch))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _point_wkb(lon: float, lat: float) -> bytes:
+    """WKB bodu (little endian) - pro body není potřeba shapely"""
+    return struct.pack("<BIdd", 1, 1, lon, lat)
+
+
+STREAMS = {"geojson": geojson_stream, "csv": csv_stream, "geoparquet": geoparquet_stream}
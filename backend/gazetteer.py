@@ -0,0 +1,290 @@
+"""
+Vyhledávání míst podle vícejazyčných a historických názvů
+
+osm_data.tags obsahuje názvy v dalších jazycích (name:de => Theresienstadt,
+name:en ...) a alternativní/staré názvy (alt_name, old_name), place_names
+historické názvy s obdobím platnosti ('1850-1942'). Tabulka place_name_index
+je denormalizuje na řádky "normalizovaný název → místo, jazyk, období,
+souřadnice":
+
+- normalizace place_name_norm() = malá písmena bez diakritiky (rozšíření
+  unaccent, ß → ss) a interpunkce; stejná funkce se použije při stavbě
+  indexu i při dotazu,
+- btree index (name_norm, importance DESC) - dotaz "Theresienstadt in 1943"
+  je jedno indexové čtení,
+- trigramový GIN index (pg_trgm, volitelný) - překlepy se dohledají až
+  tehdy, když přesná shoda nic nenajde.
+
+Výsledky hledání se cachují v procesu (LRU, GAZETTEER_CACHE_SIZE položek na
+GAZETTEER_CACHE_SECONDS sekund). Index se přestaví po importu gazetteeru
+(import_gazetteer.py) nebo ručně:
+
+    python backend/gazetteer.py --database-url $DATABASE_URL
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from logging_config import get_logger
+from metrics import timed_execute
+
+logger = get_logger("gazetteer")
+
+GAZETTEER_CACHE_SIZE = int(os.getenv('GAZETTEER_CACHE_SIZE', '4096'))
+GAZETTEER_CACHE_SECONDS = float(os.getenv('GAZETTEER_CACHE_SECONDS', '3600'))
+
+# Nejvyšší počet vrácených kandidátů
+MAX_MATCHES = 50
+
+# Nejmenší trigramová podobnost pro přibližnou shodu
+MIN_SIMILARITY = 0.4
+
+# Dotaz "název [in|v roce|im Jahr|,] rok"
+_QUERY_RE = re.compile(
+    r"^\s*(?P<name>.+?)(?:\s*,\s*|\s+(?:in|v|ve|v\s+roce|im|im\s+jahr|anno|roku|r\.)\s+|\s+)(?P<year>\d{3,4})\s*$",
+    re.IGNORECASE,
+)
+_YEAR_RE = re.compile(r"\d{3,4}")
+
+SCHEMA_SQL = """
+    CREATE EXTENSION IF NOT EXISTS unaccent;
+
+    -- unaccent s explicitním slovníkem, aby funkci šlo označit jako IMMUTABLE
+    CREATE OR REPLACE FUNCTION place_name_norm(name TEXT) RETURNS TEXT AS $$
+        SELECT btrim(regexp_replace(lower(public.unaccent('public.unaccent'::regdictionary, name)),
+                                    '[^[:alnum:]]+', ' ', 'g'))
+    $$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+    CREATE TABLE IF NOT EXISTS place_name_index (
+        name_norm TEXT NOT NULL,
+        name TEXT NOT NULL,
+        place_name TEXT NOT NULL,
+        lang TEXT,
+        source TEXT NOT NULL,
+        source_id BIGINT NOT NULL,
+        period_from INTEGER,
+        period_to INTEGER,
+        importance BIGINT NOT NULL DEFAULT 0,
+        lon DOUBLE PRECISION NOT NULL,
+        lat DOUBLE PRECISION NOT NULL
+    );
+
+    CREATE INDEX IF NOT EXISTS place_name_index_norm_idx ON place_name_index (name_norm, importance DESC);
+"""
+
+TRIGRAM_SQL = """
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    CREATE INDEX IF NOT EXISTS place_name_index_trgm_idx ON place_name_index USING GIN (name_norm gin_trgm_ops);
+"""
+
+# Klíče tagů OSM s názvy (volitelně s jazykem za dvojtečkou), hodnoty mohou být oddělené ';'
+OSM_NAME_KEYS = r"^(name|alt_name|old_name|official_name|short_name|loc_name)(:[A-Za-z-]+)?$"
+
+REBUILD_SQL = f"""
+    TRUNCATE place_name_index;
+
+    INSERT INTO place_name_index (name_norm, name, place_name, lang, source, source_id,
+                                  period_from, period_to, importance, lon, lat)
+    -- Stejný název v několika jazycích (name = name:en = Brno) stačí jednou, přednost má name
+    SELECT DISTINCT ON (place_name_norm(n.name), o.id)
+           place_name_norm(n.name), n.name, o.name, n.lang, 'osm_data', o.id, NULL, NULL,
+           COALESCE(
+               NULLIF(left(regexp_replace(o.tags -> 'population', '[^0-9]', '', 'g'), 12), '')::bigint,
+               CASE o.tags -> 'place'
+                   WHEN 'city' THEN 100000 WHEN 'town' THEN 10000 WHEN 'village' THEN 1000
+                   WHEN 'hamlet' THEN 100 ELSE 10 END),
+           ST_X(p.point), ST_Y(p.point)
+    FROM osm_data o
+    CROSS JOIN LATERAL (SELECT ST_PointOnSurface(o.way) AS point) p
+    CROSS JOIN LATERAL (
+        SELECT o.name AS name, NULL::text AS lang
+        UNION ALL
+        SELECT btrim(v.value), NULLIF(split_part(t.key, ':', 2), '')
+        FROM each(o.tags) AS t
+        CROSS JOIN LATERAL unnest(string_to_array(t.value, ';')) AS v(value)
+        WHERE t.key ~ '{OSM_NAME_KEYS}'
+    ) n
+    WHERE o.way IS NOT NULL AND o.name IS NOT NULL AND place_name_norm(n.name) <> ''
+    ORDER BY place_name_norm(n.name), o.id, n.lang NULLS FIRST;
+
+    -- Historické názvy s obdobím platnosti 'od-do' (samotný rok = od i do)
+    INSERT INTO place_name_index (name_norm, name, place_name, lang, source, source_id,
+                                  period_from, period_to, importance, lon, lat)
+    SELECT place_name_norm(n.name), n.name, p.name, NULL, 'place_names', p.id,
+           substring(p.historical_period from '^\\s*(\\d{{3,4}})')::int,
+           substring(p.historical_period from '(\\d{{3,4}})\\s*$')::int,
+           1000, ST_X(p.location::geometry), ST_Y(p.location::geometry)
+    FROM place_names p
+    CROSS JOIN LATERAL (VALUES (p.name), (p.alt_name)) AS n(name)
+    WHERE n.name IS NOT NULL AND place_name_norm(n.name) <> '';
+
+    ANALYZE place_name_index;
+"""
+
+# Období musí obsahovat rok dotazu; řádky bez období platí vždy
+_PERIOD_CONDITION = """
+    (%(year)s::int IS NULL OR ((period_from IS NULL OR period_from <= %(year)s)
+                               AND (period_to IS NULL OR period_to >= %(year)s)))
+"""
+
+_COLUMNS = "name, place_name, lang, source, source_id, period_from, period_to, lon AS longitude, lat AS latitude"
+
+_schema_ready: Optional[bool] = None
+_trigram = False
+
+
+class LookupCache:
+    """LRU cache výsledků hledání s omezenou dobou platnosti (sdílená vlákny workeru)"""
+
+    def __init__(self, size: int = GAZETTEER_CACHE_SIZE, ttl: float = GAZETTEER_CACHE_SECONDS):
+        self.size = size
+        self.ttl = ttl
+        self._items: "OrderedDict[Tuple, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or time.monotonic() - item[0] >= self.ttl:
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key: Tuple, value: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+_cache = LookupCache()
+
+
+def _fetch_value(cur):
+    row = cur.fetchone()
+    return next(iter(row.values())) if isinstance(row, dict) else row[0]
+
+
+def ensure_schema(cur, populate: bool = True) -> bool:
+    """
+    Vytvoří normalizační funkci, tabulku a indexy (jednou za běh procesu) a při
+    prvním vytvoření index naplní (populate=False, pokud volající přestavbu
+    spouští sám). Vrátí dostupnost (vyžaduje rozšíření unaccent).
+    """
+    global _schema_ready, _trigram
+    if _schema_ready is not None:
+        return _schema_ready
+    try:
+        timed_execute(cur, "gazetteer_schema_check", "SELECT to_regclass('place_name_index') IS NOT NULL")
+        present = _fetch_value(cur)
+        timed_execute(cur, "gazetteer_schema", SCHEMA_SQL)
+    except Exception as e:
+        logger.warning("Vyhledávání názvů míst není dostupné (unaccent): %s", e)
+        _schema_ready = False
+        return False
+    try:
+        timed_execute(cur, "gazetteer_trigram", TRIGRAM_SQL)
+        _trigram = True
+    except Exception as e:
+        logger.info("Přibližné hledání názvů míst není dostupné (pg_trgm): %s", e)
+    if not present and populate:
+        rebuild(cur)
+    _schema_ready = True
+    return True
+
+
+def rebuild(cur) -> int:
+    """Přestaví index názvů z osm_data a place_names, vrátí počet názvů"""
+    timed_execute(cur, "gazetteer_sources", """
+        SELECT to_regclass('osm_data') IS NOT NULL AND to_regclass('place_names') IS NOT NULL
+    """)
+    if not _fetch_value(cur):
+        logger.warning("Tabulky osm_data nebo place_names chybí, index názvů zůstane prázdný")
+        return 0
+    timed_execute(cur, "gazetteer_rebuild", REBUILD_SQL)
+    timed_execute(cur, "gazetteer_count", "SELECT count(*) FROM place_name_index")
+    _cache.clear()
+    return _fetch_value(cur)
+
+
+def parse_query(query: str) -> Tuple[str, Optional[int]]:
+    """Rozdělí dotaz "Theresienstadt in 1943" na název a rok (rok je volitelný)"""
+    match = _QUERY_RE.match(query)
+    if match and match.group("name").strip():
+        return match.group("name").strip(), int(match.group("year"))
+    return query.strip(), None
+
+
+def period_year(period: Optional[str]) -> Optional[int]:
+    """Rok z období "1850-1942" nebo "1943" (první rok - název musí platit aspoň na začátku)"""
+    match = _YEAR_RE.search(period or "")
+    return int(match.group(0)) if match else None
+
+
+def lookup(cur, name: str, year: Optional[int] = None, limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Místa s daným názvem v libovolném jazyce platným v roce year. Přesná shoda
+    normalizovaného názvu (jedno čtení btree indexu) má přednost, trigramová
+    podobnost se zkouší až při jejím neúspěchu.
+    """
+    limit = max(1, min(limit, MAX_MATCHES))
+    key = (name.casefold().strip(), year, limit)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    params = {"name": name, "year": year, "limit": limit}
+    # Řádky s obdobím odpovídajícím roku dotazu mají přednost před názvy bez období
+    timed_execute(cur, "gazetteer_lookup", f"""
+        SELECT {_COLUMNS}, 1.0::real AS similarity
+        FROM place_name_index
+        WHERE name_norm = place_name_norm(%(name)s) AND {_PERIOD_CONDITION}
+        ORDER BY (period_from IS NOT NULL) DESC, importance DESC
+        LIMIT %(limit)s
+    """, params)
+    matches = [dict(row) for row in cur.fetchall()]
+
+    if not matches and _trigram:
+        params["similarity"] = MIN_SIMILARITY
+        timed_execute(cur, "gazetteer_lookup_fuzzy", f"""
+            SELECT {_COLUMNS}, similarity(name_norm, q.norm) AS similarity
+            FROM place_name_index, (SELECT place_name_norm(%(name)s) AS norm) q
+            WHERE name_norm %% q.norm AND similarity(name_norm, q.norm) >= %(similarity)s
+              AND {_PERIOD_CONDITION}
+            ORDER BY similarity DESC, importance DESC
+            LIMIT %(limit)s
+        """, params)
+        matches = [dict(row) for row in cur.fetchall()]
+
+    _cache.put(key, matches)
+    return matches
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import psycopg2
+
+    from db import database_url
+
+    parser = argparse.ArgumentParser(description="Přestavba indexu názvů míst (place_name_index)")
+    parser.add_argument("--database-url", default=database_url())
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Chybí --database-url nebo proměnná DATABASE_URL")
+
+    conn = psycopg2.connect(args.database_url)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        if ensure_schema(cur, populate=False):
+            print(f"Index názvů míst obsahuje {rebuild(cur)} názvů")
+    conn.close()
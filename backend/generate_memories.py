@@ -0,0 +1,321 @@
+"""
+Generátor syntetických vzpomínek pro testy ve velkém měřítku
+
+Vytváří realistické vzpomínky v češtině: názvy míst pochází z tabulek
+place_names a osm_data (nebo z jejich seed souborů backend/place_names.sql
+a backend/osm_data.sql), souřadnice jsou shlukované kolem obcí podle jejich
+velikosti a roky událostí i klíčová slova mají nerovnoměrné rozdělení.
+
+Výstup se generuje proudově ve formátu COPY, takže paměťová náročnost
+nezávisí na počtu řádků.
+
+Použití:
+    # Soubor pro COPY memories (text, location, coordinates, keywords, source, date) FROM ...
+    python generate_memories.py --rows 1000000 --seed 7 --output memories.tsv
+
+    # Přímý import do databáze
+    python generate_memories.py --rows 100000 --database-url postgresql://...
+"""
+
+import argparse
+import math
+import os
+import random
+import re
+import sys
+import time
+from typing import Iterator, List, Optional, Tuple
+
+# Sloupce tabulky memories v pořadí, v jakém je generátor zapisuje
+COPY_COLUMNS = ("text", "location", "coordinates", "keywords", "source", "date")
+
+# Obdélník zhruba pokrývající území České republiky
+CZ_BBOX = (12.09, 48.55, 18.86, 51.06)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PLACE_NAMES_SQL = os.path.join(BACKEND_DIR, "place_names.sql")
+OSM_DATA_SQL = os.path.join(BACKEND_DIR, "osm_data.sql")
+
+# Témata vzpomínek: klíčová slova, věty a typické roky
+TOPICS = [
+    {
+        "keywords": ["odsun", "vysídlení", "Sudety", "Němci", "transport"],
+        "sentences": [
+            "V roce {year} jsme museli opustit náš dům v obci {place}.",
+            "Otec nás probudil v noci a měli jsme jen dvě hodiny na sbalení.",
+            "Ze sběrného tábora u města {place} nás odvezli vlakem do Německa.",
+            "Sousedé stáli u plotu a nikdo nevěděl, co bude dál.",
+        ],
+        "years": (1945, 1947),
+    },
+    {
+        "keywords": ["osídlování", "dosídlení", "pohraničí", "konfiskace", "statek"],
+        "sentences": [
+            "Do obce {place} jsme se nastěhovali v létě {year}.",
+            "V bytě po předchozích majitelích zůstal nábytek i fotografie.",
+            "Rodiče dostali přidělený statek a začínali úplně od nuly.",
+            "Město bylo tehdy jako vylidněné, mnoho domů stálo prázdných.",
+        ],
+        "years": (1945, 1950),
+    },
+    {
+        "keywords": ["okupace", "protektorát", "odboj", "válka", "gestapo"],
+        "sentences": [
+            "Když v roce {year} přijeli do města {place} Němci, bylo mi deset let.",
+            "Dědeček ukrýval ve stodole vysílačku pro odboj.",
+            "Večer jsme museli zatemňovat okna a poslouchat zprávy potichu.",
+            "Na náměstí v obci {place} visely vyhlášky o stanném právu.",
+        ],
+        "years": (1939, 1945),
+    },
+    {
+        "keywords": ["osvobození", "Rudá armáda", "povstání", "květen", "barikády"],
+        "sentences": [
+            "V květnu {year} projížděly obcí {place} tanky a lidé házeli květiny.",
+            "Na barikádách stáli i kluci z našeho gymnázia.",
+            "Maminka upekla buchty pro vojáky, kteří tábořili za vsí.",
+        ],
+        "years": (1945, 1945),
+    },
+    {
+        "keywords": ["kolektivizace", "JZD", "znárodnění", "sedláci", "kulak"],
+        "sentences": [
+            "V roce {year} přišli do obce {place} agitátoři přesvědčovat sedláky.",
+            "Tatínek odmítl vstoupit do JZD, a tak nám sebrali pole.",
+            "Z našeho mlýna se stal sklad družstva.",
+        ],
+        "years": (1949, 1960),
+    },
+    {
+        "keywords": ["okupace", "srpen", "vojska", "Varšavská smlouva", "protest"],
+        "sentences": [
+            "Ráno {year} nás vzbudil hluk tanků na silnici u obce {place}.",
+            "Lidé přepisovali ukazatele směru, aby vojáci zabloudili.",
+            "Na zdech se objevily nápisy a studenti rozdávali letáky.",
+        ],
+        "years": (1968, 1969),
+    },
+    {
+        "keywords": ["revoluce", "listopad", "demonstrace", "svoboda", "klíče"],
+        "sentences": [
+            "V listopadu {year} jsme na náměstí v obci {place} zvonili klíči.",
+            "Poprvé jsme mohli nahlas říct, co si myslíme.",
+            "Na stávkovém výboru jsme se scházeli až do noci.",
+        ],
+        "years": (1989, 1990),
+    },
+    {
+        "keywords": ["dětství", "škola", "rodina", "pouť", "tradice"],
+        "sentences": [
+            "Do školy v obci {place} jsme chodili pěšky přes les.",
+            "Každé léto se u kostela konala pouť s kolotoči.",
+            "Babička nás učila péct vánočky podle starého receptu.",
+            "V roce {year} jsme slavili stříbrnou svatbu rodičů.",
+        ],
+        "years": (1920, 2010),
+    },
+    {
+        "keywords": ["povodeň", "řeka", "evakuace", "hasiči", "sklep"],
+        "sentences": [
+            "Při povodni v roce {year} zaplavila voda celé dolní město {place}.",
+            "Hasiči nás odváželi na člunech z prvního patra.",
+            "Bahno jsme ze sklepa vyklízeli ještě měsíc.",
+        ],
+        "years": (1997, 2013),
+    },
+]
+
+# Relativní četnost témat (Zipfovo rozdělení - první témata jsou častější)
+TOPIC_WEIGHTS = [1.0 / (rank + 1) ** 0.8 for rank in range(len(TOPICS))]
+
+SOURCES = ["Rozhovor s pamětníkem", "Paměť národa", "Rodinná kronika",
+           "Obecní kronika", "Dopis", "Deník", None]
+SOURCE_WEIGHTS = [30, 25, 15, 10, 8, 7, 5]
+
+# Záložní seznam obcí, pokud nejsou k dispozici seed soubory ani databáze
+FALLBACK_PLACES = [
+    ("Praha", 14.4378, 50.0755, 1309000), ("Brno", 16.6068, 49.1951, 377028),
+    ("Ostrava", 18.2625, 49.8209, 289128), ("Plzeň", 13.3826, 49.7384, 169858),
+    ("Liberec", 15.0543, 50.7663, 104000), ("Olomouc", 17.2513, 49.5938, 100000),
+]
+
+Place = Tuple[str, float, float, int]
+
+
+def _in_cz(lon: float, lat: float) -> bool:
+    min_lon, min_lat, max_lon, max_lat = CZ_BBOX
+    return min_lon <= lon <= max_lon and min_lat <= lat <= max_lat
+
+
+def load_places_from_sql() -> List[Place]:
+    """Načte obce ze seed souborů place_names.sql a osm_data.sql"""
+    places = {}
+    point = r"ST_SetSRID\(ST_MakePoint\(([\d.]+), ([\d.]+)\), 4326\)"
+    if os.path.exists(OSM_DATA_SQL):
+        with open(OSM_DATA_SQL, encoding="utf-8") as f:
+            for name, tags, lon, lat in re.findall(r"\(\d+, '([^']+)', '([^']*)', " + point, f.read()):
+                population = re.search(r"population=>(\d+)", tags)
+                places[name] = (name, float(lon), float(lat), int(population.group(1)) if population else 2000)
+    if os.path.exists(PLACE_NAMES_SQL):
+        with open(PLACE_NAMES_SQL, encoding="utf-8") as f:
+            for name, lon, lat in re.findall(r"\('([^']+)', (?:'[^']*'|NULL), " + point, f.read()):
+                places.setdefault(name, (name, float(lon), float(lat), 5000))
+    return [p for p in places.values() if _in_cz(p[1], p[2])]
+
+
+def load_places_from_db(conn) -> List[Place]:
+    """Načte obce z tabulek place_names a osm_data (chybějící tabulka se přeskočí)"""
+    places = {}
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('osm_data') IS NOT NULL, to_regclass('place_names') IS NOT NULL")
+        has_osm_data, has_place_names = cur.fetchone()
+        if has_osm_data:
+            cur.execute("""
+                SELECT name, ST_X(ST_Centroid(way)), ST_Y(ST_Centroid(way)),
+                       COALESCE(NULLIF(regexp_replace(tags -> 'population', '[^0-9]', '', 'g'), '')::int, 2000)
+                FROM osm_data
+                WHERE name IS NOT NULL AND (tags ? 'place' OR tags ? 'historic')
+            """)
+            for name, lon, lat, population in cur.fetchall():
+                places[name] = (name, lon, lat, population)
+        if has_place_names:
+            cur.execute("""
+                SELECT name, ST_X(location::geometry), ST_Y(location::geometry)
+                FROM place_names
+            """)
+            for name, lon, lat in cur.fetchall():
+                places.setdefault(name, (name, lon, lat, 5000))
+    return [p for p in places.values() if _in_cz(p[1], p[2])]
+
+
+def _copy_value(value) -> str:
+    """Escapování hodnoty pro textový formát COPY"""
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _array_literal(items: List[str]) -> str:
+    return "{" + ",".join('"' + item.replace("\\", "\\\\").replace('"', '\\"') + '"' for item in items) + "}"
+
+
+class MemoryGenerator:
+    """Deterministický generátor vzpomínek (stejný seed = stejná data)"""
+
+    def __init__(self, places: List[Place], seed: int = 42):
+        if not places:
+            raise ValueError("Seznam obcí je prázdný")
+        self.rng = random.Random(seed)
+        self.places = places
+        # Větší obce mají více vzpomínek, ale sublineárně vůči počtu obyvatel
+        self.place_weights = [math.sqrt(max(p[3], 100)) for p in places]
+
+    def _coordinates(self, place: Place) -> Tuple[float, float]:
+        """Bod v okolí obce - směrodatná odchylka roste s velikostí obce"""
+        _, lon, lat, population = place
+        sigma_km = 1.0 + 2.0 * math.log10(max(population, 1000) / 1000)
+        for _ in range(10):
+            dlat = self.rng.gauss(0, sigma_km) / 111.32
+            dlon = self.rng.gauss(0, sigma_km) / (111.32 * math.cos(math.radians(lat)))
+            if _in_cz(lon + dlon, lat + dlat):
+                return lon + dlon, lat + dlat
+        return lon, lat
+
+    def row(self) -> tuple:
+        rng = self.rng
+        place = rng.choices(self.places, weights=self.place_weights)[0]
+        topic = rng.choices(TOPICS, weights=TOPIC_WEIGHTS)[0]
+        year_from, year_to = topic["years"]
+        year = rng.randint(year_from, year_to)
+
+        count = rng.randint(2, len(topic["sentences"]))
+        sentences = rng.sample(topic["sentences"], count)
+        text = " ".join(s.format(place=place[0], year=year) for s in sentences)
+
+        keywords = rng.sample(topic["keywords"], rng.randint(2, 4))
+        if rng.random() < 0.5:
+            keywords.append(place[0])
+
+        lon, lat = self._coordinates(place)
+        source = rng.choices(SOURCES, weights=SOURCE_WEIGHTS)[0]
+        # Část vzpomínek nemá přesné datum, jen rok
+        date = str(year) if rng.random() < 0.7 else f"{rng.randint(1, 28)}.{rng.randint(1, 12)}.{year}"
+        return (text, place[0], f"SRID=4326;POINT({lon:.6f} {lat:.6f})",
+                _array_literal(keywords), source, date)
+
+    def copy_lines(self, rows: int) -> Iterator[str]:
+        """Řádky ve formátu COPY (text) pro sloupce COPY_COLUMNS"""
+        for _ in range(rows):
+            yield "\t".join(_copy_value(v) for v in self.row()) + "\n"
+
+
+class CopyStream:
+    """Souborový objekt nad iterátorem řádků - pro copy_expert bez načtení všeho do paměti"""
+
+    def __init__(self, lines: Iterator[str]):
+        self._lines = lines
+        self._buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._lines)
+            except StopIteration:
+                break
+        if size < 0:
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def copy_into_database(conn, generator: MemoryGenerator, rows: int) -> None:
+    """Nahraje vygenerované vzpomínky do tabulky memories přes COPY"""
+    with conn.cursor() as cur:
+        cur.copy_expert(
+            f"COPY memories ({', '.join(COPY_COLUMNS)}) FROM STDIN",
+            CopyStream(generator.copy_lines(rows)),
+            size=65536,
+        )
+    conn.commit()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generátor syntetických vzpomínek")
+    parser.add_argument("--rows", type=int, default=1000, help="Počet vzpomínek")
+    parser.add_argument("--seed", type=int, default=42, help="Seed pro reprodukovatelnost")
+    parser.add_argument("--output", help="Cílový soubor ve formátu COPY ('-' = stdout)")
+    parser.add_argument("--database-url", help="Nahrát přímo do databáze přes COPY")
+    args = parser.parse_args(argv)
+
+    if not args.output and not args.database_url:
+        parser.error("Zadejte --output nebo --database-url")
+
+    start = time.perf_counter()
+    if args.database_url:
+        import psycopg2
+        conn = psycopg2.connect(args.database_url)
+        try:
+            places = load_places_from_db(conn) or load_places_from_sql() or FALLBACK_PLACES
+            copy_into_database(conn, MemoryGenerator(places, args.seed), args.rows)
+        finally:
+            conn.close()
+    else:
+        places = load_places_from_sql() or FALLBACK_PLACES
+        generator = MemoryGenerator(places, args.seed)
+        out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+        try:
+            out.writelines(generator.copy_lines(args.rows))
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(f"Import: \\copy memories ({', '.join(COPY_COLUMNS)}) FROM '{args.output}'", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    print(f"Vygenerováno {args.rows} vzpomínek z {len(places)} obcí za {elapsed:.1f} s "
+          f"({args.rows / elapsed:.0f} řádků/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
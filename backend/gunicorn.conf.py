@@ -0,0 +1,60 @@
+"""
+Produkční konfigurace gunicornu s uvicorn workery
+
+Spuštění (z adresáře backend):
+    gunicorn -c gunicorn.conf.py main:app
+
+Počet workerů se řídí proměnnou WEB_CONCURRENCY (výchozí počet CPU jader).
+Každý worker má vlastní connection pool velikosti DB_MAX_CONNECTIONS / WEB_CONCURRENCY,
+takže součet spojení nepřekročí limit databáze (viz db.py).
+"""
+
+import importlib
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Předáme počet workerů aplikaci, aby db.py rozdělil rozpočet spojení
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# Aplikace se importuje v master procesu před forkem - načtené moduly
+# sdílí workery díky copy-on-write
+preload_app = True
+
+# Postupná recyklace workerů (ochrana proti únikům paměti); jitter zabrání
+# tomu, aby se všechny workery restartovaly současně
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = 5
+
+# Těžké moduly načtené před forkem (čárkou oddělené, chybějící se přeskočí).
+# Sdílení přes copy-on-write se vyplatí jen při více workerech; s jediným
+# workerem by preload jen prodloužil studený start (moduly se načítají líně).
+PRELOAD_MODULES = os.getenv("PRELOAD_MODULES", "geopandas,shapely,spacy" if workers > 1 else "")
+
+
+def on_starting(server):
+    for name in filter(None, (m.strip() for m in PRELOAD_MODULES.split(","))):
+        try:
+            importlib.import_module(name)
+            server.log.info("Předem načten modul %s", name)
+        except ImportError:
+            server.log.info("Modul %s není nainstalován, přeskakuji", name)
+
+
+def post_fork(server, worker):
+    # Vlákno posluchače logů z master procesu fork nepřežije - worker si spustí vlastní
+    from logging_config import setup_logging
+    setup_logging()
+    # Connection pool se vytvoří až v workeru při prvním požadavku (db.py)
+    server.log.info("Worker %s spuštěn", worker.pid)
+
+
+def worker_exit(server, worker):
+    from db import close_pool
+    close_pool()
@@ -0,0 +1,408 @@
+"""
+Import gazetteeru (tabulka osm_data) z velkého výřezu OpenStreetMap
+
+Zdrojem je soubor na lokálním disku:
+
+- .osm.pbf - čte se proudově přes pyosmium (volitelná závislost, pip install
+  osmium); body i plochy (uzavřené cesty a multipolygony),
+- GeoJSON FeatureCollection nebo GeoJSONSeq (jeden prvek na řádek, např.
+  výstup `osmium export -f geojsonseq`) - FeatureCollection se čte po
+  jednotlivých prvcích, celý soubor se do paměti nenačítá.
+
+Zůstanou jen pojmenované prvky s tagy place nebo historic (--tags). Řádky se
+nahrávají po dávkách přes COPY do pomocné tabulky osm_data_import bez indexů
+(v jedné transakci - přerušený import nic nezanechá). Primární klíč a GIN/GIST
+indexy se staví až po nahrání všech dat a pomocná tabulka pak v krátké
+transakci nahradí osm_data. S --append se data místo toho vloží do stávající
+osm_data (ON CONFLICT podle id); sekundární indexy se na dobu vkládání zruší
+a po něm znovu vytvoří. Na závěr se přestaví index názvů míst (gazetteer.py).
+
+V paměti je jen jedna dávka (--batch-size). Index poloh uzlů, který
+pyosmium potřebuje pro sestavení ploch, je ve výchozím stavu dočasný soubor
+(sparse_file_array) - u výřezu velikosti ČR řádově 1-2 GB na disku. Plochy
+lze také vynechat (--skip-areas).
+
+Id prvku v osm_data je osm_id * 4 + typ (0 uzel, 1 cesta, 2 relace), takže se
+id uzlů a cest nepřekrývají.
+
+Použití:
+    python backend/import_gazetteer.py czech-republic-latest.osm.pbf --database-url $DATABASE_URL
+    python backend/import_gazetteer.py places.geojsonseq --append
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import gazetteer
+from db import database_url
+from generate_memories import CopyStream, _copy_value
+from logging_config import get_logger
+from startup import optional_lazy_import
+
+logger = get_logger("import_gazetteer")
+
+# Tagy, podle kterých se prvek považuje za místo gazetteeru
+DEFAULT_TAGS = ("place", "historic")
+
+# Počet řádků v jednom COPY
+DEFAULT_BATCH_SIZE = 10000
+
+COPY_COLUMNS = ("id", "name", "tags", "way", "osm_type")
+
+OSM_TYPE_CODES = {"node": 0, "way": 1, "relation": 2}
+
+# Stejné schéma jako backend/osm_data.sql
+SCHEMA_SQL = """
+    CREATE EXTENSION IF NOT EXISTS postgis;
+    CREATE EXTENSION IF NOT EXISTS hstore;
+    CREATE TABLE IF NOT EXISTS osm_data (
+        id BIGINT PRIMARY KEY,
+        name TEXT,
+        tags HSTORE,
+        way GEOMETRY(GEOMETRY, 4326),
+        osm_type TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+# Sekundární indexy osm_data (název bez prefixu tabulky, definice)
+INDEXES = (
+    ("name_idx", "(name)"),
+    ("tags_idx", "USING GIN (tags)"),
+    ("way_idx", "USING GIST (way)"),
+)
+
+
+def feature_id(osm_type: str, osm_id: int) -> int:
+    """Id řádku osm_data - jedinečné přes uzly, cesty i relace"""
+    return osm_id * 4 + OSM_TYPE_CODES[osm_type]
+
+
+def hstore_literal(tags: Dict[str, str]) -> str:
+    """Textová podoba hstore ("klíč"=>"hodnota", ...)"""
+    def quote(value: str) -> str:
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return ", ".join(f"{quote(k)}=>{quote(v)}" for k, v in tags.items())
+
+
+def ewkb_hex(geometry) -> str:
+    """Shapely geometrie jako hex EWKB se SRID 4326 (vstupní formát sloupce way)"""
+    import shapely
+    return shapely.to_wkb(shapely.set_srid(geometry, 4326), hex=True, include_srid=True)
+
+
+def wanted(tags: Dict[str, str], filter_tags: Tuple[str, ...]) -> bool:
+    return bool(tags.get("name")) and any(tag in tags for tag in filter_tags)
+
+
+class Loader:
+    """
+    Sbírá řádky do dávky a nahrává je přes COPY do pomocné tabulky. FREEZE
+    vyžaduje, aby tabulka vznikla ve stejné transakci (ušetří pozdější přepis
+    stránek při VACUUM).
+    """
+
+    def __init__(self, cur, table: str, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.cur = cur
+        self.table = table
+        self.batch_size = batch_size
+        self.rows = 0
+        self.skipped = 0
+        self.started = time.perf_counter()
+        self._batch: List[str] = []
+
+    def add(self, row_id: int, name: str, tags: Dict[str, str], way: str, osm_type: str) -> None:
+        values = (row_id, name, hstore_literal(tags), way, osm_type)
+        self._batch.append("\t".join(_copy_value(v) for v in values) + "\n")
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._batch:
+            return
+        self.cur.copy_expert(f"COPY {self.table} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FREEZE)",
+                             CopyStream(iter(self._batch)), size=65536)
+        self.rows += len(self._batch)
+        self._batch = []
+        logger.info("Nahráno %s míst (%.0f řádků/s)", self.rows, self.rate())
+
+    def rate(self) -> float:
+        return self.rows / max(time.perf_counter() - self.started, 1e-9)
+
+
+def _scalar_tags(properties: Dict[str, Any]) -> Dict[str, str]:
+    """Tagy z vlastností GeoJSON prvku (bez metadat @id, @type ... a vnořených hodnot)"""
+    return {k: str(v) for k, v in properties.items()
+            if not k.startswith("@") and v is not None and not isinstance(v, (dict, list))}
+
+
+def _geojson_identity(feature: Dict[str, Any], fallback: int) -> Tuple[str, int]:
+    """Typ a id OSM z "id" nebo "@id"/"@type" (např. "node/123"), jinak pořadové číslo"""
+    properties = feature.get("properties") or {}
+    raw = feature.get("id", properties.get("@id"))
+    osm_type = properties.get("@type", "node")
+    if isinstance(raw, str) and "/" in raw:
+        osm_type, raw = raw.split("/", 1)
+    elif isinstance(raw, str) and raw[:1] in ("n", "w", "r") and raw[1:].isdigit():
+        osm_type, raw = {"n": "node", "w": "way", "r": "relation"}[raw[0]], raw[1:]
+    try:
+        return (osm_type if osm_type in OSM_TYPE_CODES else "node"), int(raw)
+    except (TypeError, ValueError):
+        return "node", fallback
+
+
+def iter_geojson_features(f, chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """
+    Prvky z GeoJSON FeatureCollection nebo GeoJSONSeq. FeatureCollection se
+    dekóduje po prvcích z pole "features" - v paměti je jen aktuální blok.
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size)
+    # GeoJSONSeq poznáme podle oddělovače RS nebo podle prvního řádku, který je celý prvek
+    while "\n" not in buffer.lstrip("\x1e \t\r\n"):
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+    first_line = buffer.lstrip("\x1e \t\r\n").split("\n", 1)[0].strip("\x1e \t\r")
+    try:
+        first = json.loads(first_line)
+    except json.JSONDecodeError:
+        first = None
+    if buffer.startswith("\x1e") or (isinstance(first, dict) and first.get("type") == "Feature"):
+        # GeoJSONSeq - prvky oddělené RS (RFC 8142, mohou být víceřádkové), jinak po řádcích
+        separator = "\x1e" if buffer.startswith("\x1e") else "\n"
+        pending = buffer
+        while True:
+            *complete, pending = pending.split(separator)
+            for record in complete:
+                record = record.strip("\x1e \t\r\n")
+                if record:
+                    yield json.loads(record)
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            pending += chunk
+        if pending.strip("\x1e \t\r\n"):
+            yield json.loads(pending.strip("\x1e \t\r\n"))
+        return
+
+    # FeatureCollection - najdeme začátek pole "features"
+    while True:
+        marker = buffer.find('"features"')
+        bracket = buffer.find("[", marker) if marker >= 0 else -1
+        if bracket >= 0:
+            buffer = buffer[bracket + 1:]
+            break
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        buffer = buffer[-16:] + chunk
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,")
+        if buffer.startswith("]"):
+            return
+        try:
+            feature, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                if buffer.strip():
+                    raise ValueError("Neúplný GeoJSON prvek na konci souboru")
+                return
+            buffer += chunk
+            continue
+        yield feature
+        buffer = buffer[end:]
+        if len(buffer) < chunk_size:
+            buffer += f.read(chunk_size)
+
+
+def load_geojson(path: str, loader: Loader, filter_tags: Tuple[str, ...]) -> None:
+    from shapely.geometry import shape
+
+    with open(path, encoding="utf-8") as f:
+        for number, feature in enumerate(iter_geojson_features(f), start=1):
+            tags = _scalar_tags(feature.get("properties") or {})
+            if not feature.get("geometry") or not wanted(tags, filter_tags):
+                continue
+            try:
+                way = ewkb_hex(shape(feature["geometry"]))
+            except Exception as e:
+                loader.skipped += 1
+                logger.debug("Prvek %s má neplatnou geometrii: %s", number, e)
+                continue
+            osm_type, osm_id = _geojson_identity(feature, number)
+            loader.add(feature_id(osm_type, osm_id), tags["name"], tags, way, osm_type)
+
+
+def load_pbf(path: str, loader: Loader, filter_tags: Tuple[str, ...], node_index: Optional[str],
+             skip_areas: bool) -> None:
+    osmium = optional_lazy_import("osmium")
+    if osmium is None:
+        raise SystemExit("Import .osm.pbf vyžaduje balíček osmium (pip install osmium)")
+    import shapely
+
+    factory = osmium.geom.WKBFactory()
+
+    class NodeHandler(osmium.SimpleHandler):
+        def node(self, n):
+            tags = {t.k: t.v for t in n.tags}
+            if wanted(tags, filter_tags):
+                point = shapely.Point(n.location.lon, n.location.lat)
+                loader.add(feature_id("node", n.id), tags["name"], tags, ewkb_hex(point), "node")
+
+    class AreaHandler(NodeHandler):
+        def area(self, a):
+            tags = {t.k: t.v for t in a.tags}
+            if not wanted(tags, filter_tags):
+                return
+            try:
+                geometry = shapely.from_wkb(factory.create_multipolygon(a))
+            except Exception as e:
+                loader.skipped += 1
+                logger.debug("Plochu %s nelze sestavit: %s", a.orig_id(), e)
+                return
+            osm_type = "way" if a.from_way() else "relation"
+            loader.add(feature_id(osm_type, a.orig_id()), tags["name"], tags, ewkb_hex(geometry), osm_type)
+
+    if skip_areas:
+        NodeHandler().apply_file(path)
+        return
+    # Index poloh uzlů v dočasném souboru (mapovaný do paměti) - paměť procesu
+    # nezávisí na velikosti výřezu
+    with tempfile.TemporaryDirectory(prefix="gazetteer-") as tmp:
+        AreaHandler().apply_file(path, locations=True,
+                                 idx=node_index or f"sparse_file_array,{os.path.join(tmp, 'nodes.idx')}")
+
+
+def build_indexes(cur, table: str) -> None:
+    """Primární klíč a sekundární indexy - až po nahrání dat, jedním průchodem"""
+    cur.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)")
+    for suffix, definition in INDEXES:
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_{suffix} ON {table} {definition}")
+
+
+def swap_in(cur, keep_old: bool) -> None:
+    """Nahradí osm_data nově nahranou tabulkou (krátká transakce, čtení nevidí rozpracovaný stav)"""
+    if keep_old:
+        cur.execute("DROP TABLE IF EXISTS osm_data_old")
+        cur.execute("ALTER TABLE osm_data RENAME TO osm_data_old")
+        cur.execute("ALTER TABLE osm_data_old RENAME CONSTRAINT osm_data_pkey TO osm_data_old_pkey")
+        for suffix, _ in INDEXES:
+            cur.execute(f"ALTER INDEX IF EXISTS osm_data_{suffix} RENAME TO osm_data_old_{suffix}")
+    else:
+        cur.execute("DROP TABLE osm_data")
+    cur.execute("ALTER TABLE osm_data_import RENAME TO osm_data")
+    cur.execute("ALTER TABLE osm_data RENAME CONSTRAINT osm_data_import_pkey TO osm_data_pkey")
+    for suffix, _ in INDEXES:
+        cur.execute(f"ALTER INDEX osm_data_import_{suffix} RENAME TO osm_data_{suffix}")
+
+
+def merge_into(cur) -> int:
+    """Vloží nahraná data do stávající osm_data; sekundární indexy se obnoví po vložení"""
+    for suffix, _ in INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS osm_data_{suffix}")
+    cur.execute(f"""
+        INSERT INTO osm_data ({', '.join(COPY_COLUMNS)})
+        SELECT {', '.join(COPY_COLUMNS)} FROM osm_data_import
+        ON CONFLICT (id) DO UPDATE SET
+            name = EXCLUDED.name, tags = EXCLUDED.tags, way = EXCLUDED.way, osm_type = EXCLUDED.osm_type
+    """)
+    merged = cur.rowcount
+    cur.execute("DROP TABLE osm_data_import")
+    for suffix, definition in INDEXES:
+        cur.execute(f"CREATE INDEX osm_data_{suffix} ON osm_data {definition}")
+    return merged
+
+
+def run_import(conn, path: str, filter_tags: Tuple[str, ...] = DEFAULT_TAGS,
+               batch_size: int = DEFAULT_BATCH_SIZE, append: bool = False, keep_old: bool = False,
+               node_index: Optional[str] = None, skip_areas: bool = False) -> Dict[str, Any]:
+    """Celý import: nahrání do pomocné tabulky, indexy a výměna (nebo sloučení) s osm_data"""
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_SQL)
+        conn.commit()
+
+        # Pomocná tabulka bez indexů; vytvoření i COPY v jedné transakci (FREEZE
+        # ušetří pozdější přepis stránek při VACUUM)
+        cur.execute("DROP TABLE IF EXISTS osm_data_import")
+        cur.execute("CREATE TABLE osm_data_import (LIKE osm_data INCLUDING DEFAULTS)")
+        loader = Loader(cur, "osm_data_import", batch_size)
+        if path.endswith(".pbf"):
+            load_pbf(path, loader, filter_tags, node_index, skip_areas)
+        else:
+            load_geojson(path, loader, filter_tags)
+        loader.flush()
+        load_seconds = time.perf_counter() - loader.started
+
+        index_start = time.perf_counter()
+        if append:
+            merged = merge_into(cur)
+        else:
+            build_indexes(cur, "osm_data_import")
+            swap_in(cur, keep_old)
+            merged = loader.rows
+        index_seconds = time.perf_counter() - index_start
+        conn.commit()
+
+        # ANALYZE mimo transakci výměny - zámek nad osm_data se drží co nejkratší dobu
+        cur.execute("ANALYZE osm_data")
+        conn.commit()
+
+        # Index vícejazyčných a historických názvů (gazetteer.py); volitelná
+        # rozšíření se zkoušejí mimo transakci, aby jejich chyba nic nepřerušila
+        conn.autocommit = True
+        names = gazetteer.rebuild(cur) if gazetteer.ensure_schema(cur, populate=False) else None
+
+    return {
+        "source": os.path.basename(path),
+        "rows": loader.rows,
+        "merged": merged,
+        "skipped": loader.skipped,
+        "load_seconds": round(load_seconds, 1),
+        "rows_per_second": round(loader.rows / max(load_seconds, 1e-9)),
+        "index_seconds": round(index_seconds, 1),
+        "mode": "append" if append else "replace",
+        "names": names,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import gazetteeru (osm_data) z výřezu OSM")
+    parser.add_argument("path", help="Soubor .osm.pbf, GeoJSON nebo GeoJSONSeq")
+    parser.add_argument("--database-url", default=database_url())
+    parser.add_argument("--tags", default=",".join(DEFAULT_TAGS),
+                        help="Tagy, z nichž musí prvek mít alespoň jeden (oddělené čárkou)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Řádků v jednom COPY")
+    parser.add_argument("--append", action="store_true", help="Sloučit se stávající osm_data místo náhrady")
+    parser.add_argument("--keep-old", action="store_true", help="Ponechat předchozí tabulku jako osm_data_old")
+    parser.add_argument("--node-index",
+                        help="Index poloh uzlů pro plochy z .osm.pbf (výchozí sparse_file_array v dočasném "
+                             "adresáři; flex_mem je rychlejší, ale drží vše v paměti)")
+    parser.add_argument("--skip-areas", action="store_true", help="Z .osm.pbf importovat jen uzly")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("Chybí --database-url nebo proměnná DATABASE_URL")
+    if not os.path.exists(args.path):
+        parser.error(f"Soubor {args.path} neexistuje")
+
+    import psycopg2
+
+    conn = psycopg2.connect(args.database_url)
+    try:
+        report = run_import(conn, args.path, tuple(t.strip() for t in args.tags.split(",") if t.strip()),
+                            args.batch_size, args.append, args.keep_old, args.node_index, args.skip_areas)
+    finally:
+        conn.close()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -32,17 +32,22 @@ def init_railway_db():
                 id SERIAL PRIMARY KEY,
                 text TEXT NOT NULL,
                 location VARCHAR(255) NOT NULL,
-                coordinates GEOGRAPHY(POINT, 4326) NOT NULL,
+                coordinates GEOMETRY(Point, 4326) NOT NULL,
                 keywords TEXT[],
                 source TEXT,
                 date TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                -- Souřadnice jako generované sloupce (backend/coordinates.py)
+                lat DOUBLE PRECISION GENERATED ALWAYS AS (ST_Y(coordinates)) STORED,
+                lon DOUBLE PRECISION GENERATED ALWAYS AS (ST_X(coordinates)) STORED
             );
         ''')
         
         # Vytvoření indexů
         cur.execute('CREATE INDEX IF NOT EXISTS idx_memories_coordinates ON memories USING GIST (coordinates);')
         cur.execute('CREATE INDEX IF NOT EXISTS idx_memories_keywords ON memories USING GIN (keywords);')
+        # Krycí index pro výpis pinů od nejnovějších (index-only scan)
+        cur.execute('CREATE INDEX IF NOT EXISTS memories_pins_idx ON memories (created_at DESC) INCLUDE (id, location, lat, lon);')
         
         print("Databáze byla úspěšně inicializována")
         
@@ -48,7 +48,7 @@ def init_render_db():
                     id SERIAL PRIMARY KEY,
                     text TEXT NOT NULL,
                     location VARCHAR(255) NOT NULL,
-                    coordinates GEOGRAPHY(POINT, 4326) NOT NULL,
+                    coordinates GEOMETRY(Point, 4326) NOT NULL,
                     keywords TEXT[],
                     source TEXT,
                     date TEXT,
@@ -56,7 +56,10 @@ def init_render_db():
                     year_of_event INTEGER,
                     year_of_record INTEGER,
                     person_name TEXT,
-                    birth_year INTEGER
+                    birth_year INTEGER,
+                    -- Souřadnice jako generované sloupce (backend/coordinates.py)
+                    lat DOUBLE PRECISION GENERATED ALWAYS AS (ST_Y(coordinates)) STORED,
+                    lon DOUBLE PRECISION GENERATED ALWAYS AS (ST_X(coordinates)) STORED
                 );
             ''')
             print("Tabulka memories vytvořena")
@@ -65,6 +68,8 @@ def init_render_db():
             # Vytvoření indexů
             cur.execute('CREATE INDEX IF NOT EXISTS idx_memories_coordinates ON memories USING GIST (coordinates);')
             cur.execute('CREATE INDEX IF NOT EXISTS idx_memories_keywords ON memories USING GIN (keywords);')
+            # Krycí index pro výpis pinů od nejnovějších (index-only scan)
+            cur.execute('CREATE INDEX IF NOT EXISTS memories_pins_idx ON memories (created_at DESC) INCLUDE (id, location, lat, lon);')
             print("Indexy vytvořeny")
             
             # Kontrola, že tabulka existuje
@@ -0,0 +1,287 @@
+"""
+Asynchronní zápis vzpomínek přes trvalou frontu v PostgreSQL
+
+Požadavek na zápis se jen uloží do tabulky write_jobs (jeden INSERT) a klient
+dostane hned odpověď 202 s id úlohy. Hlavička Idempotency-Key zaručuje, že
+opakované odeslání téhož požadavku (např. po timeoutu) vytvoří jedinou úlohu.
+
+Vlákna na pozadí (JOB_WORKERS v každém workeru) si úlohy zamykají přes
+FOR UPDATE SKIP LOCKED, takže se více workerů o úlohy nepere:
+
+1. queued -> inserted: dávka úloh se vloží do memories jedním INSERT ve stejné
+   transakci, ve které se úlohám nastaví stav - pád workeru nic nezdvojí,
+2. inserted -> done: obohacení (klíčová slova, případně další kroky
+   registrované dekorátorem @enricher) a aktualizace vzpomínek po dávkách.
+
+Vkládání samotné jde přes memory_service.insert_memories() stejně jako
+u synchronních endpointů (včetně indexů pro duplicity a embeddingy).
+
+Úloha, která selže JOB_MAX_ATTEMPTS krát, skončí ve stavu failed s chybou.
+Stav úlohy vrací endpoint /api/jobs/{id}.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import memory_service
+from db import connection, database_url
+from logging_config import get_logger
+from metrics import timed_execute
+
+logger = get_logger("jobs")
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '1'))
+JOB_BATCH_SIZE = int(os.getenv('JOB_BATCH_SIZE', '100'))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '1'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS write_jobs (
+        id BIGSERIAL PRIMARY KEY,
+        idempotency_key VARCHAR(255) UNIQUE,
+        payload JSONB NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'queued',
+        memory_id INTEGER,
+        attempts SMALLINT NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS write_jobs_pending_idx ON write_jobs (status, id)
+        WHERE status IN ('queued', 'inserted');
+"""
+
+# Sloupce vzpomínky, které smí obohacení přepsat
+ENRICHABLE_COLUMNS = ("keywords", "location")
+
+_schema_ready = False
+_enrichers: List[Callable[[Dict[str, Any]], Dict[str, Any]]] = []
+_wakeup = threading.Event()
+_workers: List[threading.Thread] = []
+_workers_pid: Optional[int] = None
+_workers_lock = threading.Lock()
+
+
+class IdempotencyConflict(ValueError):
+    """Stejný Idempotency-Key byl už použit s jiným obsahem požadavku"""
+
+
+def ensure_schema(cur) -> None:
+    """Vytvoří tabulku úloh (jednou za běh procesu)"""
+    global _schema_ready
+    if not _schema_ready:
+        timed_execute(cur, "jobs_schema", SCHEMA_SQL)
+        _schema_ready = True
+
+
+def enricher(func: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Zaregistruje krok obohacení. Funkce dostane payload úlohy a vrátí slovník
+    sloupců z ENRICHABLE_COLUMNS, které se mají u vzpomínky nastavit.
+    """
+    _enrichers.append(func)
+    return func
+
+
+def enqueue(cur, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+    """
+    Uloží úlohu a vrátí dvojici (úloha, nově vytvořena). Při opakovaném klíči
+    vrátí původní úlohu, při klíči s jiným payloadem vyvolá IdempotencyConflict.
+    """
+    ensure_schema(cur)
+    payload_json = json.dumps(payload, sort_keys=True)
+    timed_execute(cur, "jobs_enqueue", """
+        INSERT INTO write_jobs (idempotency_key, payload)
+        VALUES (%s, %s::jsonb)
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING id, status, memory_id, attempts, error, created_at, updated_at
+    """, (idempotency_key, payload_json))
+    row = cur.fetchone()
+    if row:
+        _wakeup.set()
+        return dict(row), True
+
+    timed_execute(cur, "jobs_get_by_key", """
+        SELECT id, status, memory_id, attempts, error, created_at, updated_at,
+               payload = %s::jsonb AS same_payload
+        FROM write_jobs
+        WHERE idempotency_key = %s
+    """, (payload_json, idempotency_key))
+    existing = dict(cur.fetchone())
+    if not existing.pop("same_payload"):
+        raise IdempotencyConflict("Idempotency-Key byl už použit pro jiný požadavek")
+    return existing, False
+
+
+def get_job(cur, job_id: int) -> Optional[Dict[str, Any]]:
+    """Stav úlohy"""
+    ensure_schema(cur)
+    timed_execute(cur, "jobs_get", """
+        SELECT id, status, memory_id, attempts, error, created_at, updated_at
+        FROM write_jobs
+        WHERE id = %s
+    """, (job_id,))
+    row = cur.fetchone()
+    return dict(row) if row else None
+
+
+def _claim(cur, status: str, limit: int) -> List[Tuple[int, Dict[str, Any], Optional[int]]]:
+    """Zamkne dávku úloh v daném stavu - zámek drží až do konce transakce"""
+    timed_execute(cur, f"jobs_claim_{status}", """
+        SELECT id, payload, memory_id
+        FROM write_jobs
+        WHERE status = %s AND attempts < %s
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (status, JOB_MAX_ATTEMPTS, limit))
+    return [(row[0], row[1] if isinstance(row[1], dict) else json.loads(row[1]), row[2]) for row in cur.fetchall()]
+
+
+def _insert_batch(cur, jobs: List[Tuple[int, Dict[str, Any], Optional[int]]]) -> List[Dict[str, Any]]:
+    """
+    Vloží vzpomínky dávky jedním dotazem (memory_service) a přiřadí jejich id
+    úlohám. Vrací vložené vzpomínky pro memory_service.after_commit.
+    """
+    # Klíčová slova doplní až krok obohacení
+    created = memory_service.insert_memories(cur, [payload for _, payload, _ in jobs], extract=False)
+    timed_execute(cur, "jobs_mark_inserted", """
+        UPDATE write_jobs w
+        SET status = 'inserted', memory_id = t.memory_id, attempts = 0, error = NULL, updated_at = now()
+        FROM unnest(%s::bigint[], %s::int[]) AS t(job_id, memory_id)
+        WHERE w.id = t.job_id
+    """, ([job_id for job_id, _, _ in jobs], [memory["id"] for memory in created]))
+    return created
+
+
+def _enrich_batch(cur, jobs: List[Tuple[int, Dict[str, Any], Optional[int]]]) -> None:
+    """Spustí registrované kroky obohacení a uloží výsledky jedním UPDATE"""
+    updates = []
+    for _, payload, memory_id in jobs:
+        update: Dict[str, Any] = {"id": memory_id}
+        for func in _enrichers:
+            update.update({k: v for k, v in func(payload).items() if k in ENRICHABLE_COLUMNS})
+        updates.append(update)
+    timed_execute(cur, "jobs_enrich_memories", """
+        UPDATE memories m
+        SET keywords = COALESCE(u.keywords, m.keywords),
+            location = COALESCE(u.location, m.location)
+        FROM jsonb_to_recordset(%s::jsonb) AS u(id INTEGER, keywords TEXT[], location TEXT)
+        WHERE m.id = u.id
+    """, (json.dumps(updates),))
+
+    timed_execute(cur, "jobs_mark_done", """
+        UPDATE write_jobs SET status = 'done', attempts = 0, error = NULL, updated_at = now()
+        WHERE id = ANY(%s)
+    """, ([job_id for job_id, _, _ in jobs],))
+
+
+def _record_failure(job_ids: List[int], error: Exception) -> None:
+    """Zvýší počet pokusů, po JOB_MAX_ATTEMPTS úlohu označí jako failed"""
+    with connection() as conn:
+        with conn.cursor() as cur:
+            timed_execute(cur, "jobs_mark_failed", """
+                UPDATE write_jobs
+                SET attempts = attempts + 1,
+                    error = %s,
+                    status = CASE WHEN attempts + 1 >= %s THEN 'failed' ELSE status END,
+                    updated_at = now()
+                WHERE id = ANY(%s)
+            """, (str(error)[:1000], JOB_MAX_ATTEMPTS, job_ids))
+
+
+def _process(status: str, step: Callable, limit: int) -> int:
+    """
+    Zpracuje jednu dávku úloh v jedné transakci. Při chybě dávky zkusí úlohy
+    jednotlivě, aby jedna vadná úloha nezablokovala ostatní.
+    """
+    with connection() as conn:
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            jobs = _claim(cur, status, limit)
+            if not jobs:
+                conn.rollback()
+                return 0
+            try:
+                created = step(cur, jobs)
+                conn.commit()
+                memory_service.after_commit(created or [])
+                return len(jobs)
+            except Exception as e:
+                conn.rollback()
+                error = e
+
+    if len(jobs) == 1:
+        logger.warning("Úloha %s (%s) selhala: %s", jobs[0][0], status, error)
+        _record_failure([jobs[0][0]], error)
+        return 1
+    logger.info("Dávka %s úloh (%s) selhala, zpracovávám jednotlivě: %s", len(jobs), status, error)
+    return sum(_process_single(status, step, job_id) for job_id, _, _ in jobs)
+
+
+def _process_single(status: str, step: Callable, job_id: int) -> int:
+    """Zpracuje jednu konkrétní úlohu (po selhání dávky)"""
+    with connection() as conn:
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            timed_execute(cur, "jobs_claim_single", """
+                SELECT id, payload, memory_id FROM write_jobs
+                WHERE id = %s AND status = %s
+                FOR UPDATE SKIP LOCKED
+            """, (job_id, status))
+            row = cur.fetchone()
+            if not row:
+                conn.rollback()
+                return 0
+            try:
+                created = step(cur, [(row[0], row[1] if isinstance(row[1], dict) else json.loads(row[1]), row[2])])
+                conn.commit()
+                memory_service.after_commit(created or [])
+                return 1
+            except Exception as e:
+                conn.rollback()
+                error = e
+    logger.warning("Úloha %s (%s) selhala: %s", job_id, status, error)
+    _record_failure([job_id], error)
+    return 1
+
+
+def run_once(limit: int = JOB_BATCH_SIZE) -> int:
+    """Jedno kolo workeru - vložení a obohacení po dávkách, vrací počet zpracovaných úloh"""
+    inserted = _process("queued", _insert_batch, limit)
+    enriched = _process("inserted", _enrich_batch, limit)
+    return inserted + enriched
+
+
+def _worker_loop() -> None:
+    while True:
+        try:
+            with connection() as conn:
+                with conn.cursor() as cur:
+                    ensure_schema(cur)
+            while True:
+                if run_once() == 0:
+                    # Nic ke zpracování - čekáme na novou úlohu z tohoto procesu nebo na další kolo
+                    _wakeup.wait(JOB_POLL_SECONDS)
+                    _wakeup.clear()
+        except Exception as e:
+            logger.warning("Worker zápisové fronty selhal: %s", e)
+            _wakeup.wait(JOB_POLL_SECONDS * 5)
+
+
+def start_workers(count: int = JOB_WORKERS) -> None:
+    """Spustí vlákna fronty v aktuálním procesu (po forku, ne v master procesu)"""
+    global _workers_pid
+    if count <= 0 or not database_url():
+        return
+    with _workers_lock:
+        if _workers_pid == os.getpid():
+            return
+        _workers_pid = os.getpid()
+        _workers.clear()
+        for i in range(count):
+            thread = threading.Thread(target=_worker_loop, name=f"write-jobs-{i}", daemon=True)
+            thread.start()
+            _workers.append(thread)
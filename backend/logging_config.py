@@ -0,0 +1,158 @@
+"""
+Strukturované neblokující logování
+
+Záznamy se v obsluze požadavku pouze vloží do fronty (QueueHandler), zápis na
+stdout provádí samostatné vlákno QueueListeneru. Každý záznam nese correlation
+id aktuálního požadavku, DEBUG události lze vzorkovat a úroveň i formát se
+nastavují proměnnými prostředí:
+
+- LOG_LEVEL (výchozí INFO)
+- LOG_FORMAT - json nebo text (výchozí json)
+- LOG_DEBUG_SAMPLE_RATE - podíl DEBUG záznamů, které se zapíší (výchozí 0.1)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+# Correlation id aktuálního požadavku
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Hlavička, ve které se correlation id přijímá i vrací
+REQUEST_ID_HEADER = b"x-request-id"
+
+# Atributy, které má každý LogRecord - vše ostatní pochází z `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_pid: Optional[int] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Doplní do záznamu correlation id aktuálního požadavku"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Propustí jen zvolený podíl DEBUG záznamů, vyšší úrovně vždy"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Jeden JSON objekt na řádek včetně polí předaných přes `extra`"""
+
+    def format(self, record):
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def setup_logging() -> None:
+    """
+    Nastaví frontu a posluchače pro logger aplikace. Opakované volání ve stejném
+    procesu nic nedělá; po forku (gunicorn s preload_app) vlákno posluchače
+    z master procesu neexistuje, takže se fronta i posluchač vytvoří znovu.
+    """
+    global _listener, _listener_pid
+    if _listener is not None:
+        if _listener_pid == os.getpid():
+            return
+        atexit.unregister(_listener.stop)
+
+    level = os.getenv("LOG_LEVEL", "INFO").upper()
+    sample_rate = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        stream_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    # Neomezená fronta - zápis do ní nikdy neblokuje obsluhu požadavku
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    queue_handler.addFilter(RequestIdFilter())
+
+    logger = logging.getLogger("memorymap")
+    logger.setLevel(level)
+    logger.handlers = [queue_handler]
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+    atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Vrátí logger v rámci jmenného prostoru aplikace"""
+    return logging.getLogger(f"memorymap.{name}")
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware, které každému požadavku přidělí correlation id
+    (převezme hlavičku X-Request-ID, nebo vygeneruje nové) a vrátí jej v odpovědi.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")[:64]
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        header_value = request_id.encode("latin-1")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, header_value)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
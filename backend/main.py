@@ -13,21 +13,66 @@ Hlavní funkce:
 Autor: Vytvořeno jako ukázka dovedností pro pohovor.
 """
 
-from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, Form, Query, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import psycopg2  # Knihovna pro připojení k PostgreSQL databázi
 from pydantic import BaseModel  # Pro validaci dat
-from typing import List, Optional, Dict, Any  # Pro typovou kontrolu
+from typing import List, Optional, Dict, Any, Tuple  # Pro typovou kontrolu
 import os
 from dotenv import load_dotenv
 from psycopg2.extras import RealDictCursor
 import json
 import time
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+import dedup
+import density
+import diagnostics
+import embeddings
+import export
+import gazetteer
+import jobs
+import memory_service
+import partitioning
+import places
+import singleflight
+from memory_service import DuplicateMemory, extract_keywords
+from admission import AdmissionMiddleware
+from db import DATABASE_URL_ENV_VARS, LSN_COOKIE, close_pool, connection, database_url, get_db, get_read_db, read_connection, remember_write
+from logging_config import RequestIdMiddleware, get_logger, setup_logging
+from metrics import CONTENT_TYPE_LATEST, REGISTRY, MetricsMiddleware, timed_execute
+from startup import start_background_warmup
+from query_planner import QueryValidationError, build_query, parse_bbox, projection, select_list, summarize_explain, STRATEGY_INDEXES
 
 load_dotenv()
+setup_logging()
+logger = get_logger("api")
+
+# Limit doby běhu kombinovaného dotazu v milisekundách
+QUERY_STATEMENT_TIMEOUT_MS = int(os.getenv('QUERY_STATEMENT_TIMEOUT_MS', '5000'))
+
+# Nejmenší velikost odpovědi v bajtech, od které se komprimuje gzipem
+GZIP_MINIMUM_SIZE = int(os.getenv('GZIP_MINIMUM_SIZE', '1000'))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Životní cyklus workeru - zahřátí (pool, cache) běží na pozadí, aby
+    nezdržovalo otevření portu; při ukončení uzavřeme connection pool.
+    """
+    start_background_warmup()
+    jobs.start_workers()
+    yield
+    close_pool()
 
 # Vytvoření FastAPI aplikace s vlastním názvem
-app = FastAPI(title="MemoryMap API")
+app = FastAPI(title="MemoryMap API", lifespan=lifespan)
+
+# Rate limit a řízení přístupu podle kapacity poolu (viz admission.py);
+# přidává se před CORS, aby i odmítnuté odpovědi měly CORS hlavičky
+app.add_middleware(AdmissionMiddleware)
 
 # Konfigurace CORS
 app.add_middleware(
@@ -44,119 +89,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def extract_keywords(text: str) -> List[str]:
-    """Jednoduchá extrakce klíčových slov z textu"""
-    # Rozdělíme text na slova a vybereme slova delší než 4 znaky
-    words = [word.strip('.,!?()[]{}":;') for word in text.split()]
-    keywords = [word for word in words if len(word) > 4]
-    # Vrátíme unikátní klíčová slova
-    return list(set(keywords))[:5]  # Omezíme na max 5 klíčových slov
+# Komprese větších odpovědí (seznam vzpomínek, místa, export) pro klienty s Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
 
-# Proměnná pro uložení connection poolu - globální pro celou aplikaci
-connection_pool = None
+# Měření latence a propustnosti jednotlivých endpointů (viz /metrics)
+app.add_middleware(MetricsMiddleware)
 
-def get_db():
-    """
-    Vytvoří a poskytuje připojení k databázi z connection poolu.
-    """
-    global connection_pool
-    
-    # Zjištění URL databáze z proměnných prostředí
-    DATABASE_URL = None
-    env_vars = [
-        'DATABASE_URL',
-        'RENDER_DATABASE_URL',
-        'POSTGRES_URL',
-        'PG_URL'
-    ]
-    
-    for var in env_vars:
-        if os.getenv(var):
-            DATABASE_URL = os.getenv(var)
-            print(f"Použití proměnné {var} pro připojení k databázi")
-            break
-    
-    if not DATABASE_URL:
-        raise HTTPException(status_code=500, detail="Database configuration missing - no database URL found")
-    
-    try:
-        # Úprava URL pro psycopg2 (pokud používá formát postgres://)
-        if DATABASE_URL.startswith('postgres://'):
-            DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
-            print("URL konvertováno z postgres:// na postgresql://")
-        
-        # Logging pro diagnostiku
-        print(f"Připojuji se k databázi s URL začínajícím: {DATABASE_URL[:10]}...")
-        
-        # Zkusíme připojení s explicitními parametry
-        try:
-            from urllib.parse import urlparse
-            parsed = urlparse(DATABASE_URL)
-            
-            # Extrahujeme parametry z URL
-            host = parsed.hostname
-            port = parsed.port or 5432  # Explicitní port 5432 pokud není v URL
-            database = parsed.path[1:] if parsed.path else 'memorymap'
-            user = parsed.username
-            password = parsed.password
-            
-            print(f"Připojuji s parametry: host={host}, port={port}, db={database}, user={user}")
-            
-            # Zkusíme nejdříve bez SSL (jen pro test)
-            try:
-                conn = psycopg2.connect(
-                    host=host,
-                    port=port,
-                    database=database,
-                    user=user,
-                    password=password,
-                    connect_timeout=10
-                )
-                print("✅ Připojení bez SSL úspěšné!")
-            except Exception as no_ssl_error:
-                print(f"Připojení bez SSL selhalo: {str(no_ssl_error)}")
-                print("Zkouším s SSL...")
-                # Fallback s SSL - použijeme system trusted roots
-                conn = psycopg2.connect(
-                    host=host,
-                    port=port,
-                    database=database,
-                    user=user,
-                    password=password,
-                    sslmode='verify-full',
-                    sslcert=None,
-                    sslkey=None,
-                    sslrootcert='system',  # Použijeme system trusted roots
-                    connect_timeout=10
-                )
-                print("✅ Připojení s SSL úspěšné!")
-            conn.autocommit = True
-            connection_pool = conn
-            print("Connection pool úspěšně vytvořen.")
-            yield connection_pool
-            return
-        except Exception as e:
-            print(f"Chyba při vytváření connection poolu: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Database connection failed: {str(e)}"
-            )
-        
+# Correlation id pro každý požadavek (hlavička X-Request-ID)
+app.add_middleware(RequestIdMiddleware)
 
-            
-    except Exception as e:
-        print(f"Database connection error: {str(e)}")
-        # Detailnější chybová zpráva pro diagnostiku
-        raise HTTPException(
-            status_code=500,
-            detail=f"Database connection failed: {str(e)}"
-        )
+# Obohacení vzpomínek zapsaných přes frontu úloh (viz jobs.py)
+@jobs.enricher
+def enrich_keywords(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {"keywords": extract_keywords(payload["text"])}
 
 # Základní endpoint pro kontrolu, zda API běží
 @app.get("/")
 async def root():
     return {"message": "MemoryMap API is running"}
 
+# Liveness - bez databáze
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    return diagnostics.health()
+
+# Readiness - ze stavu zahřátí a poolu, bez otevírání spojení
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    ready, state = diagnostics.readiness()
+    return JSONResponse(state, status_code=200 if ready else 503)
+
+# Metriky ve formátu Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE_LATEST)
+
 # Definice struktury dat pro vstupní data
 class MemoryText(BaseModel):
     text: str  # Text vzpomínky
@@ -190,152 +157,348 @@ class MemoryResponse(BaseModel):
     class Config:
         orm_mode = True  # Umožňuje konverzi z databázových objektů
 
-# Endpoint pro analýzu a uložení nové vzpomínky
+# Strukturovaný filtr pro kombinovaný dotaz
+class QueryFilter(BaseModel):
+    bbox: Optional[List[float]] = None  # [min_lon, min_lat, max_lon, max_lat]
+    latitude: Optional[float] = None  # Střed okruhu - zeměpisná šířka
+    longitude: Optional[float] = None  # Střed okruhu - zeměpisná délka
+    radius_km: Optional[float] = None  # Poloměr okruhu v kilometrech
+    text: Optional[str] = None  # Fulltextový dotaz
+    keywords: Optional[List[str]] = None  # Alespoň jedno z klíčových slov
+    year_from: Optional[int] = None  # Rok události od (včetně)
+    year_to: Optional[int] = None  # Rok události do (včetně)
+    limit: int = 100  # Maximální počet výsledků
+    debug: bool = False  # Vrátit i nápovědu z EXPLAIN
+
+def duplicate_conflict(e: DuplicateMemory) -> HTTPException:
+    """Odpověď 409 pro téměř duplicitní vzpomínku"""
+    return HTTPException(status_code=409, detail={
+        "message": "Near-duplicate memory already exists",
+        "duplicate_of": e.duplicate_of,
+        "similarity": e.similarity
+    })
+
+# Endpoint pro analýzu a uložení nové vzpomínky (klíčová slova se extrahují z textu)
 @app.post("/api/analyze", response_model=MemoryResponse)
-async def analyze_text(data: MemoryText):
-    conn = None
+def analyze_text(data: MemoryText, response: Response, dedupe: bool = False, conn=Depends(get_db)):
     try:
-        # Jednoduchá extrakce klíčových slov
-        keywords = extract_keywords(data.text)
-        
-        # Připojení k databázi
-        conn = next(get_db())
-        
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Kontrola existence tabulky
-            cur.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'memories')")
-            table_exists = cur.fetchone()['exists']
-            
-            if not table_exists:
-                # Pokud tabulka neexistuje, vytvořme ji
-                try:
-                    print("Tabulka memories neexistuje, vytvářím ji...")
-                    cur.execute('''
-                        CREATE TABLE IF NOT EXISTS memories (
-                            id SERIAL PRIMARY KEY,
-                            text TEXT NOT NULL,
-                            location VARCHAR(255) NOT NULL,
-                            coordinates GEOGRAPHY(POINT, 4326) NOT NULL,
-                            keywords TEXT[],
-                            source TEXT,
-                            date TEXT,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        );
-                    ''')
-                    conn.commit()
-                except Exception as create_error:
-                    print(f"Chyba při vytváření tabulky: {str(create_error)}")
-                    raise HTTPException(status_code=500, detail="Nelze vytvořit tabulku memories")
-            
-            # Kontrola PostGIS rozšíření
-            try:
-                cur.execute("SELECT PostGIS_Version()")
-            except Exception as postgis_error:
-                print(f"PostGIS není nainstalován: {str(postgis_error)}")
-                raise HTTPException(status_code=500, detail="PostGIS rozšíření není dostupné")
-            
-            try:
-                # Vložení vzpomínky do databáze, včetně geografických dat
-                cur.execute("""
-                    INSERT INTO memories (text, location, keywords, source, date, coordinates)
-                    VALUES (%s, %s, %s, %s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 4326))
-                    RETURNING id, text, location, keywords, source, date,
-                            ST_X(coordinates::geometry) as longitude, ST_Y(coordinates::geometry) as latitude
-                """, (data.text, data.location, keywords, data.source, data.date,
-                      data.longitude, data.latitude))
-                
-                # Získání vloženého záznamu
-                result = cur.fetchone()
-                conn.commit()
-                
-                if result:
-                    # Převod na očekávaný formát
-                    memory = {
-                        "id": result["id"],
-                        "text": result["text"],
-                        "location": result["location"],
-                        "keywords": result["keywords"] if result["keywords"] else [],
-                        "source": result["source"],
-                        "date": result["date"],
-                        "longitude": result["longitude"],
-                        "latitude": result["latitude"]
-                    }
-                    return memory
-                else:
-                    raise HTTPException(status_code=500, detail="Failed to insert memory")
-            except Exception as insert_error:
-                print(f"Chyba při vkládání vzpomínky: {str(insert_error)}")
-                conn.rollback()
-                raise HTTPException(status_code=500, detail=f"Database error: {str(insert_error)}")
-                
+            memory = memory_service.create_memory(cur, data.model_dump(), dedupe=dedupe)
+        remember_write(conn, response)
+        return memory
+    except DuplicateMemory as e:
+        raise duplicate_conflict(e)
+    except Exception as e:
+        logger.error("Chyba při analýze a vkládání vzpomínky: %s", e)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+# Asynchronní zápis vzpomínky - uložení do fronty a okamžitá odpověď 202
+@app.post("/api/jobs", status_code=202)
+def create_job(data: MemoryText, response: Response,
+               idempotency_key: Optional[str] = Header(None, max_length=255),
+               conn=Depends(get_db)):
+    """
+    Přijme vzpomínku ke zpracování na pozadí. Opakované odeslání se stejnou
+    hlavičkou Idempotency-Key vrátí původní úlohu místo vytvoření nové.
+    """
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            job, created = jobs.enqueue(cur, data.model_dump(), idempotency_key)
+    except jobs.IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
-        print(f"Obecná chyba při analýze textu: {str(e)}")
+        logger.error("Chyba při zařazení vzpomínky do fronty: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if conn:
-            conn.close()
 
-# Endpoint pro získání všech vzpomínek
-@app.get("/api/memories", response_model=List[MemoryResponse])
-async def get_memories():
-    conn = None
+    response.headers["Location"] = f"/api/jobs/{job['id']}"
+    if not created:
+        response.headers["Idempotent-Replayed"] = "true"
+    return job
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: int, conn=Depends(get_db)):
+    """Stav asynchronního zápisu (queued, inserted, done, failed)"""
     try:
-        # Připojení k databázi
-        conn = next(get_db())
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            job = jobs.get_job(cur, job_id)
+    except Exception as e:
+        logger.error("Chyba při načítání úlohy %s: %s", job_id, e)
+        raise HTTPException(status_code=500, detail=str(e))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# Endpoint pro získání všech vzpomínek
+def list_memories_json(columns: Optional[List[str]] = None, text_preview: Optional[int] = None,
+                       min_lsn: Optional[str] = None) -> Tuple[bytes, str]:
+    """Všechny vzpomínky (vybraná pole) jako serializované JSON tělo a uzel, který je četl"""
+    node: List[str] = []
+    with read_connection(min_lsn, node) as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Kontrola existence tabulky
-            cur.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'memories')")
+            timed_execute(cur, "memories_table_exists", "SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'memories')")
             table_exists = cur.fetchone()['exists']
             
             if not table_exists:
-                print("Tabulka memories neexistuje, vracím prázdný seznam")
-                return []
+                logger.warning("Tabulka memories neexistuje, vracím prázdný seznam")
+                return b"[]", node[0]
                 
             # Kontrola PostGIS rozšíření
             try:
-                cur.execute("SELECT PostGIS_Version()")
+                timed_execute(cur, "postgis_version", "SELECT PostGIS_Version()")
             except Exception as postgis_error:
-                print(f"PostGIS není nainstalován: {str(postgis_error)}")
-                return []
+                logger.error("PostGIS není nainstalován: %s", postgis_error)
+                return b"[]", node[0]
             
-            try:
-                # Získání všech vzpomínek, včetně extrakce geografických souřadnic
-                cur.execute("""
-                    SELECT id, text, location, keywords, source, date,
-                           ST_X(coordinates::geometry) as longitude, ST_Y(coordinates::geometry) as latitude
-                    FROM memories
-                    ORDER BY created_at DESC
-                """)
-                
-                # Transformace výsledků do seznamu objektů podle očekávaného formátu
-                results = cur.fetchall()
-                
-                # Převod na očekávaný formát
-                memories = []
-                for row in results:
-                    memory = dict(row)
-                    memories.append(memory)
-                
-                return memories
-            except Exception as e:
-                print(f"Chyba při získávání vzpomínek: {str(e)}")
-                raise HTTPException(status_code=500, detail=str(e))
-    
+            # Získání všech vzpomínek, včetně extrakce geografických souřadnic
+            timed_execute(cur, "list_memories", f"""
+                SELECT {select_list(columns, text_preview)}
+                FROM memories
+                ORDER BY created_at DESC
+            """)
+            memories = [dict(row) for row in cur.fetchall()]
+            return json.dumps(memories, ensure_ascii=False).encode("utf-8"), node[0]
+
+@app.get("/api/memories", response_model=List[MemoryResponse])
+async def get_memories(request: Request, fields: Optional[str] = None, view: Optional[str] = None,
+                       text_preview: Optional[int] = None):
+    """
+    Seznam vzpomínek. Pro mapu stačí view=pins (id, místo, souřadnice) nebo
+    view=summary (se zkráceným textem); fields=id,location,... vybere pole přímo,
+    text_preview=N zkrátí text na N znaků. Bez parametrů se vrací všechna pole.
+
+    Souběžné požadavky bez cookie zápisu sdílí jeden dotaz a jedno serializované
+    tělo (singleflight.py); po vlastním zápisu klient čte samostatně.
+    """
+    try:
+        columns, text_preview = projection(fields, view, text_preview)
+    except QueryValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    min_lsn = request.cookies.get(LSN_COOKIE)
+    try:
+        if min_lsn:
+            body, node = await run_in_threadpool(list_memories_json, columns, text_preview, min_lsn)
+        else:
+            body, node = await singleflight.do("/api/memories", (tuple(columns or ()), text_preview),
+                                               lambda: list_memories_json(columns, text_preview))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Chyba při získávání vzpomínek: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(content=body, media_type="application/json", headers={"X-DB-Node": node})
+
+# Statické cesty /api/memories/... musí být registrovány před /api/memories/{memory_id}
+def density_json(bounds: Tuple[float, float, float, float], zoom: int, cell: str) -> bytes:
+    with connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            return json.dumps(density.density(cur, bounds, zoom, cell)).encode("utf-8")
+
+@app.get("/api/memories/density")
+async def memory_density(bbox: str, zoom: int = 7, cell: str = "square"):
+    """Počty vzpomínek v mřížce (square z předpočítané pyramidy, hex počítaný za běhu)"""
+    if cell not in density.CELL_SHAPES:
+        raise HTTPException(status_code=400, detail=f"cell musí být jedna z hodnot: {', '.join(density.CELL_SHAPES)}")
+    try:
+        bounds = parse_bbox(bbox)
+    except QueryValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        body = await singleflight.do("/api/memories/density", (bounds, zoom, cell),
+                                     lambda: density_json(bounds, zoom, cell))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Chyba při výpočtu hustoty vzpomínek: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(content=body, media_type="application/json")
+
+def places_json(bounds: Optional[Tuple[float, float, float, float]], min_count: int, limit: int,
+                keywords: int) -> bytes:
+    with connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            found = places.list_places(cur, bounds, min_count, limit, keywords)
+            return json.dumps({"count": len(found), "places": found}).encode("utf-8")
+
+@app.get("/api/places")
+async def list_places(bbox: Optional[str] = None, min_count: int = 1, limit: int = 1000, keywords: int = 0):
+    """Místa s počtem vzpomínek a těžištěm - jeden pin za místo místo překrývajících se pinů"""
+    try:
+        bounds = parse_bbox(bbox)
+    except QueryValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        body = await singleflight.do("/api/places", (bounds, min_count, limit, keywords),
+                                     lambda: places_json(bounds, min_count, limit, keywords))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Chyba při získávání míst: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(content=body, media_type="application/json")
+
+def lookup_place_names(name: str, year: Optional[int], limit: int) -> List[Dict[str, Any]]:
+    with connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if not gazetteer.ensure_schema(cur):
+                raise HTTPException(status_code=503, detail="Vyhledávání názvů míst není dostupné (chybí unaccent)")
+            return gazetteer.lookup(cur, name, year, limit)
+
+@app.get("/api/places/lookup")
+def lookup_places(q: str, year: Optional[int] = None, limit: int = 5):
+    """
+    Místo podle názvu v libovolném jazyce nebo historického názvu, volitelně
+    platného v daném roce ("Theresienstadt in 1943" nebo q=Theresienstadt&year=1943)
+    """
+    name, parsed_year = gazetteer.parse_query(q)
+    if not name:
+        raise HTTPException(status_code=400, detail="Prázdný název místa")
+    year = year if year is not None else parsed_year
+    try:
+        matches = lookup_place_names(name, year, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Chyba při hledání názvu místa %s: %s", q, e)
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"query": name, "year": year, "count": len(matches), "matches": matches}
+
+class GeorefRequest(BaseModel):
+    place_name: str
+    historical_period: Optional[str] = None  # Rok nebo období "1850-1942"
+
+@app.post("/georef")
+def georeference(request: GeorefRequest):
+    """Souřadnice historického názvu místa (nejlepší shoda z indexu názvů)"""
+    name, year = gazetteer.parse_query(request.place_name)
+    year = gazetteer.period_year(request.historical_period) or year
+    if not name:
+        raise HTTPException(status_code=400, detail="Prázdný název místa")
+    try:
+        matches = lookup_place_names(name, year, 1)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Chyba při georeferencování %s: %s", request.place_name, e)
+        raise HTTPException(status_code=500, detail=str(e))
+    if not matches:
+        raise HTTPException(status_code=404, detail="Place not found")
+    return {**matches[0], "year": year}
+
+@app.get("/api/places/{name}")
+def get_place(name: str, keywords: int = 5, latest: int = 5):
+    """Souhrn místa pro pop-up okno - počet, nejčastější klíčová slova a nejnovější vzpomínky"""
+    try:
+        with connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                place = places.place_detail(cur, name, keywords, latest)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Chyba při získávání místa %s: %s", name, e)
+        raise HTTPException(status_code=500, detail=str(e))
+    if place is None:
+        raise HTTPException(status_code=404, detail="Place not found")
+    return place
+
+@app.get("/api/memories/similar")
+def similar_memories(id: Optional[int] = None, q: Optional[str] = None, limit: int = 10,
+                     conn=Depends(get_db)):
+    """Sémanticky podobné vzpomínky k existující vzpomínce (id) nebo k textu dotazu (q)"""
+    if (id is None) == (not q):
+        raise HTTPException(status_code=400, detail="Zadejte právě jeden z parametrů id nebo q")
+    limit = max(1, min(limit, 100))
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if not embeddings.ensure_schema(cur):
+                raise HTTPException(status_code=503, detail="Sémantické vyhledávání není dostupné (chybí pgvector)")
+
+            if q:
+                vector = embeddings.to_literal(embeddings.embed_batch([q])[0])
+            else:
+                timed_execute(cur, "embeddings_get", """
+                    SELECT e.embedding::text AS embedding FROM memory_embeddings e
+                    JOIN memories m ON m.id = e.memory_id
+                    WHERE e.memory_id = %s
+                """, (id,))
+                row = cur.fetchone()
+                if row:
+                    vector = row["embedding"]
+                else:
+                    # Vektor ještě nebyl spočítán (fronta, hromadný import) - spočítáme jej hned
+                    timed_execute(cur, "get_memory_text", "SELECT text FROM memories WHERE id = %s", (id,))
+                    memory = cur.fetchone()
+                    if not memory:
+                        raise HTTPException(status_code=404, detail="Memory not found")
+                    vector = embeddings.store_embeddings(cur, [(id, memory["text"])])[0]
+
+            results = embeddings.search(cur, vector, limit=limit, exclude_id=id)
+            return {"model": embeddings.model_name(), "count": len(results), "memories": results}
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Chyba při připojení k databázi: {str(e)}")
+        logger.error("Chyba při hledání podobných vzpomínek: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+# Nejvyšší počet vzpomínek v jednom dávkovém načtení
+MAX_BATCH_FETCH = 500
+
+class MemoryBatch(BaseModel):
+    ids: List[int]  # Id vzpomínek v požadovaném pořadí
+    fields: Optional[List[str]] = None  # Vybraná pole (None = všechna)
+    view: Optional[str] = None  # Předdefinovaný pohled pins/summary/full
+    text_preview: Optional[int] = None  # Zkrácení textu na N znaků
+
+def fetch_memories(conn, ids: List[int], fields: Optional[str], view: Optional[str] = None,
+                   text_preview: Optional[int] = None) -> Dict[str, Any]:
+    """Vzpomínky podle seznamu id jedním dotazem, ve stejném pořadí jako ids"""
+    if len(ids) > MAX_BATCH_FETCH:
+        raise HTTPException(status_code=413, detail=f"Nejvýše {MAX_BATCH_FETCH} id najednou")
+    try:
+        columns, text_preview = projection(fields, view, text_preview)
+    except QueryValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not ids:
+        return {"memories": [], "missing": []}
+
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            timed_execute(cur, "get_memories_batch",
+                          f"SELECT {select_list(columns, text_preview)} FROM memories WHERE id = ANY(%s)", (list(set(ids)),))
+            found = {row["id"]: dict(row) for row in cur.fetchall()}
+    except Exception as e:
+        logger.error("Chyba při dávkovém načítání vzpomínek: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "memories": [found[i] for i in ids if i in found],
+        "missing": [i for i in dict.fromkeys(ids) if i not in found],
+    }
+
+@app.post("/api/memories/batch")
+def get_memories_batch(batch: MemoryBatch, conn=Depends(get_read_db)):
+    """Více vzpomínek najednou (např. pro shluk na mapě) - jeden dotaz místo N požadavků"""
+    return fetch_memories(conn, batch.ids, ",".join(batch.fields) if batch.fields else None,
+                          batch.view, batch.text_preview)
+
+@app.get("/api/memories/batch")
+def get_memories_batch_query(ids: str, fields: Optional[str] = None, view: Optional[str] = None,
+                             text_preview: Optional[int] = None, conn=Depends(get_read_db)):
+    """Varianta s ids v query stringu: ?ids=1,2,3&fields=id,location,text"""
+    try:
+        id_list = [int(v) for v in ids.split(",") if v.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids musí být čísla oddělená čárkou")
+    return fetch_memories(conn, id_list, fields, view, text_preview)
+
 @app.get("/api/memories/{memory_id}", response_model=MemoryResponse)
-async def get_memory(memory_id: int):
+def get_memory(memory_id: int, conn=Depends(get_read_db)):
     """Získání detailu konkrétní vzpomínky"""
-    conn = None
     try:
-        # Připojení k databázi
-        conn = next(get_db())
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
+            timed_execute(cur, "get_memory", """
                 SELECT id, text, location, keywords, source, date,
-                       ST_X(coordinates::geometry) as longitude, ST_Y(coordinates::geometry) as latitude
+                       lon as longitude, lat as latitude
                 FROM memories
                 WHERE id = %s
             """, (memory_id,))
@@ -347,13 +510,147 @@ async def get_memory(memory_id: int):
             else:
                 raise HTTPException(status_code=404, detail="Memory not found")
                 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Chyba při získávání vzpomínky {memory_id}: {str(e)}")
+        logger.error("Chyba při získávání vzpomínky %s: %s", memory_id, e)
         raise HTTPException(status_code=500, detail=str(e))
 
-# Diagnostický endpoint pro kontrolu proměnných prostředí
-@app.get("/api/debug")
-async def debug_info():
+@app.get("/api/memories/{memory_id}/duplicates")
+def get_duplicates(memory_id: int, threshold: float = 0.5, limit: int = 20, conn=Depends(get_db)):
+    """Téměř duplicitní vzpomínky nalezené přes LSH index (bez porovnání se všemi)"""
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            dedup.ensure_schema(cur)
+            timed_execute(cur, "dedup_signature", """
+                SELECT h.signature FROM memory_minhash h
+                JOIN memories m ON m.id = h.memory_id
+                WHERE h.memory_id = %s
+            """, (memory_id,))
+            row = cur.fetchone()
+            if row:
+                signature = row["signature"]
+            else:
+                # Vzpomínka vložená mimo API (např. hromadný import) - signaturu dopočítáme
+                timed_execute(cur, "get_memory_text", "SELECT text FROM memories WHERE id = %s", (memory_id,))
+                memory = cur.fetchone()
+                if not memory:
+                    raise HTTPException(status_code=404, detail="Memory not found")
+                signature = dedup.signature(memory["text"])
+                dedup.index_memory(cur, memory_id, signature)
+
+            matches = dedup.find_duplicates(cur, signature, threshold, exclude_id=memory_id, limit=limit)
+            if matches:
+                timed_execute(cur, "dedup_details", """
+                    SELECT id, location, left(text, 200) as text_preview
+                    FROM memories
+                    WHERE id = ANY(%s)
+                """, ([m["id"] for m in matches],))
+                details = {row["id"]: row for row in cur.fetchall()}
+                for match in matches:
+                    detail = details.get(match["id"], {})
+                    match["location"] = detail.get("location")
+                    match["text_preview"] = detail.get("text_preview")
+
+            return {"memory_id": memory_id, "threshold": threshold, "duplicates": matches}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Chyba při hledání duplicit vzpomínky %s: %s", memory_id, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/query")
+def query_memories(flt: QueryFilter, conn=Depends(get_read_db)):
+    """
+    Kombinovaný dotaz - prostorový, fulltextový, klíčový a časový filtr
+    v jediném parametrizovaném SQL dotazu.
+    """
+    try:
+        # U tabulky rozdělené podle regionu přidá podmínku pro prořezání partitions
+        with conn.cursor() as cur:
+            precision = partitioning.region_precision(cur)
+        sql, params, strategy = build_query(flt, region_precision=precision)
+    except QueryValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # SET LOCAL platí jen v rámci transakce, proto ji otevíráme explicitně
+            cur.execute("BEGIN")
+            try:
+                cur.execute("SET LOCAL statement_timeout = %s", (QUERY_STATEMENT_TIMEOUT_MS,))
+                explain = None
+                if flt.debug:
+                    timed_execute(cur, "query_memories_explain", "EXPLAIN (FORMAT JSON) " + sql, params)
+                    explain = summarize_explain(cur.fetchone()["QUERY PLAN"])
+                timed_execute(cur, "query_memories", sql, params)
+                memories = [dict(row) for row in cur.fetchall()]
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+        response = {
+            "count": len(memories),
+            "strategy": strategy,
+            "memories": memories
+        }
+        if flt.debug:
+            response["debug"] = {
+                "planned_index": STRATEGY_INDEXES[strategy],
+                "statement_timeout_ms": QUERY_STATEMENT_TIMEOUT_MS,
+                "explain": explain
+            }
+        return response
+
+    except HTTPException:
+        raise
+    except psycopg2.errors.QueryCanceled:
+        logger.warning("Kombinovaný dotaz překročil limit %s ms", QUERY_STATEMENT_TIMEOUT_MS)
+        raise HTTPException(status_code=504, detail="Query timed out")
+    except Exception as e:
+        logger.error("Chyba při kombinovaném dotazu: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Streamovaný export vzpomínek (GeoJSON, GeoParquet, CSV)
+@app.get("/api/export")
+def export_memories(request: Request, format: str = "geojson", bbox: Optional[str] = None,
+                    year_from: Optional[int] = Query(None, alias="from"),
+                    year_to: Optional[int] = Query(None, alias="to"),
+                    after_id: int = 0, max_id: Optional[int] = None):
+    """
+    Streamovaný export vzpomínek (geojson, geoparquet, csv). Přerušené stahování
+    lze navázat parametry after_id (poslední přijaté id) a max_id (hlavička X-Export-Max-Id).
+    """
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Nepodporovaný formát, povolené: {', '.join(export.FORMATS)}")
+    if format == "geoparquet" and not export.pyarrow_available():
+        raise HTTPException(status_code=501, detail="Export do GeoParquet vyžaduje balíček pyarrow")
+    try:
+        where, params = export.build_where(parse_bbox(bbox), year_from, year_to,
+                                           partitioning.region_precision())
+    except QueryValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Horní mez se určí při prvním požadavku, navazující požadavky ji posílají zpět;
+    # replika pro čtení musí mít přehrané všechny řádky do této meze
+    min_lsn = request.cookies.get(LSN_COOKIE)
+    if max_id is None:
+        max_id, min_lsn = export.snapshot_max_id(where, params)
+        max_id = max_id or 0
+
+    media_type, extension = export.FORMATS[format]
+    logger.info("Export %s (after_id=%s, max_id=%s)", format, after_id, max_id)
+    # Spojení si otevírá až generátor - závislost get_db by se uzavřela před odesláním těla
+    stream = export.STREAMS[format](export.iter_batches(where, params, after_id, max_id, min_lsn))
+    return StreamingResponse(stream, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="memories.{extension}"',
+        "X-Export-Max-Id": str(max_id),
+    })
+
+def debug_snapshot() -> Dict[str, Any]:
+    """Informace o prostředí a databázi pro /api/debug (počítá se nejvýše jednou za DIAGNOSTIC_CACHE_SECONDS)"""
     # Příprava informací o proměnných prostředí (bezpečným způsobem)
     env_vars = os.environ.keys()
     db_env_vars = []
@@ -382,24 +679,21 @@ async def debug_info():
     db_error = None
     db_details = {}
     
-    # Zkusíme najít a použít databázovou URL
-    database_url = None
-    potential_db_vars = ['DATABASE_URL', 'RENDER_DATABASE_URL', 'POSTGRES_URL', 'PG_URL']
-    
-    for var in potential_db_vars:
+    # Proměnná s URL databáze (stejné pořadí jako v db.py)
+    for var in DATABASE_URL_ENV_VARS:
         if os.getenv(var):
-            database_url = os.getenv(var)
             db_details["used_env_var"] = var
             break
     
     try:
-        if database_url:
-            db_details["url_starts_with"] = database_url[:10] + "..."
+        url = database_url()
+        if url:
+            db_details["url_starts_with"] = url[:10] + "..."
             
             # Analýza URL
             from urllib.parse import urlparse
             try:
-                parsed = urlparse(database_url)
+                parsed = urlparse(url)
                 db_details["schema"] = parsed.scheme
                 db_details["netloc"] = parsed.netloc
                 db_details["path"] = parsed.path
@@ -410,48 +704,42 @@ async def debug_info():
             except Exception as parse_error:
                 db_details["url_parse_error"] = str(parse_error)
             
-            if database_url.startswith('postgres://'):
-                modified_url = database_url.replace('postgres://', 'postgresql://', 1)
-                db_details["modified_url_starts_with"] = modified_url[:10] + "..."
-                database_url = modified_url
-            
             try:
-                conn = psycopg2.connect(database_url, connect_timeout=5)
-                cur = conn.cursor()
-                
-                # Kontrola základních informací o databázi
-                cur.execute("SELECT version();")
-                db_details["version"] = cur.fetchone()[0]
-                
-                # Kontrola PostGIS
-                try:
-                    cur.execute("SELECT PostGIS_Version();")
-                    db_details["postgis_version"] = cur.fetchone()[0]
-                except Exception as postgis_error:
-                    db_details["postgis_error"] = str(postgis_error)
-                
-                # Kontrola tabulek
-                cur.execute("""
-                    SELECT table_name 
-                    FROM information_schema.tables 
-                    WHERE table_schema = 'public'
-                """)
-                db_details["tables"] = [row[0] for row in cur.fetchall()]
-                
-                # Zkontrolujeme tabulku memories
-                try:
-                    cur.execute("SELECT COUNT(*) FROM memories")
-                    db_details["memories_count"] = cur.fetchone()[0]
-                except Exception as table_error:
-                    db_details["memories_table_error"] = str(table_error)
+                # Spojení z poolu, ne nové připojení
+                with connection() as conn:
+                    with conn.cursor() as cur:
+                        # Kontrola základních informací o databázi
+                        timed_execute(cur, "debug_version", "SELECT version();")
+                        db_details["version"] = cur.fetchone()[0]
+                        
+                        # Kontrola PostGIS
+                        try:
+                            timed_execute(cur, "postgis_version", "SELECT PostGIS_Version();")
+                            db_details["postgis_version"] = cur.fetchone()[0]
+                        except Exception as postgis_error:
+                            db_details["postgis_error"] = str(postgis_error)
+                        
+                        # Kontrola tabulek
+                        timed_execute(cur, "debug_tables", """
+                            SELECT table_name 
+                            FROM information_schema.tables 
+                            WHERE table_schema = 'public'
+                        """)
+                        db_details["tables"] = [row[0] for row in cur.fetchall()]
+                        
+                        # Odhad počtu vzpomínek (bez průchodu celou tabulkou)
+                        if "memories" in db_details["tables"]:
+                            db_details["memories_count"] = diagnostics.estimated_counts(cur, ["memories"]).get("memories")
+                            db_details["memories_count_estimated"] = True
+                        else:
+                            db_details["memories_table_error"] = "relation \"memories\" does not exist"
                 
-                conn.close()
                 db_connection_status = "Connected"
                 db_error = None
                 
             except Exception as db_connect_error:
                 db_connection_status = "Connection Failed"
-                db_error = str(db_connect_error)
+                db_error = str(getattr(db_connect_error, "detail", db_connect_error))
         else:
             db_connection_status = "No Database URL Found"
             db_error = "No suitable database URL environment variable found"
@@ -469,17 +757,14 @@ async def debug_info():
         }
     }
 
-@app.get("/api/diagnostic")
-async def diagnostic():
+def diagnostic_snapshot() -> Dict[str, Any]:
     """
-    Diagnostický endpoint pro ověření funkčnosti API a stavu databáze.
-    Vrací detailní informace o:
-    - Stavu připojení k databázi
-    - Počtu vzpomínek v databázi
-    - Struktuře dat vzpomínek
-    - Verzi PostGIS
+    Diagnostický snímek pro ověření funkčnosti API a stavu databáze:
+    - Stav připojení k databázi
+    - Odhad počtu vzpomínek v databázi (pg_class.reltuples)
+    - Struktura dat vzpomínek
+    - Verze PostGIS
     """
-    conn = None
     result = {
         "status": "initializing",
         "api_version": "1.0.0",
@@ -489,61 +774,59 @@ async def diagnostic():
             "tables": [],
             "postgis_version": None,
             "memories_count": 0,
+            "memories_count_estimated": True,
             "sample_memory": None
         },
         "errors": []
     }
     
     try:
-        # Připojení k databázi
-        conn = next(get_db())
-        result["database"]["connected"] = True
-        result["status"] = "connected_to_db"
+        # Připojení k databázi (spojení z poolu)
+        with connection() as conn:
+            result["database"]["connected"] = True
+            result["status"] = "connected_to_db"
         
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Získání seznamu tabulek
-            cur.execute("""
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_schema = 'public'
-            """)
-            tables = [row["table_name"] for row in cur.fetchall()]
-            result["database"]["tables"] = tables
-            
-            # Kontrola existence tabulky memories
-            memories_exists = "memories" in tables
-            result["database"]["memories_table_exists"] = memories_exists
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # Získání seznamu tabulek
+                timed_execute(cur, "debug_tables", """
+                    SELECT table_name 
+                    FROM information_schema.tables 
+                    WHERE table_schema = 'public'
+                """)
+                tables = [row["table_name"] for row in cur.fetchall()]
+                result["database"]["tables"] = tables
             
-            # Kontrola PostGIS verze
-            try:
-                cur.execute("SELECT PostGIS_Version()")
-                postgis_version = cur.fetchone()
-                result["database"]["postgis_version"] = postgis_version["postgis_version"] if postgis_version else None
-            except Exception as e:
-                result["database"]["postgis_version"] = "not_installed"
-                result["errors"].append(f"PostGIS error: {str(e)}")
+                # Kontrola existence tabulky memories
+                memories_exists = "memories" in tables
+                result["database"]["memories_table_exists"] = memories_exists
             
-            # Pokud tabulka memories existuje, získáme počet vzpomínek a ukázku
-            if memories_exists:
+                # Kontrola PostGIS verze
                 try:
-                    # Počet vzpomínek
-                    cur.execute("SELECT COUNT(*) as count FROM memories")
-                    count = cur.fetchone()
-                    result["database"]["memories_count"] = count["count"] if count else 0
+                    timed_execute(cur, "postgis_version", "SELECT PostGIS_Version()")
+                    postgis_version = cur.fetchone()
+                    result["database"]["postgis_version"] = postgis_version["postgis_version"] if postgis_version else None
+                except Exception as e:
+                    result["database"]["postgis_version"] = "not_installed"
+                    result["errors"].append(f"PostGIS error: {str(e)}")
+            
+                # Pokud tabulka memories existuje, získáme odhad počtu vzpomínek a ukázku
+                if memories_exists:
+                    try:
+                        # Odhad počtu z pg_class (COUNT(*) by procházel celou tabulku)
+                        result["database"]["memories_count"] = diagnostics.estimated_counts(cur, ["memories"]).get("memories")
                     
-                    # Vzorová vzpomínka s kompletními daty (pokud existuje)
-                    if result["database"]["memories_count"] > 0:
-                        cur.execute("""
+                        # Nejnovější vzpomínka s kompletními daty (přes primární klíč, bez řazení tabulky)
+                        timed_execute(cur, "diagnostic_sample", """
                             SELECT id, text, location, keywords, source, date, coordinates,
-                                   ST_X(coordinates::geometry) as longitude, 
-                                   ST_Y(coordinates::geometry) as latitude,
+                                   lon as longitude, 
+                                   lat as latitude,
                                    created_at
                             FROM memories
-                            ORDER BY created_at DESC
+                            ORDER BY id DESC
                             LIMIT 1
                         """)
                         sample = cur.fetchone()
-                        
+                    
                         # Převedeme na slovník pro JSON výstup
                         if sample:
                             memory_dict = dict(sample)
@@ -551,8 +834,8 @@ async def diagnostic():
                             memory_dict["coordinates"] = str(memory_dict["coordinates"])
                             memory_dict["created_at"] = str(memory_dict["created_at"])
                             result["database"]["sample_memory"] = memory_dict
-                except Exception as e:
-                    result["errors"].append(f"Error querying memories: {str(e)}")
+                    except Exception as e:
+                        result["errors"].append(f"Error querying memories: {str(e)}")
         
         # Přidáme informace o databázovém URL (bezpečně maskované)
         db_url = os.getenv('DATABASE_URL', 'not set')
@@ -567,10 +850,28 @@ async def diagnostic():
         
     except Exception as e:
         result["status"] = "error"
-        result["errors"].append(str(e))
+        result["errors"].append(str(getattr(e, "detail", e)))
     
     return result
 
+DEBUG_SNAPSHOT = diagnostics.CachedSnapshot("/api/debug", debug_snapshot)
+DIAGNOSTIC_SNAPSHOT = diagnostics.CachedSnapshot("/api/diagnostic", diagnostic_snapshot)
+
+# Diagnostický endpoint pro kontrolu proměnných prostředí
+@app.get("/api/debug")
+async def debug_info(response: Response):
+    """Cachovaný snímek prostředí a databáze (stáří v hlavičce X-Snapshot-Age)"""
+    snapshot, age = await DEBUG_SNAPSHOT.get()
+    response.headers["X-Snapshot-Age"] = str(age)
+    return snapshot
+
+@app.get("/api/diagnostic")
+async def diagnostic(response: Response):
+    """Cachovaný diagnostický snímek (stáří v hlavičce X-Snapshot-Age)"""
+    snapshot, age = await DIAGNOSTIC_SNAPSHOT.get()
+    response.headers["X-Snapshot-Age"] = str(age)
+    return snapshot
+
 def mask_db_url(url):
     """Maskuje citlivé části databázového URL"""
     if not url:
@@ -598,103 +899,36 @@ def mask_db_url(url):
 
 # Endpoint pro přidání nové vzpomínky
 @app.post("/api/memories", response_model=MemoryResponse, status_code=201)
-async def add_memory(memory: MemoryCreate):
-    conn = None
+def add_memory(memory: MemoryCreate, response: Response, dedupe: bool = False, conn=Depends(get_db)):
+    """Přidání vzpomínky - klíčová slova lze zadat přímo, jinak se extrahují z textu"""
     try:
-        # Připojení k databázi
-        conn = next(get_db())
-        
-        # Extrahování klíčových slov, pokud nebyla poskytnuta přímo
-        keywords = memory.keywords if memory.keywords else extract_keywords(memory.text)
-        
-        # Vytvoření SQL dotazu s odolností proti SQL injection pomocí parametrizovaného dotazu
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Kontrola existence tabulky a vytvoření, pokud neexistuje
-            cur.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'memories')")
-            table_exists = cur.fetchone()['exists']
-            
-            if not table_exists:
-                try:
-                    print("Tabulka memories neexistuje, vytvářím...")
-                    # Nejprve zkontrolujeme, zda je PostGIS nainstalován
-                    try:
-                        cur.execute("SELECT PostGIS_Version()")
-                    except:
-                        # Pokud PostGIS není nainstalován, pokusíme se ho přidat
-                        try:
-                            cur.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
-                            conn.commit()
-                            print("PostGIS rozšíření úspěšně přidáno.")
-                        except Exception as e:
-                            print(f"Nelze přidat PostGIS rozšíření: {str(e)}")
-                            raise HTTPException(
-                                status_code=500,
-                                detail=f"PostGIS rozšíření není dostupné: {str(e)}"
-                            )
-                    
-                    # Vytvoření tabulky memories
-                    cur.execute("""
-                        CREATE TABLE memories (
-                            id SERIAL PRIMARY KEY,
-                            text TEXT NOT NULL,
-                            location VARCHAR(255) NOT NULL,
-                            coordinates GEOMETRY(POINT, 4326) NOT NULL,
-                            keywords TEXT[] DEFAULT '{}',
-                            source VARCHAR(255),
-                            date DATE,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        );
-                    """)
-                    conn.commit()
-                    print("Tabulka memories úspěšně vytvořena.")
-                except Exception as e:
-                    print(f"Chyba při vytváření tabulky: {str(e)}")
-                    conn.rollback()
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Nelze vytvořit tabulku memories: {str(e)}"
-                    )
-            
-            try:
-                # Vložení nové vzpomínky do databáze
-                cur.execute("""
-                    INSERT INTO memories (text, location, coordinates, keywords, source, date)
-                    VALUES (%s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 4326), %s, %s, %s)
-                    RETURNING id, text, location, keywords, source, date, 
-                              ST_X(coordinates) as longitude, ST_Y(coordinates) as latitude;
-                """, (
-                    memory.text,
-                    memory.location,
-                    memory.longitude,
-                    memory.latitude,
-                    keywords,
-                    memory.source,
-                    memory.date
-                ))
-                
-                # Získání vloženého záznamu
-                new_memory = cur.fetchone()
-                conn.commit()
-                
-                if new_memory:
-                    # Převod na slovník a vrácení jako odpověď
-                    return dict(new_memory)
-                else:
-                    raise HTTPException(status_code=500, detail="Failed to retrieve the newly added memory")
-                
-            except Exception as e:
-                # Rollback v případě chyby
-                conn.rollback()
-                print(f"Chyba při vkládání vzpomínky: {str(e)}")
-                raise HTTPException(status_code=500, detail=str(e))
-                
+            created = memory_service.create_memory(cur, memory.model_dump(), dedupe=dedupe)
+        remember_write(conn, response)
+        return created
+    except DuplicateMemory as e:
+        raise duplicate_conflict(e)
     except Exception as e:
-        print(f"Obecná chyba při přidávání vzpomínky: {str(e)}")
+        logger.error("Chyba při přidávání vzpomínky: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Hromadné vložení vzpomínek jedním dotazem
+@app.post("/api/memories/bulk", response_model=List[MemoryResponse], status_code=201)
+def add_memories_bulk(memories: List[MemoryCreate], response: Response, conn=Depends(get_db)):
+    if len(memories) > memory_service.MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Nejvýše {memory_service.MAX_BATCH_SIZE} vzpomínek najednou")
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            created = memory_service.insert_memories(cur, [m.model_dump() for m in memories])
+        remember_write(conn, response)
+        return created
+    except Exception as e:
+        logger.error("Chyba při hromadném vkládání vzpomínek: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
-    
-    # Nepřidáváme finally blok, který by zavíral připojení, protože používáme connection pool
 
 # Spuštění aplikace, pokud je tento soubor spuštěn přímo
+# (pro produkci viz gunicorn.conf.py, zde jen uvicorn s volitelnými workery)
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT", "8000")), workers=workers) 
\ No newline at end of file
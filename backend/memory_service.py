@@ -0,0 +1,180 @@
+"""
+Jednotná cesta pro zápis vzpomínek
+
+/api/analyze, /api/memories, hromadné vložení i fronta úloh (jobs.py) vkládají
+vzpomínky přes insert_memories(). Zásady:
+
+- schéma (tabulka memories, PostGIS, tabulky pro detekci duplicit) se ověří
+  jednou za běh procesu, ne v každém požadavku,
+- vložení je jeden dotaz INSERT ... RETURNING pro libovolný počet vzpomínek;
+  ve stejném dotazu se uloží i MinHash signatury a LSH buckety (dedup.py),
+- spojení běží v autocommit režimu a jeden příkaz je atomický, takže není
+  potřeba explicitní transakce ani commit; spojení vrací do poolu get_db,
+- zneplatnění single-flight a fronta embeddingů (after_commit) proběhnou až
+  po potvrzení zápisu - v autocommit režimu hned, volající s vlastní
+  transakcí (fronta úloh) je volá sám po commitu,
+- souřadnice se čtou z generovaných sloupců lat/lon; starší databázi
+  (GEOGRAPHY, bez lat/lon) je třeba předem migrovat (backend/coordinates.py),
+  coordinates.ensure_schema stav jen ověří.
+"""
+
+import json
+from typing import Any, Dict, List, Sequence
+
+import coordinates
+import dedup
+import embeddings
+import singleflight
+from logging_config import get_logger
+from metrics import timed_execute
+
+logger = get_logger("memory_service")
+
+# Nejvyšší počet vzpomínek v jednom hromadném vložení
+MAX_BATCH_SIZE = 1000
+
+# Stejné schéma jako database/init.sql
+SCHEMA_SQL = """
+    CREATE EXTENSION IF NOT EXISTS postgis;
+    CREATE TABLE IF NOT EXISTS memories (
+        id SERIAL PRIMARY KEY,
+        text TEXT NOT NULL,
+        location VARCHAR(255) NOT NULL,
+        coordinates GEOMETRY(Point, 4326) NOT NULL,
+        keywords TEXT[] DEFAULT '{}',
+        source VARCHAR(255),
+        date VARCHAR(255),
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        lat DOUBLE PRECISION GENERATED ALWAYS AS (ST_Y(coordinates)) STORED,
+        lon DOUBLE PRECISION GENERATED ALWAYS AS (ST_X(coordinates)) STORED
+    );
+"""
+
+_schema_ready = False
+
+
+class DuplicateMemory(Exception):
+    """Vzpomínka je téměř shodná s již uloženou (při dedupe=True)"""
+
+    def __init__(self, duplicate_of: int, similarity: float):
+        super().__init__(f"Near-duplicate of memory {duplicate_of}")
+        self.duplicate_of = duplicate_of
+        self.similarity = similarity
+
+
+def extract_keywords(text: str) -> List[str]:
+    """Jednoduchá extrakce klíčových slov z textu"""
+    # Rozdělíme text na slova a vybereme slova delší než 4 znaky
+    words = [word.strip('.,!?()[]{}":;') for word in text.split()]
+    keywords = [word for word in words if len(word) > 4]
+    # Vrátíme unikátní klíčová slova
+    return list(set(keywords))[:5]  # Omezíme na max 5 klíčových slov
+
+
+def ensure_schema(cur) -> None:
+    """Ověří schéma pro zápis (jednou za běh procesu)"""
+    global _schema_ready
+    if not _schema_ready:
+        timed_execute(cur, "memories_schema", SCHEMA_SQL)
+        coordinates.ensure_schema(cur)
+        dedup.ensure_schema(cur)
+        _schema_ready = True
+
+
+def insert_memories(cur, memories: Sequence[Dict[str, Any]], extract: bool = True) -> List[Dict[str, Any]]:
+    """
+    Vloží vzpomínky jedním dotazem a vrátí je ve stejném pořadí.
+
+    Každá položka obsahuje text, location, latitude, longitude a volitelně
+    keywords (prázdné = extrakce z textu, při extract=False zůstanou prázdná),
+    source a date.
+    """
+    if not memories:
+        return []
+    ensure_schema(cur)
+
+    rows = []
+    for ord_, memory in enumerate(memories):
+        signature = dedup.signature(memory["text"])
+        keywords = list(memory.get("keywords") or [])
+        rows.append({
+            "ord": ord_,
+            "text": memory["text"],
+            "location": memory["location"],
+            "latitude": memory["latitude"],
+            "longitude": memory["longitude"],
+            "keywords": keywords or (extract_keywords(memory["text"]) if extract else []),
+            "source": memory.get("source"),
+            "date": memory.get("date"),
+            "signature": signature,
+            "buckets": dedup.band_buckets(signature)[1],
+        })
+
+    # CTE input se odkazuje vícekrát, PostgreSQL ji proto vyhodnotí jen jednou
+    # a každá vzpomínka dostane ze sekvence právě jedno id
+    timed_execute(cur, "insert_memories", """
+        WITH input AS (
+            SELECT nextval(pg_get_serial_sequence('memories', 'id')) AS id, r.*
+            FROM jsonb_to_recordset(%s::jsonb) AS r(
+                ord INTEGER, text TEXT, location TEXT,
+                latitude DOUBLE PRECISION, longitude DOUBLE PRECISION,
+                keywords TEXT[], source TEXT, date TEXT,
+                signature BIGINT[], buckets BIGINT[]
+            )
+            ORDER BY r.ord
+        ),
+        inserted AS (
+            INSERT INTO memories (id, text, location, coordinates, keywords, source, date)
+            SELECT id, text, location, ST_SetSRID(ST_MakePoint(longitude, latitude), 4326),
+                   keywords, source, date
+            FROM input
+            RETURNING id, text, location, keywords, source, date,
+                      lon as longitude, lat as latitude
+        ),
+        minhash AS (
+            INSERT INTO memory_minhash (memory_id, signature)
+            SELECT id, signature FROM input
+        ),
+        lsh AS (
+            INSERT INTO memory_lsh (band, bucket, memory_id)
+            SELECT (b.band - 1)::smallint, b.bucket, input.id
+            FROM input, unnest(input.buckets) WITH ORDINALITY AS b(bucket, band)
+            ON CONFLICT DO NOTHING
+        )
+        SELECT inserted.*, input.ord
+        FROM inserted JOIN input ON input.id = inserted.id
+        ORDER BY input.ord
+    """, (json.dumps(rows),))
+
+    columns = [d[0] for d in cur.description]
+    created = []
+    for row in cur.fetchall():
+        memory = dict(row) if isinstance(row, dict) else dict(zip(columns, row))
+        memory.pop("ord", None)
+        memory["keywords"] = memory["keywords"] or []
+        created.append(memory)
+    # V autocommit režimu je příkaz už potvrzený; jinak after_commit volá volající po commitu
+    if cur.connection.autocommit:
+        after_commit(created)
+    return created
+
+
+def after_commit(created: Sequence[Dict[str, Any]]) -> None:
+    """
+    Kroky po potvrzení zápisu - před commitem by embeddingy vznikly i pro
+    vzpomínky z odvolané transakce
+    """
+    # Souběžná čtení po zápisu už nesdílí dotazy spuštěné před ním
+    singleflight.invalidate()
+    for memory in created:
+        embeddings.EMBEDDING_QUEUE.enqueue(memory["id"], memory["text"])
+
+
+def create_memory(cur, memory: Dict[str, Any], dedupe: bool = False) -> Dict[str, Any]:
+    """Vloží jednu vzpomínku, při dedupe=True nejdřív odmítne téměř shodnou"""
+    if dedupe:
+        ensure_schema(cur)
+        matches = dedup.find_duplicates(cur, dedup.signature(memory["text"]), dedup.DEDUPE_THRESHOLD, limit=1)
+        if matches:
+            raise DuplicateMemory(matches[0]["id"], matches[0]["similarity"])
+    return insert_memories(cur, [memory])[0]
@@ -0,0 +1,270 @@
+"""
+Metriky latence a propustnosti ve formátu Prometheus
+
+Modul obsahuje minimalistické čítače, gauge a histogramy (bez externí
+závislosti na prometheus_client), ASGI middleware, které měří každý HTTP
+požadavek, a obal nad cursor.execute pro měření databázových dotazů podle
+názvu příkazu. Výstup se vystavuje na endpointu /metrics.
+
+Potomci metrik pro danou kombinaci labelů se vytváří jen jednou a poté se
+pouze inkrementují, takže měření nepřidává na požadavek další alokace.
+"""
+
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Dict, List, Sequence, Tuple
+
+# Content-Type textového formátu Prometheus
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Hranice histogramů latence (sekundy) a velikosti odpovědí (bajty)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+def _escape(value: str) -> str:
+    """Escapování hodnoty labelu podle specifikace textového formátu"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Společný základ metrik - správa potomků podle hodnot labelů"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Vrátí (a případně jednorázově vytvoří) potomka pro dané hodnoty labelů"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"Metrika {self.name} očekává labely {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def collect(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        labels = _format_labels(self.labelnames, values)
+        return [f"{self.name}{labels} {_format_value(child.value)}"]
+
+
+class _Value:
+    """Jednoduchá hodnota pro čítač a gauge"""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """Monotónně rostoucí čítač"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+
+class Gauge(_Metric):
+    """Hodnota, která může růst i klesat (např. počet rozpracovaných požadavků)"""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+
+class _HistogramValue:
+    """Počty pozorování v jednotlivých přihrádkách (nekumulativně) a jejich součet"""
+
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    """Histogram s pevnými hranicemi přihrádek"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames + ("le",), values + (_format_value(bound),))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    """Seznam metrik, které se vykreslují na /metrics"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "memorymap_http_requests_total", "Počet HTTP požadavků",
+    ("method", "route", "status")))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "memorymap_http_request_duration_seconds", "Doba zpracování HTTP požadavku",
+    ("method", "route")))
+HTTP_RESPONSE_SIZE = REGISTRY.register(Histogram(
+    "memorymap_http_response_size_bytes", "Velikost těla odpovědi",
+    ("method", "route"), buckets=SIZE_BUCKETS))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "memorymap_http_requests_in_flight", "Počet právě zpracovávaných požadavků",
+    ("method",)))
+DB_QUERY_LATENCY = REGISTRY.register(Histogram(
+    "memorymap_db_query_duration_seconds", "Doba běhu databázového dotazu",
+    ("statement",)))
+DB_QUERY_ERRORS = REGISTRY.register(Counter(
+    "memorymap_db_query_errors_total", "Počet neúspěšných databázových dotazů",
+    ("statement",)))
+
+# Standardní HTTP metody - ostatní (libovolné slovo od klienta) se sčítají pod OTHER,
+# aby počet řad metrik nerostl bez omezení
+_HTTP_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "CONNECT", "TRACE"})
+
+# Předpřipravené hodnoty labelu status, aby se nevytvářely řetězce za běhu
+_STATUS_CLASSES = {code: f"{code // 100}xx" for code in range(100, 600)}
+
+
+def timed_execute(cur, statement: str, query, params=None):
+    """
+    Provede cur.execute a zaznamená dobu běhu pod názvem příkazu.
+    Název příkazu slouží jako label, takže musí být konstantní (ne SQL text).
+    """
+    start = perf_counter()
+    try:
+        return cur.execute(query, params)
+    except Exception:
+        DB_QUERY_ERRORS.labels(statement).inc()
+        raise
+    finally:
+        DB_QUERY_LATENCY.labels(statement).observe(perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """
+    Čisté ASGI middleware měřící počet požadavků, latenci, velikost odpovědí
+    a rozpracované požadavky. Jako label route se používá šablona cesty
+    (např. /api/memories/{memory_id}), ne konkrétní URL.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in _HTTP_METHODS else "OTHER"
+        in_flight = HTTP_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start = perf_counter()
+        state = [500, 0]  # status, velikost těla
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                state[1] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = perf_counter() - start
+            in_flight.dec()
+            # FastAPI ukládá nalezenou routu do scope během routování
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            status = _STATUS_CLASSES.get(state[0], str(state[0]))
+            HTTP_REQUESTS.labels(method, route_path, status).inc()
+            HTTP_LATENCY.labels(method, route_path).observe(elapsed)
+            HTTP_RESPONSE_SIZE.labels(method, route_path).observe(state[1])
@@ -0,0 +1,450 @@
+"""
+Volitelné rozdělení tabulky memories na partitions
+
+Při milionech vzpomínek je jedna halda s GIST a GIN indexy pomalá na VACUUM
+i REINDEX a hromadné importy se přetahují se čtením. Tabulku lze proto
+převést na deklarativně partitionovanou podle jednoho ze schémat:
+
+- region - LIST podle prefixu geohashe (ST_GeoHash(coordinates, přesnost),
+  výchozí přesnost 3 = buňky cca 1,4° × 1,4°). Dotazy s bbox nebo okruhem
+  přidávají podmínku nad stejným výrazem (query_planner.region_condition),
+  takže PostgreSQL partitions mimo oblast vynechá už při plánování.
+- year - RANGE po desetiletích podle roku události
+  (query_planner.YEAR_EXPRESSION). Časové filtry year_from/year_to používají
+  přesně tento výraz, prořezání proto funguje bez úprav dotazů.
+- created - RANGE po letech podle created_at. Žádný dotaz API podle created_at
+  nefiltruje; schéma slouží k archivaci (odpojení starých let) a k tomu, aby
+  nové vzpomínky přibývaly do jedné malé partition.
+
+Vlastní partition dostanou jen hodnoty klíče s alespoň --min-rows řádky,
+ostatní řádky (a řádky s klíčem NULL, např. datum bez roku) jdou do
+memories_default.
+
+Primární klíč partitionované tabulky musí obsahovat klíč partitions a ten
+je u schémat region a year výraz - id proto má jen neunikátní index
+(memories_id_idx) a unikátnost zajišťuje sekvence. Ostatní tabulky na
+memories neodkazují cizím klíčem, převod se jich netýká.
+
+Převod drží exkluzivní zámek nad memories po celou dobu kopírování dat,
+spouští se proto ručně mimo provoz. Workery schéma zjistí při zahřátí -
+po převodu je restartujte.
+
+    python backend/partitioning.py status
+    python backend/partitioning.py convert --scheme region --precision 3
+    python backend/partitioning.py convert --scheme year --min-rows 1
+
+Hromadný import do vlastní partition (bez soupeření se čtením memories):
+
+    python backend/partitioning.py stage u2f      # prázdná tabulka memories_r_u2f s CHECK omezením
+    psql $DATABASE_URL -c "\\copy memories_r_u2f (text, location, coordinates, keywords, source, date) FROM 'data.csv' CSV"
+    python backend/partitioning.py attach memories_r_u2f
+
+attach přesune do partition i odpovídající řádky z memories_default,
+připojí ji (indexy dostaví PostgreSQL, kontrola rozsahu se díky CHECK
+omezení přeskočí) a přičte nové vzpomínky do pyramidy hustoty a souhrnu
+míst (places.py). detach partition odpojí (a její vzpomínky z obou
+souhrnů odečte) - odpojená tabulka
+zůstane v databázi pro archivaci (pg_dump -t) nebo opětovné připojení.
+Signatury pro detekci duplicit a embeddingy nově nahraných vzpomínek se
+dopočítají příkazy backfill v dedup.py a embeddings.py.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from db import connection, database_url
+from logging_config import get_logger
+from metrics import timed_execute
+from query_planner import YEAR_EXPRESSION, region_key
+from startup import on_warmup
+
+logger = get_logger("partitioning")
+
+SCHEMES = ("region", "year", "created")
+
+# Výchozí délka geohashe pro schéma region
+REGION_PRECISION = 3
+
+# Výchozí nejmenší počet řádků, pro který vznikne samostatná partition
+MIN_PARTITION_ROWS = 10000
+
+DEFAULT_PARTITION = "memories_default"
+
+# Prefix názvu partition podle schématu
+_PREFIXES = {"region": "memories_r_", "year": "memories_y", "created": "memories_c"}
+
+_GEOHASH_RE = re.compile(r"^[0-9b-hjkmnp-z]+$")
+_PRECISION_RE = re.compile(r"st_geohash\(coordinates, (\d+)\)", re.IGNORECASE)
+
+DETECT_SQL = """
+    SELECT p.partstrat, pg_get_partkeydef(p.partrelid) AS keydef
+    FROM pg_partitioned_table p
+    WHERE p.partrelid = to_regclass('memories')
+"""
+
+PARTITIONS_SQL = """
+    SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound,
+           c.reltuples::bigint AS estimate
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'memories'::regclass
+    ORDER BY c.relname
+"""
+
+# Zjištěné schéma (jednou za běh procesu, viz detect)
+_detected: Optional[Dict[str, Any]] = None
+
+
+class PartitioningError(Exception):
+    """Neplatný požadavek na správu partitions (špatné schéma, klíč, název)"""
+
+
+def _row_values(row) -> Tuple:
+    return tuple(row.values()) if isinstance(row, dict) else tuple(row)
+
+
+def _row(cur) -> Optional[Tuple]:
+    row = cur.fetchone()
+    return _row_values(row) if row is not None else None
+
+
+def detect(cur, refresh: bool = False) -> Dict[str, Any]:
+    """Schéma partitions tabulky memories: {"scheme": None|region|year|created, "precision": ...}"""
+    global _detected
+    if _detected is not None and not refresh:
+        return _detected
+    timed_execute(cur, "partitioning_detect", DETECT_SQL)
+    row = _row(cur)
+    detected: Dict[str, Any] = {"scheme": None, "precision": None}
+    if row:
+        strategy, keydef = row
+        if strategy == "l":
+            match = _PRECISION_RE.search(keydef)
+            detected = {"scheme": "region", "precision": int(match.group(1)) if match else None}
+        elif "created_at" in keydef:
+            detected["scheme"] = "created"
+        else:
+            detected["scheme"] = "year"
+    _detected = detected
+    return detected
+
+
+def region_precision(cur=None) -> Optional[int]:
+    """
+    Délka geohashe regionálních partitions, nebo None. Bez kurzoru vrátí jen
+    už zjištěnou hodnotu (při zahřátí nebo prvním dotazu).
+    """
+    if cur is not None:
+        detected = detect(cur)
+    elif _detected is not None:
+        detected = _detected
+    else:
+        return None
+    return detected["precision"] if detected["scheme"] == "region" else None
+
+
+def partition_key(scheme: str, precision: int = REGION_PRECISION) -> str:
+    """Výraz klíče partitions pro dané schéma"""
+    if scheme == "region":
+        return region_key(precision)
+    if scheme == "year":
+        return f"({YEAR_EXPRESSION})"
+    if scheme == "created":
+        return "created_at"
+    raise PartitioningError(f"Neznámé schéma {scheme}, povolená: {', '.join(SCHEMES)}")
+
+
+def partition_bounds(scheme: str, key: str, precision: int = REGION_PRECISION) -> Tuple[str, str, str]:
+    """
+    Název partition, klauzule FOR VALUES a ekvivalentní CHECK podmínka pro
+    hodnotu klíče (geohash, rok desetiletí, rok vložení)
+    """
+    expression = partition_key(scheme, precision)
+    if scheme == "region":
+        key = key.lower()
+        if len(key) != precision or not _GEOHASH_RE.match(key):
+            raise PartitioningError(f"Klíč regionu musí být geohash délky {precision}")
+        return (_PREFIXES[scheme] + key, f"FOR VALUES IN ('{key}')",
+                f"{expression} IS NOT NULL AND {expression} = '{key}'")
+    try:
+        year = int(key)
+    except ValueError:
+        raise PartitioningError("Klíč schématu year a created musí být rok")
+    if scheme == "year":
+        start = year // 10 * 10
+        return (f"{_PREFIXES[scheme]}{start}", f"FOR VALUES FROM ({start}) TO ({start + 10})",
+                f"{expression} IS NOT NULL AND {expression} >= {start} AND {expression} < {start + 10}")
+    start, end = f"'{year}-01-01 00:00:00+00'", f"'{year + 1}-01-01 00:00:00+00'"
+    return (f"{_PREFIXES[scheme]}{year}", f"FOR VALUES FROM ({start}) TO ({end})",
+            f"created_at IS NOT NULL AND created_at >= {start} AND created_at < {end}")
+
+
+def key_from_name(scheme: str, name: str) -> str:
+    """Hodnota klíče z názvu partition (opak partition_bounds)"""
+    prefix = _PREFIXES[scheme]
+    if not name.startswith(prefix) or len(name) == len(prefix):
+        raise PartitioningError(f"Partition schématu {scheme} musí mít název {prefix}<klíč>")
+    return name[len(prefix):]
+
+
+def partitions(cur) -> List[Dict[str, Any]]:
+    """Připojené partitions s hranicemi a odhadem počtu řádků"""
+    timed_execute(cur, "partitioning_list", PARTITIONS_SQL)
+    return [dict(zip(("name", "bound", "estimate"), _row_values(row))) for row in cur.fetchall()]
+
+
+def _columns(cur, table: str) -> List[str]:
+    """Negenerované sloupce tabulky (ty se kopírují, lat/lon se dopočítají)"""
+    timed_execute(cur, "partitioning_columns", """
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+        ORDER BY attnum
+    """, (table,))
+    return [_row_values(row)[0] for row in cur.fetchall()]
+
+
+def _keys_with_rows(cur, scheme: str, precision: int, min_rows: int) -> List[str]:
+    """Hodnoty klíče z dat převáděné tabulky, které dostanou vlastní partition"""
+    if scheme == "region":
+        value = region_key(precision)
+    elif scheme == "year":
+        value = f"({YEAR_EXPRESSION}) / 10 * 10"
+    else:
+        value = "extract(year FROM created_at AT TIME ZONE 'UTC')::int"
+    timed_execute(cur, "partitioning_keys", f"""
+        SELECT {value} AS key FROM memories_unpartitioned
+        WHERE {value} IS NOT NULL
+        GROUP BY 1 HAVING count(*) >= %s ORDER BY 1
+    """, (min_rows,))
+    return [str(_row_values(row)[0]) for row in cur.fetchall()]
+
+
+def _apply_aggregates(cur, table: str, delta: int) -> None:
+    """
+    Přičte/odečte vzpomínky tabulky v pyramidě hustoty a v souhrnu míst (pokud
+    existují) - připojení a odpojení partition triggery nad memories nespouští
+    """
+    timed_execute(cur, "aggregates_exist", """
+        SELECT to_regclass('memory_density') IS NOT NULL, to_regclass('location_summary') IS NOT NULL
+    """)
+    has_density, has_places = _row(cur)
+    if has_density:
+        timed_execute(cur, "partitioning_density", f"""
+            SELECT memory_density_apply(array_agg(lon), array_agg(lat), %s) FROM {table}
+        """, (delta,))
+    if has_places:
+        timed_execute(cur, "partitioning_places", f"""
+            SELECT location_summary_apply(jsonb_agg(jsonb_build_object(
+                'location', location, 'lat', lat, 'lon', lon, 'created_at', created_at, 'keywords', keywords)), %s)
+            FROM {table}
+        """, (delta,))
+        if delta < 0:
+            timed_execute(cur, "partitioning_places_cleanup", f"""
+                DELETE FROM location_summary WHERE memory_count <= 0;
+                DELETE FROM location_keywords WHERE memory_count <= 0;
+                UPDATE location_summary s
+                SET latest_at = (SELECT max(m.created_at) FROM memories m WHERE m.location = s.location)
+                WHERE s.location IN (SELECT DISTINCT location FROM {table});
+            """)
+
+
+def convert(cur, scheme: str, precision: int = REGION_PRECISION,
+            min_rows: int = MIN_PARTITION_ROWS, keep_old: bool = False) -> List[Dict[str, Any]]:
+    """
+    Převede memories na partitionovanou tabulku (v transakci volajícího).
+    Indexy se přenesou podle definic původní tabulky, primární klíč se změní
+    na neunikátní index nad id. Pyramida hustoty se nepřepočítává - data se
+    jen přesouvají, triggery se vytvoří až nad novou tabulkou.
+    """
+    import density
+    import places
+
+    key = partition_key(scheme, precision)
+    if detect(cur, refresh=True)["scheme"]:
+        raise PartitioningError("Tabulka memories už je rozdělená na partitions")
+
+    timed_execute(cur, "partitioning_lock", "LOCK TABLE memories IN ACCESS EXCLUSIVE MODE")
+    timed_execute(cur, "partitioning_sequence", "SELECT pg_get_serial_sequence('memories', 'id')")
+    sequence = _row(cur)[0]
+    timed_execute(cur, "partitioning_indexes", """
+        SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisunique
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = 'memories'::regclass
+        ORDER BY c.relname
+    """)
+    indexes = [_row_values(row) for row in cur.fetchall()]
+
+    timed_execute(cur, "partitioning_rename", "ALTER TABLE memories RENAME TO memories_unpartitioned")
+    if sequence:
+        # Sekvence nesmí zaniknout s původní tabulkou
+        timed_execute(cur, "partitioning_sequence_detach", f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+    strategy = "LIST" if scheme == "region" else "RANGE"
+    timed_execute(cur, "partitioning_create", f"""
+        CREATE TABLE memories (
+            LIKE memories_unpartitioned INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS
+        ) PARTITION BY {strategy} ({key})
+    """)
+
+    for value in _keys_with_rows(cur, scheme, precision, min_rows):
+        name, bound, _ = partition_bounds(scheme, value, precision)
+        timed_execute(cur, "partitioning_partition", f"CREATE TABLE {name} PARTITION OF memories {bound}")
+    timed_execute(cur, "partitioning_partition", f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF memories DEFAULT")
+
+    columns = ", ".join(_columns(cur, "memories_unpartitioned"))
+    timed_execute(cur, "partitioning_copy", f"""
+        INSERT INTO memories ({columns}) SELECT {columns} FROM memories_unpartitioned
+    """)
+
+    if keep_old:
+        for name, _, _ in indexes:
+            timed_execute(cur, "partitioning_index_rename", f"ALTER INDEX {name} RENAME TO {name}_unpartitioned")
+    else:
+        timed_execute(cur, "partitioning_drop_old", "DROP TABLE memories_unpartitioned")
+
+    # Indexy až po nakopírování dat - jeden průchod místo aktualizace po řádcích
+    for name, definition, unique in indexes:
+        if unique:
+            new_name = "memories_id_idx" if name == "memories_pkey" else f"{name}_nonunique"
+            logger.info("Unikátní index %s nelze přenést (neobsahuje klíč partitions), vytvářím %s", name, new_name)
+            definition = definition.replace("CREATE UNIQUE INDEX", "CREATE INDEX", 1).replace(name, new_name, 1)
+        timed_execute(cur, "partitioning_index", definition)
+
+    if sequence:
+        timed_execute(cur, "partitioning_sequence_attach", f"ALTER SEQUENCE {sequence} OWNED BY memories.id")
+    # Triggery pyramidy hustoty a souhrnu míst (funkce a tabulky zůstávají, CREATE ... IF NOT EXISTS)
+    timed_execute(cur, "density_schema", density.SCHEMA_SQL)
+    timed_execute(cur, "places_schema", places.SCHEMA_SQL)
+    timed_execute(cur, "partitioning_analyze", "ANALYZE memories")
+    detect(cur, refresh=True)
+    return partitions(cur)
+
+
+def stage(cur, key: str) -> str:
+    """Prázdná nepřipojená tabulka pro import do budoucí partition (s CHECK omezením jejího rozsahu)"""
+    detected = detect(cur, refresh=True)
+    if not detected["scheme"]:
+        raise PartitioningError("Tabulka memories není rozdělená na partitions")
+    name, _, check = partition_bounds(detected["scheme"], key, detected["precision"] or REGION_PRECISION)
+    # Indexy se nekopírují - import je bez nich rychlejší a ATTACH je dostaví
+    timed_execute(cur, "partitioning_stage", f"""
+        CREATE TABLE {name} (LIKE memories INCLUDING DEFAULTS INCLUDING GENERATED);
+        ALTER TABLE {name} ADD CONSTRAINT {name}_bound CHECK ({check});
+    """)
+    return name
+
+
+def attach(cur, name: str) -> None:
+    """
+    Připojí tabulku jako partition: přičte její vzpomínky do pyramidy hustoty a souhrnu míst,
+    přesune do ní odpovídající řádky z memories_default a připojí ji
+    """
+    detected = detect(cur, refresh=True)
+    if not detected["scheme"]:
+        raise PartitioningError("Tabulka memories není rozdělená na partitions")
+    scheme = detected["scheme"]
+    _, bound, check = partition_bounds(scheme, key_from_name(scheme, name), detected["precision"] or REGION_PRECISION)
+
+    timed_execute(cur, "partitioning_bound_exists", """
+        SELECT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = %s::regclass AND conname = %s)
+    """, (name, f"{name}_bound"))
+    if not _row(cur)[0]:
+        # Tabulka odpojená příkazem detach - omezení umožní přeskočit kontrolu rozsahu
+        timed_execute(cur, "partitioning_bound", f"ALTER TABLE {name} ADD CONSTRAINT {name}_bound CHECK ({check})")
+
+    # Řádky z memories_default už v pyramidě a souhrnu míst jsou - přičítají se jen importované
+    _apply_aggregates(cur, name, 1)
+    timed_execute(cur, "partitioning_default_exists", "SELECT to_regclass(%s) IS NOT NULL", (DEFAULT_PARTITION,))
+    if _row(cur)[0]:
+        columns = ", ".join(_columns(cur, name))
+        timed_execute(cur, "partitioning_move_default", f"""
+            WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {check} RETURNING *)
+            INSERT INTO {name} ({columns}) SELECT {columns} FROM moved
+        """)
+        logger.info("Z %s přesunuto %s řádků do %s", DEFAULT_PARTITION, cur.rowcount, name)
+    timed_execute(cur, "partitioning_attach", f"ALTER TABLE memories ATTACH PARTITION {name} {bound}")
+    timed_execute(cur, "partitioning_drop_bound", f"ALTER TABLE {name} DROP CONSTRAINT {name}_bound")
+    timed_execute(cur, "partitioning_analyze", f"ANALYZE {name}")
+
+
+def add(cur, key: str) -> str:
+    """Vytvoří partition pro hodnotu klíče a přesune do ní řádky z memories_default"""
+    name = stage(cur, key)
+    attach(cur, name)
+    return name
+
+
+def detach(cur, name: str) -> None:
+    """Odpojí partition - tabulka zůstane, její vzpomínky zmizí z API i ze souhrnů"""
+    timed_execute(cur, "partitioning_is_partition", """
+        SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhparent = 'memories'::regclass AND inhrelid = %s::regclass)
+    """, (name,))
+    if not _row(cur)[0]:
+        raise PartitioningError(f"{name} není partition tabulky memories")
+    timed_execute(cur, "partitioning_detach", f"ALTER TABLE memories DETACH PARTITION {name}")
+    _apply_aggregates(cur, name, -1)
+
+
+@on_warmup
+def detect_partitioning() -> None:
+    """Zjistí schéma partitions, aby je dotazy s bbox mohly prořezávat"""
+    if not database_url():
+        return
+    with connection() as conn:
+        with conn.cursor() as cur:
+            detected = detect(cur, refresh=True)
+            if detected["scheme"]:
+                logger.info("Tabulka memories je rozdělená na partitions: %s", detected)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description="Správa partitions tabulky memories")
+    parser.add_argument("--database-url", default=database_url())
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("status", help="Schéma a seznam partitions")
+    convert_parser = commands.add_parser("convert", help="Převést memories na partitionovanou tabulku")
+    convert_parser.add_argument("--scheme", choices=SCHEMES, required=True)
+    convert_parser.add_argument("--precision", type=int, default=REGION_PRECISION, help="Délka geohashe (schéma region)")
+    convert_parser.add_argument("--min-rows", type=int, default=MIN_PARTITION_ROWS,
+                                help="Nejméně řádků pro samostatnou partition, zbytek jde do memories_default")
+    convert_parser.add_argument("--keep-old", action="store_true", help="Ponechat původní tabulku jako memories_unpartitioned")
+    for command, help_text in (("stage", "Vytvořit nepřipojenou tabulku pro import"),
+                               ("add", "Vytvořit a připojit partition, přesunout řádky z memories_default")):
+        commands.add_parser(command, help=help_text).add_argument("key", help="Geohash, rok desetiletí nebo rok vložení")
+    for command, help_text in (("attach", "Připojit tabulku jako partition"), ("detach", "Odpojit partition")):
+        commands.add_parser(command, help=help_text).add_argument("name", help="Název partition, např. memories_r_u2f")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Chybí --database-url nebo proměnná DATABASE_URL")
+
+    conn = psycopg2.connect(args.database_url)
+    try:
+        with conn.cursor() as cur:
+            if args.command == "convert":
+                result: Any = convert(cur, args.scheme, args.precision, args.min_rows, args.keep_old)
+            elif args.command == "stage":
+                result = stage(cur, args.key)
+            elif args.command == "add":
+                result = add(cur, args.key)
+            elif args.command == "attach":
+                attach(cur, args.name)
+                result = args.name
+            elif args.command == "detach":
+                detach(cur, args.name)
+                result = args.name
+            else:
+                detected = detect(cur)
+                result = {**detected, "partitions": partitions(cur) if detected["scheme"] else []}
+        conn.commit()
+    except PartitioningError as e:
+        conn.rollback()
+        print(f"Chyba: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        conn.close()
+    print(json.dumps(result, indent=2, ensure_ascii=False, default=str))
@@ -0,0 +1,239 @@
+"""
+Souhrn vzpomínek podle místa (location) pro pop-up okna míst
+
+Mnoho vzpomínek sdílí stejný řetězec location (např. "Jablonec nad Nisou").
+Tabulka location_summary drží pro každé místo počet vzpomínek, součty
+souřadnic (těžiště = součet / počet, jeden pin za místo) a čas nejnovější
+vzpomínky, tabulka location_keywords počty klíčových slov. Obě udržují
+příkazové (FOR EACH STATEMENT) triggery nad memories stejně jako pyramidu
+hustoty (density.py) - hromadný INSERT znamená jednu agregovanou aktualizaci.
+
+Nejnovější vzpomínky místa se berou přímo z memories přes index
+memories_location_idx (location, created_at DESC) - jedno indexové čtení.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from logging_config import get_logger
+from metrics import timed_execute
+
+logger = get_logger("places")
+
+# Nejvyšší počet míst v odpovědi /api/places
+MAX_PLACES = 5000
+# Nejvyšší počet klíčových slov a nejnovějších vzpomínek v detailu místa
+MAX_PLACE_ITEMS = 50
+
+# Funkce triggerů zvlášť - CREATE OR REPLACE FUNCTION nebere zámek nad memories,
+# takže se při startu obnoví i v existující databázi
+FUNCTIONS_SQL = """
+    CREATE OR REPLACE FUNCTION location_summary_apply(changes JSONB, delta INTEGER)
+    RETURNS void AS $$
+        WITH changed AS (
+            SELECT * FROM jsonb_to_recordset(changes) AS r(
+                location TEXT, lat DOUBLE PRECISION, lon DOUBLE PRECISION,
+                created_at TIMESTAMPTZ, keywords TEXT[]
+            )
+        ),
+        summary AS (
+            INSERT INTO location_summary (location, memory_count, sum_lat, sum_lon, latest_at)
+            SELECT location, delta * count(*), delta * sum(lat), delta * sum(lon),
+                   CASE WHEN delta > 0 THEN max(created_at) END
+            FROM changed
+            GROUP BY location
+            -- Pevné pořadí zamykání řádků - souběžné zápisy do stejných míst se nezablokují navzájem
+            ORDER BY location
+            ON CONFLICT (location) DO UPDATE SET
+                memory_count = location_summary.memory_count + EXCLUDED.memory_count,
+                sum_lat = location_summary.sum_lat + EXCLUDED.sum_lat,
+                sum_lon = location_summary.sum_lon + EXCLUDED.sum_lon,
+                latest_at = GREATEST(location_summary.latest_at, EXCLUDED.latest_at)
+        )
+        INSERT INTO location_keywords (location, keyword, memory_count)
+        SELECT changed.location, k.keyword, delta * count(*)
+        FROM changed, unnest(changed.keywords) AS k(keyword)
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        ON CONFLICT (location, keyword) DO UPDATE SET
+            memory_count = location_keywords.memory_count + EXCLUDED.memory_count;
+    $$ LANGUAGE sql;
+
+    CREATE OR REPLACE FUNCTION location_summary_refresh() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            PERFORM location_summary_apply(jsonb_agg(jsonb_build_object(
+                'location', location, 'lat', lat, 'lon', lon,
+                'created_at', created_at, 'keywords', keywords)), -1)
+            FROM old_rows;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM location_summary_apply(jsonb_agg(jsonb_build_object(
+                'location', location, 'lat', lat, 'lon', lon,
+                'created_at', created_at, 'keywords', keywords)), 1)
+            FROM new_rows;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            -- Maximum nelze odečíst - nejnovější vzpomínku dotčených míst dohledá index
+            DELETE FROM location_summary
+            WHERE memory_count <= 0 AND location IN (SELECT location FROM old_rows);
+            DELETE FROM location_keywords
+            WHERE memory_count <= 0 AND location IN (SELECT location FROM old_rows);
+            UPDATE location_summary s
+            SET latest_at = (SELECT max(m.created_at) FROM memories m WHERE m.location = s.location)
+            WHERE s.location IN (SELECT DISTINCT location FROM old_rows);
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql;
+"""
+
+SCHEMA_SQL = f"""
+    CREATE TABLE IF NOT EXISTS location_summary (
+        location VARCHAR(255) PRIMARY KEY,
+        memory_count INTEGER NOT NULL,
+        sum_lat DOUBLE PRECISION NOT NULL,
+        sum_lon DOUBLE PRECISION NOT NULL,
+        latest_at TIMESTAMP WITH TIME ZONE
+    );
+
+    CREATE TABLE IF NOT EXISTS location_keywords (
+        location VARCHAR(255) NOT NULL,
+        keyword TEXT NOT NULL,
+        memory_count INTEGER NOT NULL,
+        PRIMARY KEY (location, keyword)
+    );
+
+    CREATE INDEX IF NOT EXISTS memories_location_idx ON memories (location, created_at DESC);
+{FUNCTIONS_SQL}
+    DROP TRIGGER IF EXISTS memories_places_insert ON memories;
+    CREATE TRIGGER memories_places_insert AFTER INSERT ON memories
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION location_summary_refresh();
+    DROP TRIGGER IF EXISTS memories_places_delete ON memories;
+    CREATE TRIGGER memories_places_delete AFTER DELETE ON memories
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION location_summary_refresh();
+    DROP TRIGGER IF EXISTS memories_places_update ON memories;
+    CREATE TRIGGER memories_places_update AFTER UPDATE ON memories
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION location_summary_refresh();
+"""
+
+_schema_ready = False
+
+
+def ensure_schema(cur) -> None:
+    """
+    Při prvním použití vytvoří tabulky a triggery a naplní je z existujících
+    vzpomínek. Pokud tabulka už existuje (init.sql, jiný worker), DDL se
+    nespouští - nad memories by zbytečně bralo exkluzivní zámek.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    timed_execute(cur, "places_schema_check", "SELECT to_regclass('location_summary') IS NOT NULL AS present")
+    row = cur.fetchone()
+    present = row["present"] if isinstance(row, dict) else row[0]
+    if not present:
+        logger.info("Vytvářím souhrn vzpomínek podle míst")
+        timed_execute(cur, "places_schema", SCHEMA_SQL)
+        rebuild(cur)
+    else:
+        timed_execute(cur, "places_functions", FUNCTIONS_SQL)
+        timed_execute(cur, "places_empty_check", """
+            SELECT NOT EXISTS (SELECT 1 FROM location_summary) AND EXISTS (SELECT 1 FROM memories) AS stale
+        """)
+        row = cur.fetchone()
+        if row["stale"] if isinstance(row, dict) else row[0]:
+            logger.info("Souhrn míst je prázdný, přepočítávám jej")
+            rebuild(cur)
+    _schema_ready = True
+
+
+def rebuild(cur) -> None:
+    """Přepočítá souhrn míst z tabulky memories (po hromadném importu bez triggerů)"""
+    timed_execute(cur, "places_rebuild", """
+        TRUNCATE location_summary, location_keywords;
+        INSERT INTO location_summary (location, memory_count, sum_lat, sum_lon, latest_at)
+        SELECT location, count(*), sum(lat), sum(lon), max(created_at)
+        FROM memories GROUP BY location;
+        INSERT INTO location_keywords (location, keyword, memory_count)
+        SELECT m.location, k.keyword, count(*)
+        FROM memories m, unnest(m.keywords) AS k(keyword)
+        GROUP BY 1, 2;
+    """)
+
+
+def _place(row: Dict[str, Any]) -> Dict[str, Any]:
+    count = row["memory_count"]
+    return {
+        "name": row["location"],
+        "count": count,
+        "latitude": round(row["sum_lat"] / count, 6),
+        "longitude": round(row["sum_lon"] / count, 6),
+        "latest_at": row["latest_at"].isoformat() if row["latest_at"] else None,
+    }
+
+
+def list_places(cur, bbox: Optional[Tuple[float, float, float, float]] = None,
+                min_count: int = 1, limit: int = 1000, keywords: int = 0) -> List[Dict[str, Any]]:
+    """
+    Místa seřazená podle počtu vzpomínek (volitelně jen s těžištěm v bbox),
+    při keywords > 0 i s nejčastějšími klíčovými slovy každého místa
+    """
+    ensure_schema(cur)
+    columns, params = "", []
+    if keywords > 0:
+        columns = """, ARRAY(SELECT k.keyword FROM location_keywords k WHERE k.location = s.location
+                           ORDER BY k.memory_count DESC, k.keyword LIMIT %s) AS top_keywords"""
+        params.append(min(keywords, MAX_PLACE_ITEMS))
+    conditions = ["memory_count >= %s"]
+    params.append(max(1, min_count))
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        conditions.append("sum_lon / memory_count BETWEEN %s AND %s AND sum_lat / memory_count BETWEEN %s AND %s")
+        params.extend([min_lon, max_lon, min_lat, max_lat])
+    params.append(max(1, min(limit, MAX_PLACES)))
+    timed_execute(cur, "places_list", f"""
+        SELECT s.location, s.memory_count, s.sum_lat, s.sum_lon, s.latest_at{columns}
+        FROM location_summary s
+        WHERE {' AND '.join(conditions)}
+        ORDER BY memory_count DESC, location
+        LIMIT %s
+    """, params)
+    found = []
+    for row in cur.fetchall():
+        place = _place(row)
+        if keywords > 0:
+            place["top_keywords"] = row["top_keywords"]
+        found.append(place)
+    return found
+
+
+def place_detail(cur, name: str, keywords: int = 5, latest: int = 5) -> Optional[Dict[str, Any]]:
+    """Souhrn jednoho místa - počet, těžiště, nejčastější klíčová slova a nejnovější vzpomínky"""
+    ensure_schema(cur)
+    timed_execute(cur, "places_detail", """
+        SELECT location, memory_count, sum_lat, sum_lon, latest_at
+        FROM location_summary WHERE location = %s
+    """, (name,))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    place = _place(row)
+
+    timed_execute(cur, "places_keywords", """
+        SELECT keyword, memory_count AS count FROM location_keywords
+        WHERE location = %s ORDER BY memory_count DESC, keyword LIMIT %s
+    """, (name, max(0, min(keywords, MAX_PLACE_ITEMS))))
+    place["top_keywords"] = [dict(r) for r in cur.fetchall()]
+
+    timed_execute(cur, "places_latest", """
+        SELECT id, left(text, 200) AS text_preview, date, created_at
+        FROM memories WHERE location = %s
+        ORDER BY created_at DESC LIMIT %s
+    """, (name, max(0, min(latest, MAX_PLACE_ITEMS))))
+    place["latest"] = [
+        {**dict(r), "created_at": r["created_at"].isoformat() if r["created_at"] else None}
+        for r in cur.fetchall()
+    ]
+    return place
@@ -0,0 +1,346 @@
+"""
+Plánovač kombinovaných dotazů nad vzpomínkami
+
+Sestavuje jeden parametrizovaný SQL dotaz z prostorových (bbox / okruh),
+fulltextových, klíčových a časových podmínek. Podmínky jsou psány tak, aby
+odpovídaly indexům v database/init.sql (GIST nad coordinates, GIN nad
+to_tsvector('simple', text) a nad keywords, výrazový index nad rokem události),
+a plánovač zároveň odhaduje, který index by měl dotaz řídit.
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+# Přibližná délka jednoho stupně zeměpisné šířky v kilometrech
+KM_PER_DEGREE = 111.32
+
+# Plocha (km²), pod kterou považujeme prostorový filtr za dostatečně selektivní,
+# aby dotaz řídil GIST index (zhruba okres; celá ČR má cca 79 000 km²)
+SELECTIVE_AREA_KM2 = 5000.0
+
+# Maximální počet vrácených záznamů
+MAX_LIMIT = 1000
+
+# Výraz pro rok události - musí se shodovat s indexem memories_year_idx
+YEAR_EXPRESSION = "substring(date from '[0-9]{4}')::int"
+
+# Nejvyšší počet geohash buněk v podmínce pro prořezání regionálních partitions;
+# větší oblast se filtruje jen přes GIST index (čtou se všechny partitions)
+REGION_MAX_CELLS = 256
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Názvy indexů podle strategie (viz database/init.sql)
+STRATEGY_INDEXES = {
+    "spatial": "memories_coordinates_idx",
+    "fulltext": "memories_text_idx",
+    "keywords": "memories_keywords_idx",
+    "time": "memories_year_idx",
+    "recent": "memories_pins_idx",
+}
+
+
+class QueryValidationError(ValueError):
+    """Chyba ve struktuře filtru (neplatný bbox, chybějící střed okruhu apod.)"""
+
+
+def _bbox_area_km2(min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> float:
+    """Přibližná plocha obdélníku v km² (postačuje pro odhad selektivity)"""
+    mid_lat = math.radians((min_lat + max_lat) / 2)
+    width = (max_lon - min_lon) * KM_PER_DEGREE * math.cos(mid_lat)
+    height = (max_lat - min_lat) * KM_PER_DEGREE
+    return abs(width * height)
+
+
+def parse_bbox(bbox: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """bbox ve tvaru 'min_lon,min_lat,max_lon,max_lat'"""
+    if not bbox:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise QueryValidationError("bbox musí mít tvar min_lon,min_lat,max_lon,max_lat")
+    if min_lon >= max_lon or min_lat >= max_lat:
+        raise QueryValidationError("bbox má prohozené souřadnice")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+# Sloupce vzpomínky, které lze vybrat parametrem fields, a jejich SQL výrazy
+FIELD_EXPRESSIONS = {
+    "id": "id",
+    "text": "text",
+    "location": "location",
+    "keywords": "keywords",
+    "source": "source",
+    "date": "date",
+    "latitude": "lat AS latitude",
+    "longitude": "lon AS longitude",
+}
+
+
+# Předdefinované pohledy na vzpomínku (parametr view)
+VIEWS = {
+    "pins": ["id", "location", "latitude", "longitude"],
+    "summary": ["id", "text", "location", "keywords", "date", "latitude", "longitude"],
+    "full": list(FIELD_EXPRESSIONS),
+}
+
+# Výchozí délka náhledu textu v pohledu summary (znaky)
+SUMMARY_TEXT_PREVIEW = 200
+
+# Nejdelší povolený náhled textu
+MAX_TEXT_PREVIEW = 10000
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Seznam polí 'id,location,text' (None = všechna). Id je vždy součástí
+    výsledku, pořadí odpovídá FIELD_EXPRESSIONS.
+    """
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - FIELD_EXPRESSIONS.keys()
+    if unknown:
+        raise QueryValidationError(
+            f"Neznámá pole: {', '.join(sorted(unknown))} (povolená: {', '.join(FIELD_EXPRESSIONS)})")
+    return [name for name in FIELD_EXPRESSIONS if name == "id" or name in requested]
+
+
+def projection(fields: Optional[str], view: Optional[str],
+               text_preview: Optional[int]) -> Tuple[Optional[List[str]], Optional[int]]:
+    """
+    Pole a délka náhledu textu podle parametrů fields, view a text_preview.
+    fields má přednost před view; summary zkracuje text na SUMMARY_TEXT_PREVIEW.
+    """
+    if view is not None and view not in VIEWS:
+        raise QueryValidationError(f"view musí být jedna z hodnot: {', '.join(VIEWS)}")
+    if text_preview is not None and not 1 <= text_preview <= MAX_TEXT_PREVIEW:
+        raise QueryValidationError(f"text_preview musí být mezi 1 a {MAX_TEXT_PREVIEW}")
+    columns = parse_fields(fields)
+    if columns is None and view is not None:
+        columns = None if view == "full" else VIEWS[view]
+        if view == "summary" and text_preview is None:
+            text_preview = SUMMARY_TEXT_PREVIEW
+    return columns, text_preview
+
+
+def select_list(fields: Optional[List[str]], text_preview: Optional[int] = None) -> str:
+    """
+    Výrazy pro SELECT - čtou se jen vybrané sloupce. Při text_preview se text
+    zkrátí už v databázi (delší text končí výpustkou).
+    """
+    expressions = []
+    for name in fields or FIELD_EXPRESSIONS:
+        if name == "text" and text_preview:
+            expressions.append(f"CASE WHEN length(text) > {int(text_preview)} "
+                               f"THEN left(text, {int(text_preview)}) || '…' ELSE text END AS text")
+        else:
+            expressions.append(FIELD_EXPRESSIONS[name])
+    return ", ".join(expressions)
+
+
+def radius_envelope(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    Obálka okruhu ve stupních. Slouží jako předfiltr `&&`, který umí využít
+    GIST index, přesná vzdálenost se pak ověří přes ST_DWithin nad geography.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    dlon = radius_km / (KM_PER_DEGREE * cos_lat)
+    return lon - dlon, lat - dlat, lon + dlon, lat + dlat
+
+
+def region_key(precision: int) -> str:
+    """Klíč regionálních partitions (backend/partitioning.py) - prefix geohashe dané délky"""
+    return f"ST_GeoHash(coordinates, {int(precision)})"
+
+
+def _geohash_cell(x: int, y: int, lon_bits: int, lat_bits: int) -> str:
+    """Geohash buňky mřížky (x podél délky, y podél šířky) - bity se střídají od délky"""
+    bits = []
+    for i in range(lon_bits + lat_bits):
+        if i % 2 == 0:
+            lon_bits -= 1
+            bits.append((x >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            bits.append((y >> lat_bits) & 1)
+    chars = []
+    for i in range(0, len(bits), 5):
+        value = 0
+        for bit in bits[i:i + 5]:
+            value = value * 2 + bit
+        chars.append(_GEOHASH_ALPHABET[value])
+    return "".join(chars)
+
+
+def geohash_cover(bbox: Tuple[float, float, float, float], precision: int,
+                  max_cells: int = REGION_MAX_CELLS) -> Optional[List[str]]:
+    """
+    Geohashe dané délky, jejichž buňky protínají bbox (včetně dotyku hranice,
+    takže nezáleží na tom, ke které buňce hraniční bod přiřadí PostGIS).
+    Vrací None, pokud by buněk bylo víc než max_cells.
+    """
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    width = 360.0 / 2 ** lon_bits
+    height = 180.0 / 2 ** lat_bits
+    min_lon, min_lat, max_lon, max_lat = bbox
+
+    def cell_range(low: float, high: float, origin: float, size: float, bits: int) -> Tuple[int, int]:
+        first = max(0, math.ceil((low + origin) / size) - 1)
+        last = min(2 ** bits - 1, math.floor((high + origin) / size))
+        return first, last
+
+    x_first, x_last = cell_range(min_lon, max_lon, 180.0, width, lon_bits)
+    y_first, y_last = cell_range(min_lat, max_lat, 90.0, height, lat_bits)
+    if (x_last - x_first + 1) * (y_last - y_first + 1) > max_cells:
+        return None
+    return [_geohash_cell(x, y, lon_bits, lat_bits)
+            for x in range(x_first, x_last + 1)
+            for y in range(y_first, y_last + 1)]
+
+
+def region_condition(bbox: Tuple[float, float, float, float],
+                     region_precision: Optional[int]) -> Optional[Tuple[str, List[str]]]:
+    """
+    Podmínka nad klíčem regionálních partitions, díky které PostgreSQL při
+    plánování vynechá partitions mimo bbox. Bez partitions podle regionu None.
+    """
+    if not region_precision:
+        return None
+    cells = geohash_cover(bbox, region_precision)
+    if cells is None:
+        return None
+    return f"{region_key(region_precision)} = ANY(%s)", cells
+
+
+def _choose_strategy(area_km2: Optional[float], flt) -> str:
+    """
+    Heuristický výběr řídicího indexu. PostgreSQL si plán zvolí sám, my však
+    podmínky píšeme tak, aby jej mohl použít, a strategii vracíme jako nápovědu.
+    """
+    if area_km2 is not None and area_km2 <= SELECTIVE_AREA_KM2:
+        return "spatial"
+    if flt.text:
+        return "fulltext"
+    if flt.keywords:
+        return "keywords"
+    if area_km2 is not None:
+        return "spatial"
+    if flt.year_from is not None or flt.year_to is not None:
+        return "time"
+    return "recent"
+
+
+def build_query(flt, region_precision: Optional[int] = None) -> Tuple[str, List[Any], str]:
+    """
+    Sestaví SQL dotaz pro daný filtr.
+
+    region_precision je délka geohashe, podle které je tabulka rozdělená na
+    partitions (partitioning.region_precision), jinak None.
+
+    Vrací trojici (sql, parametry, strategie).
+    """
+    conditions = []
+    params: List[Any] = []
+    area_km2 = None
+
+    # Prostorový filtr - obdélník
+    if flt.bbox is not None:
+        if len(flt.bbox) != 4:
+            raise QueryValidationError("bbox musí mít tvar [min_lon, min_lat, max_lon, max_lat]")
+        min_lon, min_lat, max_lon, max_lat = flt.bbox
+        if min_lon >= max_lon or min_lat >= max_lat:
+            raise QueryValidationError("bbox má prohozené souřadnice")
+        conditions.append("coordinates::geometry && ST_MakeEnvelope(%s, %s, %s, %s, 4326)")
+        params.extend([min_lon, min_lat, max_lon, max_lat])
+        region = region_condition((min_lon, min_lat, max_lon, max_lat), region_precision)
+        if region:
+            conditions.append(region[0])
+            params.append(region[1])
+        area_km2 = _bbox_area_km2(min_lon, min_lat, max_lon, max_lat)
+
+    # Prostorový filtr - okruh kolem bodu
+    if flt.radius_km is not None:
+        if flt.latitude is None or flt.longitude is None:
+            raise QueryValidationError("radius_km vyžaduje latitude a longitude")
+        if flt.radius_km <= 0:
+            raise QueryValidationError("radius_km musí být kladný")
+        envelope = radius_envelope(flt.latitude, flt.longitude, flt.radius_km)
+        conditions.append("coordinates::geometry && ST_MakeEnvelope(%s, %s, %s, %s, 4326)")
+        params.extend(envelope)
+        region = region_condition(envelope, region_precision)
+        if region:
+            conditions.append(region[0])
+            params.append(region[1])
+        conditions.append(
+            "ST_DWithin(coordinates::geography, "
+            "ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography, %s)"
+        )
+        params.extend([flt.longitude, flt.latitude, flt.radius_km * 1000])
+        radius_area = math.pi * flt.radius_km ** 2
+        area_km2 = radius_area if area_km2 is None else min(area_km2, radius_area)
+
+    # Fulltext - výraz musí odpovídat indexu memories_text_idx
+    if flt.text:
+        conditions.append("to_tsvector('simple', text) @@ plainto_tsquery('simple', %s)")
+        params.append(flt.text)
+
+    # Klíčová slova - stačí shoda alespoň jednoho (GIN index nad polem)
+    if flt.keywords:
+        conditions.append("keywords && %s::text[]")
+        params.append(list(flt.keywords))
+
+    # Časové rozmezí podle roku události
+    if flt.year_from is not None and flt.year_to is not None and flt.year_from > flt.year_to:
+        raise QueryValidationError("year_from musí být menší nebo rovno year_to")
+    if flt.year_from is not None:
+        conditions.append(f"{YEAR_EXPRESSION} >= %s")
+        params.append(flt.year_from)
+    if flt.year_to is not None:
+        conditions.append(f"{YEAR_EXPRESSION} <= %s")
+        params.append(flt.year_to)
+
+    limit = max(1, min(flt.limit, MAX_LIMIT))
+    where = " AND ".join(conditions) if conditions else "TRUE"
+    sql = f"""
+        SELECT id, text, location, keywords, source, date,
+               lon as longitude, lat as latitude
+        FROM memories
+        WHERE {where}
+        ORDER BY created_at DESC
+        LIMIT %s
+    """
+    params.append(limit)
+
+    return sql, params, _choose_strategy(area_km2, flt)
+
+
+def _collect_plan(node: Dict[str, Any], node_types: List[str], indexes: List[str]) -> None:
+    """Rekurzivně projde uzly plánu a posbírá typy uzlů a použité indexy"""
+    node_types.append(node.get("Node Type"))
+    if node.get("Index Name"):
+        indexes.append(node["Index Name"])
+    for child in node.get("Plans", []):
+        _collect_plan(child, node_types, indexes)
+
+
+def summarize_explain(explain_json: Any) -> Dict[str, Any]:
+    """Zestruční výstup EXPLAIN (FORMAT JSON) na nápovědu o ceně dotazu"""
+    # psycopg2 vrací JSON buď jako seznam, nebo jako řetězec
+    if isinstance(explain_json, str):
+        import json
+        explain_json = json.loads(explain_json)
+    plan = explain_json[0]["Plan"]
+    node_types: List[str] = []
+    indexes: List[str] = []
+    _collect_plan(plan, node_types, indexes)
+    return {
+        "startup_cost": plan.get("Startup Cost"),
+        "total_cost": plan.get("Total Cost"),
+        "estimated_rows": plan.get("Plan Rows"),
+        "node_types": node_types,
+        "indexes_used": indexes,
+    }
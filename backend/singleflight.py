@@ -0,0 +1,73 @@
+"""
+Slučování souběžných identických čtení (single-flight)
+
+Když populární odkaz otevře stovky session najednou, každá by si vzala
+vlastní spojení z poolu a spustila tentýž dotaz nad celou tabulkou. Místo
+toho první požadavek (leader) spustí dotaz ve vlákně a ostatní požadavky se
+stejným klíčem, které dorazí, než doběhne, počkají na jeho výsledek - včetně
+už serializovaného těla odpovědi. Spojení z poolu se tak bere jen jednou.
+
+Klíč tvoří název routy, parametry a verze dat. Verzi zvyšuje invalidate()
+po každém zápisu vzpomínek v tomto procesu, takže požadavek po zápisu se
+nepřipojí k dotazu, který začal před ním. Nic se neukládá do cache - výsledek
+se sdílí jen po dobu běhu dotazu.
+
+Podíl sloučených požadavků ukazuje metrika memorymap_singleflight_requests_total
+(role="follower" vůči všem požadavkům dané routy).
+"""
+
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from metrics import REGISTRY, Counter
+
+SINGLEFLIGHT_REQUESTS = REGISTRY.register(Counter(
+    "memorymap_singleflight_requests_total",
+    "Požadavky sloučené single-flight vrstvou (leader = spustil dotaz, follower = sdílel výsledek)",
+    ("route", "role")))
+
+_version = 0
+_version_lock = threading.Lock()
+
+_flights: Dict[Tuple[Hashable, ...], "asyncio.Future[Any]"] = {}
+
+
+def data_version() -> int:
+    """Aktuální verze dat tohoto procesu"""
+    return _version
+
+
+def invalidate() -> None:
+    """Zvýší verzi dat - volá se po zápisu, další čtení už nesdílí starší dotazy"""
+    global _version
+    with _version_lock:
+        _version += 1
+
+
+def _forget(key: Tuple[Hashable, ...], task: "asyncio.Future[Any]") -> None:
+    if _flights.get(key) is task:
+        del _flights[key]
+    # Výjimku si vyzvedneme, i když na výsledek nikdo nečekal
+    if not task.cancelled():
+        task.exception()
+
+
+async def do(route: str, params: Tuple[Hashable, ...], func: Callable[[], Any]) -> Any:
+    """
+    Spustí func (blokující, ve vlákně) nebo se připojí k již běžícímu volání
+    se stejnou routou, parametry a verzí dat a vrátí jeho výsledek.
+    """
+    key = (route, params, _version)
+    task = _flights.get(key)
+    if task is not None and task.get_loop() is asyncio.get_running_loop():
+        SINGLEFLIGHT_REQUESTS.labels(route, "follower").inc()
+    else:
+        SINGLEFLIGHT_REQUESTS.labels(route, "leader").inc()
+        # Dotaz běží jako samostatný task - odpojení leadera jej nezruší ostatním
+        task = asyncio.ensure_future(run_in_threadpool(func))
+        _flights[key] = task
+        task.add_done_callback(lambda done: _forget(key, done))
+    return await asyncio.shield(task)
@@ -0,0 +1,88 @@
+"""
+Rychlý studený start
+
+Na free plánu se služba po neaktivitě uspí a první požadavek čeká na import
+aplikace. Proto:
+
+- těžké geo/NLP moduly (geopandas, shapely, pyarrow, spacy ...) se importují
+  líně přes lazy_import() - skutečný import proběhne až při prvním přístupu
+  k atributu modulu, tedy v endpointu, který jej potřebuje,
+- zahřátí (otevření connection poolu, naplnění cache) běží na pozadí až po
+  spuštění serveru, takže nezdržuje otevření portu.
+
+Funkce pro zahřátí se registrují dekorátorem @on_warmup. Stav zahřátí je
+dostupný přes warmup_state (pro health/readiness endpointy).
+"""
+
+import importlib
+import importlib.util
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from logging_config import get_logger
+
+logger = get_logger("startup")
+
+_warmup_hooks: List[Callable[[], None]] = []
+
+# Stav zahřátí - started/finished jsou časy (time.time()), errors názvy selhaných kroků
+warmup_state: Dict[str, object] = {"started": None, "finished": None, "errors": []}
+
+
+def lazy_import(name: str):
+    """
+    Vrátí modul, jehož skutečné načtení se odloží do prvního přístupu k atributu.
+    Chybějící modul vyvolá ImportError hned (find_spec), ne až při použití.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"Modul {name} není nainstalován")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def optional_lazy_import(name: str):
+    """Jako lazy_import, ale pro volitelnou závislost vrací None, pokud chybí"""
+    try:
+        return lazy_import(name)
+    except ImportError:
+        return None
+
+
+def on_warmup(func: Callable[[], None]) -> Callable[[], None]:
+    """Zaregistruje funkci, která se spustí při zahřátí workeru"""
+    _warmup_hooks.append(func)
+    return func
+
+
+def run_warmup() -> None:
+    """Postupně spustí registrované kroky zahřátí, chyby pouze zaloguje"""
+    warmup_state.update(started=time.time(), finished=None, errors=[])
+    for hook in _warmup_hooks:
+        start = time.perf_counter()
+        try:
+            hook()
+            logger.info("Zahřátí %s dokončeno za %.0f ms", hook.__name__, (time.perf_counter() - start) * 1000)
+        except Exception as e:
+            warmup_state["errors"].append(hook.__name__)
+            logger.warning("Zahřátí %s selhalo: %s", hook.__name__, e)
+    warmup_state["finished"] = time.time()
+
+
+def start_background_warmup() -> Optional[threading.Thread]:
+    """Spustí zahřátí v samostatném vlákně (lze vypnout WARMUP_ENABLED=0)"""
+    if os.getenv("WARMUP_ENABLED", "1") == "0":
+        return None
+    thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+    thread.start()
+    return thread
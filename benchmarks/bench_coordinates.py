@@ -0,0 +1,107 @@
+"""
+Benchmark čtení souřadnic pro výpis pinů
+
+Porovnává dva tvary dotazu pro výpis pinů seřazený od nejnovějších:
+
+- cast: ST_X/ST_Y(coordinates::geometry) počítané pro každý řádek (stav před
+  sjednocením uložení souřadnic),
+- columns: generované sloupce lat/lon, které pokrývá index memories_pins_idx
+  (index-only scan).
+
+Pro každý scénář vypíše percentily latence a z EXPLAIN (ANALYZE, BUFFERS)
+uzel, který dotaz řídí, počet načtených bloků a heap fetches. Pokud databáze
+ještě není migrovaná, skript migraci provede (backend/coordinates.py).
+
+Použití:
+    python benchmarks/bench_coordinates.py --database-url $BENCH_DATABASE_URL --limit 100000 --runs 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import psycopg2
+
+from run_benchmark import git_commit, percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+import coordinates  # noqa: E402
+
+SCENARIOS = {
+    "cast": """
+        SELECT id, location, ST_X(coordinates::geometry) AS longitude, ST_Y(coordinates::geometry) AS latitude
+        FROM memories ORDER BY created_at DESC LIMIT %s
+    """,
+    "columns": """
+        SELECT id, location, lon AS longitude, lat AS latitude
+        FROM memories ORDER BY created_at DESC LIMIT %s
+    """,
+}
+
+
+def plan_summary(cur, sql, limit):
+    """Řídící uzel plánu a čtení bloků z EXPLAIN (ANALYZE, BUFFERS)"""
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, (limit,))
+    plan = cur.fetchone()[0][0]["Plan"]
+    node = plan
+    while node.get("Plans") and node["Node Type"] in ("Limit", "Sort", "Gather Merge", "Result"):
+        node = node["Plans"][0]
+    return {
+        "node": node["Node Type"],
+        "index": node.get("Index Name"),
+        "heap_fetches": node.get("Heap Fetches"),
+        "shared_hit_blocks": plan.get("Shared Hit Blocks"),
+        "shared_read_blocks": plan.get("Shared Read Blocks"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark čtení souřadnic")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"))
+    parser.add_argument("--limit", type=int, default=100000, help="Počet vrácených pinů")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--output", default="bench_coordinates.json")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Chybí --database-url nebo proměnná BENCH_DATABASE_URL")
+
+    conn = psycopg2.connect(args.database_url)
+    conn.autocommit = True
+    cur = conn.cursor()
+    coordinates.migrate(cur)
+    # Mapa viditelnosti musí být aktuální, jinak index-only scan čte i tabulku
+    cur.execute("VACUUM (ANALYZE) memories")
+
+    results = []
+    for name, sql in SCENARIOS.items():
+        print(f"Scénář {name}...")
+        cur.execute(sql, (args.limit,))  # zahřátí cache
+        cur.fetchall()
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            cur.execute(sql, (args.limit,))
+            cur.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        results.append({
+            "scenario": name,
+            "limit": args.limit,
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "plan": plan_summary(cur, sql, args.limit),
+        })
+    conn.close()
+
+    report = {"commit": git_commit(), "results": results}
+    print(json.dumps(report, indent=2))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
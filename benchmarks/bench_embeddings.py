@@ -0,0 +1,133 @@
+"""
+Benchmark sémantického vyhledávání (pgvector halfvec + HNSW)
+
+Nad naplněnou benchmarkovou databází (viz seed.py, doporučeno --size 100k):
+
+1. dopočítá vektory všem vzpomínkám a změří propustnost výpočtu,
+2. vypíše velikost tabulky a HNSW indexu v porovnání s float32 vektory,
+3. změří latenci dotazů přes HNSW index (p50/p95/p99) a recall@k
+   vůči přesnému prohledání bez indexu.
+
+Použití:
+    python benchmarks/bench_embeddings.py --database-url $BENCH_DATABASE_URL --queries 200 --output bench_embeddings.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from run_benchmark import git_commit, percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+import embeddings  # noqa: E402
+
+
+def relation_sizes(cur):
+    cur.execute("""
+        SELECT pg_relation_size('memory_embeddings') AS heap_bytes,
+               pg_total_relation_size('memory_embeddings') AS total_bytes,
+               pg_relation_size('memory_embeddings_hnsw_idx') AS hnsw_bytes,
+               (SELECT count(*) FROM memory_embeddings) AS vectors
+    """)
+    sizes = dict(cur.fetchone())
+    # Stejné vektory jako float32 (vector) by zabraly dvojnásobek dat
+    sizes["float16_payload_bytes"] = sizes["vectors"] * embeddings.EMBEDDING_DIM * 2
+    sizes["float32_payload_bytes"] = sizes["vectors"] * embeddings.EMBEDDING_DIM * 4
+    return sizes
+
+
+def exact_ids(cur, vector, k, exclude_id):
+    """Přesných k nejbližších sousedů (sekvenční průchod bez HNSW indexu)"""
+    cur.execute("BEGIN")
+    cur.execute("SET LOCAL enable_indexscan = off")
+    cur.execute("""
+        SELECT memory_id FROM memory_embeddings
+        WHERE memory_id <> %s
+        ORDER BY embedding <=> %s::halfvec
+        LIMIT %s
+    """, (exclude_id, vector, k))
+    ids = [row["memory_id"] for row in cur.fetchall()]
+    cur.execute("COMMIT")
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sémantického vyhledávání")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--recall-queries", type=int, default=50,
+                        help="Počet dotazů, pro které se počítá recall (přesné hledání je pomalé)")
+    parser.add_argument("--ef-search", type=int, help="hnsw.ef_search (výchozí podle pgvector 40)")
+    parser.add_argument("--skip-backfill", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_embeddings.json")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Chybí --database-url nebo proměnná BENCH_DATABASE_URL")
+
+    conn = psycopg2.connect(args.database_url)
+    conn.autocommit = True
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    report = {"commit": git_commit(), "model": embeddings.model_name(), "dim": embeddings.EMBEDDING_DIM}
+
+    if not args.skip_backfill:
+        print("Počítám vektory...")
+        start = time.perf_counter()
+        count = embeddings.backfill(conn, batch_size=500, reembed=True)
+        elapsed = time.perf_counter() - start
+        report["backfill"] = {"vectors": count, "seconds": round(elapsed, 1),
+                              "vectors_per_second": round(count / elapsed) if elapsed else None}
+        cur.execute("ANALYZE memory_embeddings")
+
+    report["sizes"] = relation_sizes(cur)
+    if args.ef_search:
+        cur.execute("SET hnsw.ef_search = %s", (args.ef_search,))
+
+    cur.execute("SELECT min(memory_id) AS min_id, max(memory_id) AS max_id FROM memory_embeddings")
+    bounds = cur.fetchone()
+    rng = random.Random(args.seed)
+
+    latencies, recalls = [], []
+    print(f"Měřím {args.queries} dotazů...")
+    for i in range(args.queries):
+        memory_id = rng.randint(bounds["min_id"], bounds["max_id"])
+        cur.execute("SELECT embedding::text AS embedding FROM memory_embeddings WHERE memory_id = %s", (memory_id,))
+        row = cur.fetchone()
+        if not row:
+            continue
+        start = time.perf_counter()
+        results = embeddings.search(cur, row["embedding"], limit=args.k, exclude_id=memory_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if i < args.recall_queries:
+            expected = set(exact_ids(cur, row["embedding"], args.k, memory_id))
+            if expected:
+                recalls.append(len(expected & {r["id"] for r in results}) / len(expected))
+
+    latencies.sort()
+    report["search"] = {
+        "queries": len(latencies),
+        "k": args.k,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "recall_at_k": round(sum(recalls) / len(recalls), 3) if recalls else None,
+    }
+    conn.close()
+
+    print(json.dumps(report, indent=2))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Benchmark zápisové cesty vzpomínek
+
+Porovnává latenci vložení jedné vzpomínky:
+
+- legacy: původní průběh endpointu /api/analyze - kontrola existence tabulky,
+  kontrola PostGIS, INSERT ... RETURNING a samostatné uložení MinHash signatury
+  (4 dotazy na vzpomínku),
+- service: memory_service.create_memory() - jeden dotaz INSERT ... RETURNING
+  včetně signatury a LSH bucketů,
+- batch-N: memory_service.insert_memories() po N vzpomínkách (latence na vzpomínku).
+
+Měří přímo proti databázi (bez HTTP), takže rozdíl odpovídá počtu round tripů
+a práci v databázi. Vložené řádky se na konci smažou.
+
+Použití:
+    python benchmarks/bench_insert.py --database-url $BENCH_DATABASE_URL --rows 500 --batch-sizes 10,100
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from run_benchmark import git_commit, percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+import dedup  # noqa: E402
+import memory_service  # noqa: E402
+from generate_memories import FALLBACK_PLACES, MemoryGenerator  # noqa: E402
+
+
+def sample_memories(count, seed):
+    """Syntetické vzpomínky ve tvaru požadavku na /api/memories"""
+    generator = MemoryGenerator(FALLBACK_PLACES, seed)
+    memories = []
+    for _ in range(count):
+        text, location, point, _keywords, source, date = generator.row()
+        lon, lat = (float(v) for v in point[point.index("(") + 1:point.index(")")].split())
+        memories.append({"text": text, "location": location, "latitude": lat, "longitude": lon,
+                         "source": source, "date": date})
+    return memories
+
+
+def legacy_insert(cur, memory):
+    """Průběh zápisu před sjednocením (kopie dotazů z původního endpointu)"""
+    cur.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'memories')")
+    cur.fetchone()
+    cur.execute("SELECT PostGIS_Version()")
+    cur.fetchone()
+    cur.execute("""
+        INSERT INTO memories (text, location, keywords, source, date, coordinates)
+        VALUES (%s, %s, %s, %s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 4326))
+        RETURNING id, text, location, keywords, source, date,
+                ST_X(coordinates::geometry) as longitude, ST_Y(coordinates::geometry) as latitude
+    """, (memory["text"], memory["location"], memory_service.extract_keywords(memory["text"]),
+          memory["source"], memory["date"], memory["longitude"], memory["latitude"]))
+    row = cur.fetchone()
+    dedup.index_memory(cur, row["id"], dedup.signature(memory["text"]))
+    return [row["id"]]
+
+
+def measure(name, memories, batch_size, insert):
+    """Vloží vzpomínky po dávkách a vrátí statistiky latence na jednu vzpomínku"""
+    per_memory, ids = [], []
+    start_all = time.perf_counter()
+    for i in range(0, len(memories), batch_size):
+        batch = memories[i:i + batch_size]
+        start = time.perf_counter()
+        ids.extend(insert(batch))
+        per_memory.append((time.perf_counter() - start) * 1000 / len(batch))
+    elapsed = time.perf_counter() - start_all
+    per_memory.sort()
+    return ids, {
+        "scenario": name,
+        "rows": len(memories),
+        "batch_size": batch_size,
+        "rows_per_second": round(len(memories) / elapsed, 1),
+        "p50_ms": round(percentile(per_memory, 50), 3),
+        "p95_ms": round(percentile(per_memory, 95), 3),
+        "p99_ms": round(percentile(per_memory, 99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark zápisu vzpomínek")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"))
+    parser.add_argument("--rows", type=int, default=500, help="Počet vzpomínek na scénář")
+    parser.add_argument("--batch-sizes", default="10,100")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_insert.json")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Chybí --database-url nebo proměnná BENCH_DATABASE_URL")
+
+    # Fronta embeddingů v memory_service si bere spojení z poolu backendu
+    os.environ.setdefault("DATABASE_URL", args.database_url)
+    conn = psycopg2.connect(args.database_url)
+    conn.autocommit = True
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    memory_service.ensure_schema(cur)
+
+    memories = sample_memories(args.rows, args.seed)
+    random.Random(args.seed).shuffle(memories)
+
+    scenarios = [
+        ("legacy", 1, lambda batch: legacy_insert(cur, batch[0])),
+        ("service", 1, lambda batch: [memory_service.create_memory(cur, batch[0])["id"]]),
+    ]
+    for size in (int(v) for v in args.batch_sizes.split(",") if v):
+        scenarios.append((f"batch-{size}", size,
+                          lambda batch: [m["id"] for m in memory_service.insert_memories(cur, batch)]))
+
+    results, created = [], []
+    for name, batch_size, insert in scenarios:
+        print(f"Scénář {name}...")
+        ids, stats = measure(name, memories, batch_size, insert)
+        created.extend(ids)
+        results.append(stats)
+
+    # Úklid - vložené vzpomínky a jejich signatury
+    cur.execute("DELETE FROM memory_lsh WHERE memory_id = ANY(%s)", (created,))
+    cur.execute("DELETE FROM memory_minhash WHERE memory_id = ANY(%s)", (created,))
+    cur.execute("DELETE FROM memories WHERE id = ANY(%s)", (created,))
+    conn.close()
+
+    report = {"commit": git_commit(), "results": results}
+    print(json.dumps(report, indent=2))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+Ověření směrování čtení na repliky
+
+Proti backendu spuštěnému s DATABASE_REPLICA_URLS (viz docker-compose.replica.yml)
+opakovaně zapíše vzpomínku a hned ji v téže session (cookie s pozicí WAL) přečte.
+Každé čtení musí vzpomínku najít - buď na replice, která zápis už přehrála, nebo
+na primární databázi. Čtení bez cookie se má rozkládat mezi repliky.
+
+Použití:
+    python benchmarks/check_replicas.py --base-url http://localhost:8000 --rounds 50
+"""
+
+import argparse
+import sys
+from collections import Counter
+
+import requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kontrola read-your-writes a rozložení čtení")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    session = requests.Session()
+    after_write, anonymous, missing = Counter(), Counter(), 0
+    for i in range(args.rounds):
+        created = session.post(f"{args.base_url}/api/memories", json={
+            "text": f"Kontrola replikace {i}", "location": "Praha",
+            "latitude": 50.0875, "longitude": 14.4213,
+        }, timeout=10)
+        created.raise_for_status()
+        memory_id = created.json()["id"]
+
+        read = session.get(f"{args.base_url}/api/memories/{memory_id}", timeout=10)
+        after_write[read.headers.get("X-DB-Node", "?")] += 1
+        if read.status_code != 200:
+            missing += 1
+
+        plain = requests.get(f"{args.base_url}/api/memories/{memory_id}", timeout=10)
+        anonymous[plain.headers.get("X-DB-Node", "?")] += 1
+
+    print(f"Čtení po zápisu (s cookie): {dict(after_write)}")
+    print(f"Čtení bez cookie:           {dict(anonymous)}")
+    print(f"Nenalezené vzpomínky po zápisu: {missing}")
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
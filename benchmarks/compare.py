@@ -0,0 +1,48 @@
+"""
+Porovnání dvou reportů z run_benchmark.py
+
+Použití:
+    python benchmarks/compare.py baseline.json current.json
+"""
+
+import json
+import sys
+
+METRICS = [
+    ("throughput_rps", lambda r: r["throughput_rps"]),
+    ("p50_ms", lambda r: r["latency_ms"]["p50"]),
+    ("p95_ms", lambda r: r["latency_ms"]["p95"]),
+    ("p99_ms", lambda r: r["latency_ms"]["p99"]),
+    ("db_q/req", lambda r: r["db_queries_per_request"]),
+]
+
+
+def _change(old, new):
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f} %"
+
+
+def main(argv):
+    if len(argv) != 3:
+        print(__doc__)
+        return 2
+    with open(argv[1], encoding="utf-8") as f:
+        base = json.load(f)
+    with open(argv[2], encoding="utf-8") as f:
+        current = json.load(f)
+
+    print(f"{base['meta'].get('git_commit')} -> {current['meta'].get('git_commit')}")
+    for name, result in current["scenarios"].items():
+        old = base["scenarios"].get(name)
+        if old is None:
+            print(f"\n{name}: v základním reportu chybí")
+            continue
+        print(f"\n{name}")
+        for label, get in METRICS:
+            print(f"  {label:<15} {get(old):>10} -> {get(result):>10}  ({_change(get(old), get(result))})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,72 @@
+"""
+Report časů importu backendu (python -X importtime)
+
+Spustí `import main` v samostatném procesu s -X importtime a vypíše moduly
+s nejvyšším kumulativním časem importu. Slouží k odhalení těžkých modulů,
+které by se měly načítat líně (viz backend/startup.py).
+
+Použití:
+    python benchmarks/import_time.py --top 25 [--json import_time.json]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT, "backend")
+
+LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_imports(module: str = "main"):
+    """Vrátí seznam (modul, self_us, cumulative_us, hloubka) pro import modulu"""
+    env = dict(os.environ, WARMUP_ENABLED="0")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Import {module} selhal:\n{proc.stderr[-2000:]}")
+    entries = []
+    for line in proc.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil importů backendu")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", help="Uložit report do JSON souboru")
+    args = parser.parse_args()
+
+    entries = profile_imports(args.module)
+    target = next((e for e in entries if e[0] == args.module), None)
+    total_ms = target[2] / 1000 if target else sum(e[1] for e in entries) / 1000
+    top = sorted(entries, key=lambda e: e[2], reverse=True)[:args.top]
+
+    print(f"Import {args.module}: {total_ms:.1f} ms celkem, {len(entries)} modulů")
+    print(f"{'kumulativně [ms]':>17} {'vlastní [ms]':>13}  modul")
+    for name, self_us, cumulative_us, _ in top:
+        print(f"{cumulative_us / 1000:>17.1f} {self_us / 1000:>13.1f}  {name}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "module": args.module,
+                "total_ms": round(total_ms, 1),
+                "modules": [{"name": n, "self_ms": s / 1000, "cumulative_ms": c / 1000}
+                            for n, s, c, _ in top],
+            }, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+#!/bin/bash
+# Role pro streamovací replikaci a povolení replikačního spojení (jen pro lokální testy)
+set -e
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<SQL
+CREATE ROLE replicator WITH REPLICATION LOGIN PASSWORD 'replicator';
+SQL
+echo "host replication replicator all md5" >> "$PGDATA/pg_hba.conf"
@@ -0,0 +1,10 @@
+#!/bin/bash
+# Při prvním startu naklonuje primární databázi (pg_basebackup -R zapíše
+# primary_conninfo a standby.signal) a spustí ji jako hot standby
+set -e
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    until pg_isready -h primary -U replicator; do sleep 1; done
+    PGPASSWORD=replicator pg_basebackup -h primary -U replicator -D "$PGDATA" -R -X stream -P
+    chmod 700 "$PGDATA"
+fi
+exec postgres -c hot_standby=on
@@ -0,0 +1,86 @@
+"""
+Benchmark studeného startu backendu
+
+Opakovaně spustí uvicorn s aplikací a měří dobu od spuštění procesu do první
+úspěšné odpovědi endpointu. Při překročení --max-seconds (medián) skončí
+nenulovým kódem, takže jej lze použít jako kontrolu regresí.
+
+Použití:
+    python benchmarks/startup_time.py --runs 5 --max-seconds 3
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT, "backend")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_once(path: str, timeout: float) -> float:
+    port = _free_port()
+    env = dict(os.environ, LOG_LEVEL="WARNING")
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError("Backend se ukončil během startu")
+            try:
+                if requests.get(f"http://127.0.0.1:{port}{path}", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - start
+            except requests.RequestException:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"Backend neodpověděl do {timeout} s")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark studeného startu")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/", help="Endpoint, na jehož odpověď se čeká")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--max-seconds", type=float, help="Limit mediánu pro kontrolu regresí")
+    parser.add_argument("--json", help="Uložit výsledek do JSON souboru")
+    args = parser.parse_args()
+
+    times = []
+    for i in range(args.runs):
+        elapsed = measure_once(args.path, args.timeout)
+        times.append(elapsed)
+        print(f"Běh {i + 1}: {elapsed * 1000:.0f} ms")
+
+    median = statistics.median(times)
+    print(f"Medián: {median * 1000:.0f} ms, min {min(times) * 1000:.0f} ms, max {max(times) * 1000:.0f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"path": args.path, "runs_s": times, "median_s": median}, f, indent=2)
+
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"REGRESE: medián {median:.2f} s překračuje limit {args.max_seconds:.2f} s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,13 @@
+-- Volitelné: sémantické vyhledávání vyžaduje rozšíření pgvector (0.7+ kvůli typu halfvec)
+-- Rozměr vektoru musí odpovídat EMBEDDING_DIM backendu (výchozí 384)
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE TABLE IF NOT EXISTS memory_embeddings (
+    memory_id INTEGER PRIMARY KEY,
+    model VARCHAR(255) NOT NULL,
+    embedding halfvec(384) NOT NULL
+);
+
+-- HNSW index pro přibližné hledání nejbližších sousedů podle kosinové vzdálenosti
+CREATE INDEX IF NOT EXISTS memory_embeddings_hnsw_idx
+    ON memory_embeddings USING hnsw (embedding halfvec_cosine_ops);
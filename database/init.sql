@@ -10,11 +10,203 @@ CREATE TABLE IF NOT EXISTS memories (
     keywords TEXT[] DEFAULT '{}',
     source VARCHAR(255),
     date VARCHAR(255),
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    -- Souřadnice jako generované sloupce - čtou se bez ST_X/ST_Y pro každý řádek (backend/coordinates.py)
+    lat DOUBLE PRECISION GENERATED ALWAYS AS (ST_Y(coordinates)) STORED,
+    lon DOUBLE PRECISION GENERATED ALWAYS AS (ST_X(coordinates)) STORED
 );
 
 -- Vytvoření prostorového indexu pro rychlejší vyhledávání
 CREATE INDEX IF NOT EXISTS memories_coordinates_idx ON memories USING GIST (coordinates);
 
 -- Vytvoření textového indexu pro fulltextové vyhledávání
-CREATE INDEX IF NOT EXISTS memories_text_idx ON memories USING GIN (to_tsvector('simple', text)); 
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS memories_text_idx ON memories USING GIN (to_tsvector('simple', text)); 
+-- Index pro filtrování podle klíčových slov (operátor &&)
+CREATE INDEX IF NOT EXISTS memories_keywords_idx ON memories USING GIN (keywords);
+
+-- Výrazový index nad rokem události - výraz se musí shodovat s query_planner.YEAR_EXPRESSION
+CREATE INDEX IF NOT EXISTS memories_year_idx ON memories ((substring(date from '[0-9]{4}')::int));
+
+-- Krycí index pro řazení od nejnovějších vzpomínek - výpis pinů (id, místo, souřadnice)
+-- je index-only scan bez čtení tabulky
+CREATE INDEX IF NOT EXISTS memories_pins_idx ON memories (created_at DESC) INCLUDE (id, location, lat, lon);
+
+-- MinHash signatury a LSH buckety pro detekci téměř duplicitních vzpomínek (backend/dedup.py)
+CREATE TABLE IF NOT EXISTS memory_minhash (
+    memory_id INTEGER PRIMARY KEY,
+    signature BIGINT[] NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS memory_lsh (
+    band SMALLINT NOT NULL,
+    bucket BIGINT NOT NULL,
+    memory_id INTEGER NOT NULL,
+    PRIMARY KEY (band, bucket, memory_id)
+);
+
+CREATE INDEX IF NOT EXISTS memory_lsh_memory_idx ON memory_lsh (memory_id);
+
+
+-- Pyramida hustoty vzpomínek pro přehledová měřítka (backend/density.py)
+-- Úrovně 3-12, buňka na úrovni z má stranu 360 / 2^(z + 4) stupňů; udržují ji příkazové triggery
+CREATE TABLE IF NOT EXISTS memory_density (
+    zoom SMALLINT NOT NULL,
+    cell_x INTEGER NOT NULL,
+    cell_y INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (zoom, cell_x, cell_y)
+);
+
+CREATE OR REPLACE FUNCTION memory_density_apply(lons DOUBLE PRECISION[], lats DOUBLE PRECISION[], delta INTEGER)
+RETURNS void AS $$
+    INSERT INTO memory_density (zoom, cell_x, cell_y, count)
+    SELECT z.zoom,
+           floor(p.lon * (2 ^ (z.zoom + 4)) / 360)::int,
+           floor(p.lat * (2 ^ (z.zoom + 4)) / 360)::int,
+           (delta * count(*))::int
+    FROM unnest(lons, lats) AS p(lon, lat)
+    CROSS JOIN generate_series(3, 12) AS z(zoom)
+    GROUP BY 1, 2, 3
+    -- Pevné pořadí zamykání buněk - souběžné vkládání do stejných hrubých buněk se nezablokuje
+    ORDER BY 1, 2, 3
+    ON CONFLICT (zoom, cell_x, cell_y) DO UPDATE SET count = memory_density.count + EXCLUDED.count;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION memory_density_refresh() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM memory_density_apply(array_agg(ST_X(coordinates::geometry)), array_agg(ST_Y(coordinates::geometry)), 1)
+        FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM memory_density_apply(array_agg(ST_X(coordinates::geometry)), array_agg(ST_Y(coordinates::geometry)), -1)
+        FROM old_rows;
+    ELSE
+        -- Při UPDATE jen řádky, kterým se změnila poloha
+        PERFORM memory_density_apply(array_agg(ST_X(o.coordinates::geometry)), array_agg(ST_Y(o.coordinates::geometry)), -1)
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE NOT ST_Equals(o.coordinates::geometry, n.coordinates::geometry);
+        PERFORM memory_density_apply(array_agg(ST_X(n.coordinates::geometry)), array_agg(ST_Y(n.coordinates::geometry)), 1)
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE NOT ST_Equals(o.coordinates::geometry, n.coordinates::geometry);
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS memories_density_insert ON memories;
+CREATE TRIGGER memories_density_insert AFTER INSERT ON memories
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION memory_density_refresh();
+DROP TRIGGER IF EXISTS memories_density_delete ON memories;
+CREATE TRIGGER memories_density_delete AFTER DELETE ON memories
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION memory_density_refresh();
+DROP TRIGGER IF EXISTS memories_density_update ON memories;
+CREATE TRIGGER memories_density_update AFTER UPDATE ON memories
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION memory_density_refresh();
+
+-- Souhrn vzpomínek podle místa pro pop-up okna míst a /api/places (backend/places.py)
+-- Počty, součty souřadnic (těžiště) a klíčová slova udržují příkazové triggery
+CREATE TABLE IF NOT EXISTS location_summary (
+    location VARCHAR(255) PRIMARY KEY,
+    memory_count INTEGER NOT NULL,
+    sum_lat DOUBLE PRECISION NOT NULL,
+    sum_lon DOUBLE PRECISION NOT NULL,
+    latest_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS location_keywords (
+    location VARCHAR(255) NOT NULL,
+    keyword TEXT NOT NULL,
+    memory_count INTEGER NOT NULL,
+    PRIMARY KEY (location, keyword)
+);
+
+-- Nejnovější vzpomínky místa jedním indexovým čtením
+CREATE INDEX IF NOT EXISTS memories_location_idx ON memories (location, created_at DESC);
+
+CREATE OR REPLACE FUNCTION location_summary_apply(changes JSONB, delta INTEGER)
+RETURNS void AS $$
+    WITH changed AS (
+        SELECT * FROM jsonb_to_recordset(changes) AS r(
+            location TEXT, lat DOUBLE PRECISION, lon DOUBLE PRECISION,
+            created_at TIMESTAMPTZ, keywords TEXT[]
+        )
+    ),
+    summary AS (
+        INSERT INTO location_summary (location, memory_count, sum_lat, sum_lon, latest_at)
+        SELECT location, delta * count(*), delta * sum(lat), delta * sum(lon),
+               CASE WHEN delta > 0 THEN max(created_at) END
+        FROM changed
+        GROUP BY location
+        -- Pevné pořadí zamykání řádků - souběžné zápisy do stejných míst se nezablokují navzájem
+        ORDER BY location
+        ON CONFLICT (location) DO UPDATE SET
+            memory_count = location_summary.memory_count + EXCLUDED.memory_count,
+            sum_lat = location_summary.sum_lat + EXCLUDED.sum_lat,
+            sum_lon = location_summary.sum_lon + EXCLUDED.sum_lon,
+            latest_at = GREATEST(location_summary.latest_at, EXCLUDED.latest_at)
+    )
+    INSERT INTO location_keywords (location, keyword, memory_count)
+    SELECT changed.location, k.keyword, delta * count(*)
+    FROM changed, unnest(changed.keywords) AS k(keyword)
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (location, keyword) DO UPDATE SET
+        memory_count = location_keywords.memory_count + EXCLUDED.memory_count;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION location_summary_refresh() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM location_summary_apply(jsonb_agg(jsonb_build_object(
+            'location', location, 'lat', lat, 'lon', lon,
+            'created_at', created_at, 'keywords', keywords)), -1)
+        FROM old_rows;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM location_summary_apply(jsonb_agg(jsonb_build_object(
+            'location', location, 'lat', lat, 'lon', lon,
+            'created_at', created_at, 'keywords', keywords)), 1)
+        FROM new_rows;
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        -- Maximum nelze odečíst - nejnovější vzpomínku dotčených míst dohledá index
+        DELETE FROM location_summary
+        WHERE memory_count <= 0 AND location IN (SELECT location FROM old_rows);
+        DELETE FROM location_keywords
+        WHERE memory_count <= 0 AND location IN (SELECT location FROM old_rows);
+        UPDATE location_summary s
+        SET latest_at = (SELECT max(m.created_at) FROM memories m WHERE m.location = s.location)
+        WHERE s.location IN (SELECT DISTINCT location FROM old_rows);
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS memories_places_insert ON memories;
+CREATE TRIGGER memories_places_insert AFTER INSERT ON memories
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION location_summary_refresh();
+DROP TRIGGER IF EXISTS memories_places_delete ON memories;
+CREATE TRIGGER memories_places_delete AFTER DELETE ON memories
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION location_summary_refresh();
+DROP TRIGGER IF EXISTS memories_places_update ON memories;
+CREATE TRIGGER memories_places_update AFTER UPDATE ON memories
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION location_summary_refresh();
+
+-- Trvalá fronta asynchronních zápisů s klíčem idempotence (backend/jobs.py)
+CREATE TABLE IF NOT EXISTS write_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    idempotency_key VARCHAR(255) UNIQUE,
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    memory_id INTEGER,
+    attempts SMALLINT NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS write_jobs_pending_idx ON write_jobs (status, id)
+    WHERE status IN ('queued', 'inserted');
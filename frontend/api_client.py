@@ -0,0 +1,126 @@
+"""
+Sdílený HTTP klient frontendu pro komunikaci s backendem MemoryMap
+
+Jedna requests.Session na proces (sdílená reruny i session Streamlitu):
+- keep-alive spojení z poolu - opakované požadavky na Render nenavazují
+  pokaždé nové TCP/TLS spojení,
+- gzip odpovědí (backend komprimuje větší JSON),
+- výchozí timeout (navázání spojení, čtení odpovědi),
+- opakování při výpadku spojení a odpovědích 429/502/503/504 (studený start
+  Renderu, přetížení) s exponenciálním čekáním s náhodným rozptylem; POST
+  se na úrovni HTTP neopakuje (neidempotentní), hlavička Retry-After má
+  přednost.
+
+Session cookies neukládá - sdílí ji všichni uživatelé procesu, takže např.
+cookie posledního zápisu (mm_write_lsn) by jinak platila pro všechny. Cookies
+uživatele drží volající (app.py v st.session_state) a předává je parametrem cookies.
+
+gather() spustí nezávislá načtení (stav backendu, vzpomínky, souhrny míst)
+souběžně ve sdíleném poolu vláken - doba načtení stránky je dána nejpomalejším
+požadavkem, ne jejich součtem.
+"""
+
+import os  # Pro práci s proměnnými prostředí
+from http.cookiejar import DefaultCookiePolicy  # Zákaz ukládání cookies ve sdílené session
+import random  # Rozptyl čekání mezi opakováními
+import threading  # Zámek pro líné vytvoření session
+from concurrent.futures import ThreadPoolExecutor  # Souběžná načítání
+
+import requests  # Knihovna pro HTTP požadavky
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    # Vlákna poolu potřebují kontext skriptu, aby v nich fungovaly st.* volání a cache
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # Mimo Streamlit (skripty, testy)
+    add_script_run_ctx = get_script_run_ctx = None
+
+BACKEND_URL = os.getenv('BACKEND_URL', 'https://memory-map.onrender.com')
+
+# Timeout navázání spojení a čtení odpovědi v sekundách
+API_CONNECT_TIMEOUT = float(os.getenv('API_CONNECT_TIMEOUT', '3.05'))
+API_READ_TIMEOUT = float(os.getenv('API_READ_TIMEOUT', '10'))
+# Počet opakování požadavku a základ exponenciálního čekání v sekundách
+API_RETRIES = int(os.getenv('API_RETRIES', '3'))
+API_BACKOFF = float(os.getenv('API_BACKOFF', '0.5'))
+# Nejvyšší počet spojení v poolu a souběžných načtení v gather()
+API_POOL_SIZE = int(os.getenv('API_POOL_SIZE', '10'))
+API_PARALLEL = int(os.getenv('API_PARALLEL', '4'))
+
+# Odpovědi, u kterých má smysl požadavek zopakovat
+RETRY_STATUSES = (429, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=API_PARALLEL, thread_name_prefix="memorymap-api")
+
+
+class JitterRetry(Retry):
+    """Retry s náhodným rozptylem čekání - souběžní klienti neopakují požadavky ve stejnou chvíli"""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(backoff / 2, backoff) if backoff > 0 else 0
+
+
+class NoCookiesPolicy(DefaultCookiePolicy):
+    """Politika sdílené session - žádnou cookie z odpovědi neuloží"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+def session():
+    """Sdílená session s poolem spojení a opakováním (vytvoří se při prvním použití)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = JitterRetry(
+                    total=API_RETRIES,
+                    backoff_factor=API_BACKOFF,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=frozenset(["GET", "HEAD"]),
+                    raise_on_status=False,  # Po vyčerpání opakování vrátit poslední odpověď
+                )
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=API_POOL_SIZE, max_retries=retry)
+                new_session = requests.Session()
+                new_session.mount("https://", adapter)
+                new_session.mount("http://", adapter)
+                new_session.headers.update({"Accept-Encoding": "gzip, deflate", "Accept": "application/json"})
+                new_session.cookies.set_policy(NoCookiesPolicy())
+                _session = new_session
+    return _session
+
+
+def _timeout(timeout):
+    if timeout is None:
+        return (API_CONNECT_TIMEOUT, API_READ_TIMEOUT)
+    return (min(API_CONNECT_TIMEOUT, timeout), timeout)
+
+
+def get(path, params=None, timeout=None, **kwargs):
+    """GET na backend (path je cesta, např. /api/memories)"""
+    return session().get(f"{BACKEND_URL}{path}", params=params, timeout=_timeout(timeout), **kwargs)
+
+
+def post(path, json=None, timeout=None, **kwargs):
+    """POST na backend - opakuje se jen navázání spojení, ne odeslaný požadavek"""
+    return session().post(f"{BACKEND_URL}{path}", json=json, timeout=_timeout(timeout), **kwargs)
+
+
+def gather(**calls):
+    """
+    Souběžně zavolá funkce bez parametrů a vrátí jejich výsledky pod stejnými
+    názvy (None místo funkce = výsledek None). Výjimka funkce se předá volajícímu.
+    """
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+
+    def run(func):
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return func()
+
+    futures = {name: _executor.submit(run, func) for name, func in calls.items() if func is not None}
+    return {name: futures[name].result() if name in futures else None for name in calls}
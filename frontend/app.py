@@ -19,13 +19,22 @@ import streamlit as st  # Knihovna pro tvorbu webových aplikací
 import folium  # Knihovna pro práci s mapami
 import requests  # Knihovna pro HTTP požadavky
 from streamlit_folium import folium_static, st_folium  # Pro zobrazení folium map ve Streamlitu
+from folium.plugins import HeatMap  # Vrstva hustoty vzpomínek
 from datetime import datetime  # Pro práci s datem a časem
 import time  # Pro práci s časem
 import json  # Pro práci s JSON daty
 import os  # Pro práci s proměnnými prostředí
+import logging  # Pro diagnostické výpisy (místo print)
+import uuid  # Pro klíč idempotence při odesílání vzpomínek
+from collections import Counter, defaultdict  # Seskupení vzpomínek podle místa
+import api_client  # Sdílená HTTP session s poolem spojení, opakováním a souběžným načítáním
 
-# Konfigurace backendu
-BACKEND_URL = os.getenv('BACKEND_URL', 'https://memory-map.onrender.com')
+# Logger frontendu - úroveň lze nastavit proměnnou LOG_LEVEL
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'WARNING').upper())
+logger = logging.getLogger("memorymap.frontend")
+
+# Konfigurace backendu (proměnná BACKEND_URL, viz api_client.py)
+BACKEND_URL = api_client.BACKEND_URL
 
 # Nastavení stránky - základní konfigurace Streamlit aplikace
 st.set_page_config(
@@ -38,6 +47,8 @@ st.set_page_config(
 # Konstanty aplikace
 DEFAULT_LAT = 49.8  # Výchozí zeměpisná šířka (zhruba střed ČR)
 DEFAULT_LON = 15.5  # Výchozí zeměpisná délka (zhruba střed ČR)
+DENSITY_BBOX = "12.09,48.55,18.86,51.06"  # Rozsah ČR pro přehled hustoty (min_lon,min_lat,max_lon,max_lat)
+DENSITY_ZOOM = 7  # Úroveň mřížky hustoty odpovídající výchozímu přiblížení mapy
 
 # Nastavení CSS stylů pro lepší vzhled aplikace
 st.markdown("""
@@ -92,14 +103,27 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Cookies backendu patří jen session uživatele (např. mm_write_lsn - jeho čtení po
+# vlastním zápisu), sdílená session api_client je neukládá
+def user_cookies():
+    """Cookie jar aktuálního uživatele Streamlitu"""
+    if "api_cookies" not in st.session_state:
+        st.session_state["api_cookies"] = requests.cookies.RequestsCookieJar()
+    return st.session_state["api_cookies"]
+
+def remember_cookies(response):
+    """Uloží cookies z odpovědi backendu do jaru uživatele"""
+    if response.cookies:
+        user_cookies().update(response.cookies)
+
 # Funkce pro komunikaci s backendem
 def api_request(endpoint, method='GET', data=None):
-    url = f"{BACKEND_URL}{endpoint}"
     try:
         if method == 'GET':
-            response = requests.get(url)
+            response = api_client.get(endpoint, cookies=user_cookies())
         elif method == 'POST':
-            response = requests.post(url, json=data)
+            response = api_client.post(endpoint, json=data, cookies=user_cookies())
+        remember_cookies(response)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -107,8 +131,12 @@ def api_request(endpoint, method='GET', data=None):
         return None
 
 # Helper funkce pro vytvoření mapy se vzpomínkami
-def create_map(memories, center_lat=DEFAULT_LAT, center_lon=DEFAULT_LON):
-    """Vytvoření mapy s interaktivními piny vzpomínek"""
+def create_map(memories, center_lat=DEFAULT_LAT, center_lon=DEFAULT_LON, density=None, places=None):
+    """
+    Vytvoření mapy s interaktivními piny vzpomínek, případně s vrstvou hustoty.
+    Vzpomínky se stejným místem (location) mají jeden společný pin se souhrnem
+    místa (places - souhrny z /api/places podle názvu místa).
+    """
     m = folium.Map(location=[center_lat, center_lon], zoom_start=7)
     
     # Přidání základní mapové vrstvy Mapy.cz
@@ -130,15 +158,30 @@ def create_map(memories, center_lat=DEFAULT_LAT, center_lon=DEFAULT_LON):
     # Přidání ovladače vrstev
     folium.LayerControl().add_to(m)
     
+    # Vrstva hustoty - data odpovídají počtu buněk mřížky, ne počtu vzpomínek
+    if density and density.get("cells"):
+        max_count = density.get("max_count") or 1
+        HeatMap(
+            [[lat, lon, count / max_count] for lat, lon, count in density["cells"]],
+            name="Hustota vzpomínek",
+            radius=18,
+            blur=15,
+            min_opacity=0.3
+        ).add_to(m)
+    
     if not memories:
         return m
     
     # Logujeme počet vzpomínek pro diagnostiku v konzoli (ne na UI)
-    print(f"Funkce create_map: Zpracovávám {len(memories)} vzpomínek")
+    logger.debug("Funkce create_map: Zpracovávám %s vzpomínek", len(memories))
     
     # Zkusíme vypsat přehled klíčů první vzpomínky do konzole, ne na UI
     if len(memories) > 0:
-        print(f"Klíče v první vzpomínce: {list(memories[0].keys())}")
+        logger.debug("Klíče v první vzpomínce: %s", list(memories[0].keys()))
+    
+    # Místa s více vzpomínkami dostanou jeden pin místo překrývajících se pinů
+    location_counts = Counter(memory.get("location") for memory in memories)
+    grouped = defaultdict(list)
     
     for i, memory in enumerate(memories):
         try:
@@ -160,7 +203,7 @@ def create_map(memories, center_lat=DEFAULT_LAT, center_lon=DEFAULT_LON):
                         memory["longitude"] = coords_str["coordinates"][0]
                         memory["latitude"] = coords_str["coordinates"][1]
                 else:
-                    print(f"Vzpomínka {i+1} nemá potřebné souřadnice: {memory}")
+                    logger.debug("Vzpomínka %s nemá potřebné souřadnice: %s", i + 1, memory)
                     continue
             
             # Získáme souřadnice - upravujeme pro flexibilnější zpracování
@@ -169,11 +212,14 @@ def create_map(memories, center_lat=DEFAULT_LAT, center_lon=DEFAULT_LON):
             
             # Kontrola, že souřadnice jsou v rozumném rozsahu
             if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
-                print(f"Vzpomínka {i+1} má neplatné souřadnice: lat={lat}, lon={lon}")
+                logger.debug("Vzpomínka %s má neplatné souřadnice: lat=%s, lon=%s", i + 1, lat, lon)
                 continue
             
             # Bezpečné získání dat s fallbacky pro chybějící
             location = memory.get("location", "Neznámé místo")
+            if location_counts[memory.get("location")] > 1:
+                grouped[location].append((lat, lon, memory))
+                continue
             text = memory.get("text", "Bez textu")
             keywords = memory.get("keywords", [])
             if not isinstance(keywords, list):
@@ -205,7 +251,36 @@ def create_map(memories, center_lat=DEFAULT_LAT, center_lon=DEFAULT_LON):
             ).add_to(m)
             
         except Exception as e:
-            print(f"Chyba při zpracování vzpomínky {i+1}: {str(e)}")
+            logger.warning("Chyba při zpracování vzpomínky %s: %s", i + 1, e)
+    
+    for location, items in grouped.items():
+        place = (places or {}).get(location, {})
+        lat = place.get("latitude", items[0][0])
+        lon = place.get("longitude", items[0][1])
+        count = place.get("count", len(items))
+        keywords = place.get("top_keywords") or list(Counter(
+            k for _, _, memory in items for k in (memory.get("keywords") or [])).keys())[:5]
+        latest = "".join(
+            f"<li style='margin-bottom: 5px;'>{memory.get('text', 'Bez textu')}"
+            f" <em>({memory.get('date') or 'Neuvedeno'})</em></li>"
+            for _, _, memory in items[:3]
+        )
+        popup_content = f"""
+        <div style='width: 300px; padding: 10px; font-family: Arial, sans-serif;'>
+            <h3 style='color: #1E88E5; margin-top: 0;'>{location}</h3>
+            <p style='margin: 5px 0;'><strong style='color: #0D47A1;'>Počet vzpomínek:</strong> {count}</p>
+            <p style='margin: 5px 0;'><strong style='color: #0D47A1;'>Klíčová slova:</strong>
+               <span style='background-color: #E3F2FD; padding: 2px 5px; border-radius: 3px;'>{', '.join(keywords)}</span>
+            </p>
+            <ul style='background-color: #f5f5f5; padding: 10px 10px 10px 25px; border-radius: 5px;'>{latest}</ul>
+        </div>
+        """
+        folium.Marker(
+            [lat, lon],
+            popup=folium.Popup(popup_content, max_width=300),
+            tooltip=f"{location} ({count})",
+            icon=folium.Icon(icon="map-pin", prefix="fa", color="darkblue")
+        ).add_to(m)
     
     # Přidání click handleru pro přidání nové vzpomínky s jasnějším popisem
     m.add_child(folium.ClickForMarker(popup="Klikněte zde pro přidání nové vzpomínky"))
@@ -216,10 +291,10 @@ def create_map(memories, center_lat=DEFAULT_LAT, center_lon=DEFAULT_LON):
 def georeference_placename(place_name, historical_period="1950"):
     """Georeferencování historického názvu místa pomocí API"""
     try:
-        response = requests.post(
-            f"{BACKEND_URL}/georef", 
+        response = api_client.post(
+            "/georef",
             json={"place_name": place_name, "historical_period": historical_period},
-            timeout=10
+            cookies=user_cookies()
         )
         if response.status_code == 200:
             return response.json()
@@ -235,16 +310,18 @@ def get_memories():
     """Získání všech vzpomínek z API"""
     try:
         # Odeslání GET požadavku na backend API
-        print(f"Pokouším se o připojení k: {BACKEND_URL}/api/memories")
-        response = requests.get(f"{BACKEND_URL}/api/memories", timeout=10)
-        print(f"Status odpovědi: {response.status_code}")
+        logger.debug("Pokouším se o připojení k: %s/api/memories", BACKEND_URL)
+        # Pro piny a pop-upy stačí zkrácený text bez zdroje (view=summary)
+        response = api_client.get("/api/memories", params={"view": "summary", "text_preview": 300},
+                                  cookies=user_cookies())
+        logger.debug("Status odpovědi: %s", response.status_code)
         
         if response.status_code == 200:
             # Pokud byl požadavek úspěšný, vrátíme data
             data = response.json()
-            print(f"Získáno {len(data)} záznamů")
+            logger.debug("Získáno %s záznamů", len(data))
             if len(data) > 0:
-                print(f"První záznam obsahuje klíče: {list(data[0].keys())}")
+                logger.debug("První záznam obsahuje klíče: %s", list(data[0].keys()))
             return data
         else:
             # Pokud nastal problém, zobrazíme chybovou zprávu
@@ -263,7 +340,46 @@ def get_memories():
         st.error(f"Chyba při komunikaci s API: {str(e)}")
         return []
 
+# Funkce pro získání souhrnů míst z API
+def get_places():
+    """Souhrny míst (počet, těžiště, nejčastější klíčová slova) podle názvu místa"""
+    try:
+        response = api_client.get("/api/places", params={"keywords": 5}, cookies=user_cookies())
+        if response.status_code == 200:
+            return {place["name"]: place for place in response.json().get("places", [])}
+        logger.debug("Souhrny míst nejsou dostupné (Status: %s)", response.status_code)
+    except requests.exceptions.RequestException as e:
+        logger.debug("Souhrny míst nejsou dostupné: %s", e)
+    return {}
+
+# Funkce pro získání mřížky hustoty vzpomínek z API
+def get_density(bbox=DENSITY_BBOX, zoom=DENSITY_ZOOM):
+    """Získání počtů vzpomínek v mřížce pro heatmapu"""
+    try:
+        response = api_client.get("/api/memories/density", params={"bbox": bbox, "zoom": zoom},
+                                  cookies=user_cookies())
+        if response.status_code == 200:
+            data = response.json()
+            logger.debug("Získáno %s buněk hustoty (zoom %s)", len(data.get("cells", [])), data.get("zoom"))
+            return data
+        st.error(f"Chyba při načítání hustoty vzpomínek (Status: {response.status_code})")
+        return None
+    except requests.exceptions.ConnectionError:
+        st.error(f"Nepodařilo se připojit k API na adrese {BACKEND_URL}. Zkontrolujte, zda backend běží.")
+        return None
+    except Exception as e:
+        st.error(f"Chyba při komunikaci s API: {str(e)}")
+        return None
+
 # Funkce pro přidání nové vzpomínky přes API
+@st.cache_data(ttl=30, show_spinner=False)
+def backend_status():
+    """Stav backendu z /healthz - sdílený mezi reruny a session po dobu 30 s"""
+    try:
+        return api_client.get("/healthz", timeout=2).status_code
+    except requests.exceptions.RequestException:
+        return None
+
 def add_memory(text, location, lat, lon, source=None, date=None):
     """Přidání nové vzpomínky přes API"""
     try:
@@ -281,16 +397,30 @@ def add_memory(text, location, lat, lon, source=None, date=None):
         if date:
             data["date"] = date
         
-        # Odeslání POST požadavku na backend API
-        response = requests.post(
-            f"{BACKEND_URL}/api/analyze",
-            json=data,
-            timeout=10
-        )
+        # Vzpomínka se zařadí do fronty na backendu - odpověď přijde hned a opakované
+        # odeslání se stejným Idempotency-Key (např. po timeoutu) nevytvoří duplicitu
+        headers = {"Idempotency-Key": str(uuid.uuid4())}
+        for attempt in range(3):
+            try:
+                response = api_client.post("/api/jobs", json=data, headers=headers, timeout=5,
+                                           cookies=user_cookies())
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == 2:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+                continue
+            if (response.status_code >= 500 or response.status_code == 429) and attempt < 2:
+                # Při přetížení backend posílá Retry-After (429/503)
+                retry_after = response.headers.get("Retry-After", "")
+                time.sleep(min(float(retry_after), 5) if retry_after.isdigit() else 0.5 * 2 ** attempt)
+                continue
+            break
+        
+        remember_cookies(response)
         
         # Kontrola odpovědi
-        if response.status_code == 200:
-            return True, "✅ Vzpomínka byla úspěšně přidána! Nový pin byl přidán na mapu."
+        if response.status_code in (200, 202):
+            return True, "✅ Vzpomínka byla přijata ke zpracování a za chvíli se objeví na mapě."
         else:
             return False, f"❌ Chyba při přidávání vzpomínky: {response.text}"
     except requests.exceptions.ConnectionError:
@@ -300,6 +430,16 @@ def add_memory(text, location, lat, lon, source=None, date=None):
         # Zachycení všech ostatních chyb
         return False, f"❌ Chyba při komunikaci s API: {str(e)}"
 
+# Nezávislá načtení z backendu běží souběžně - stav pro postranní panel i data mapy
+# (přepínač hustoty má hodnotu z session_state, nastavenou před tímto během skriptu)
+show_density = st.session_state.get("show_density", False)
+loaded = api_client.gather(
+    status=backend_status,
+    density=get_density if show_density else None,
+    memories=None if show_density else get_memories,
+    places=None if show_density else get_places,
+)
+
 # Sidebar - informace o aplikaci v postranním panelu
 with st.sidebar:
     # Stylizované logo pomocí emoji a textu - nahrazujeme externí obrázek
@@ -337,13 +477,12 @@ with st.sidebar:
     
     # Kontrola připojení k API - vylepšení zobrazení
     st.subheader("🔌 Stav připojení")
-    try:
-        response = requests.get(f"{BACKEND_URL}", timeout=2)
-        if response.status_code == 200:
-            st.success("✅ Backend API je dostupné")
-        else:
-            st.warning(f"⚠️ Backend API odpovídá s kódem: {response.status_code}")
-    except:
+    status_code = loaded["status"]
+    if status_code == 200:
+        st.success("✅ Backend API je dostupné")
+    elif status_code is not None:
+        st.warning(f"⚠️ Backend API odpovídá s kódem: {status_code}")
+    else:
         st.error("❌ Backend API není dostupné")
     
     # Přidám odkaz na dokumentaci
@@ -365,15 +504,23 @@ with tab1:
     # Poznámka o AI-generovaných vzpomínkách
     st.caption("💡 Poznámka: Vzpomínky zobrazené na mapě byly vygenerovány pomocí umělé inteligence pro demonstrační účely.")
     
-    # Získání vzpomínek
-    memories = get_memories()
+    # Přepínač zobrazení - přehled hustoty nenačítá jednotlivé vzpomínky
+    show_density = st.toggle("🔥 Zobrazit hustotu vzpomínek (heatmapa)", value=False, key="show_density")
+    density = loaded["density"]
+    
+    # Vzpomínky a souhrny míst pro společné piny (načtené souběžně výše)
+    memories = loaded["memories"] or []
+    places = loaded["places"] if memories else {}
     
     # Kompaktnější diagnostická sekce
     with st.expander("📊 Diagnostika API", expanded=False):
         st.subheader("Stav načítání dat")
         
         # Kontrolujeme, zda máme nějaké vzpomínky
-        if memories:
+        if show_density:
+            cells = density.get("cells", []) if density else []
+            st.success(f"✅ Načteno {len(cells)} buněk mřížky hustoty")
+        elif memories:
             st.success(f"✅ Načteno {len(memories)} vzpomínek z databáze")
             # Detaily první vzpomínky zobrazíme pouze pokud existují vzpomínky
             if len(memories) > 0:
@@ -388,7 +535,7 @@ with tab1:
                 direct_url = f"{BACKEND_URL}/api/memories"
                 st.write(f"Odesílám požadavek na: {direct_url}")
                 
-                direct_response = requests.get(direct_url, timeout=10)
+                direct_response = api_client.get("/api/memories", cookies=user_cookies())
                 st.write(f"Status kód: {direct_response.status_code}")
                 
                 if direct_response.status_code == 200:
@@ -406,7 +553,7 @@ with tab1:
     # Vytvoření a zobrazení mapy - přesouváme mimo diagnostickou sekci a zjednodušujeme
     try:
         # Vytvoření mapy
-        m = create_map(memories)
+        m = create_map(memories, density=density, places=places)
         
         # Zobrazení mapy v aplikaci
         map_data = st_folium(m, width=1200, height=600)